@@ -1,6 +1,10 @@
-import json
 from datetime import datetime
 
+from person_storage import open_storage
+
+# Geteiltes Speicher-Backend für alle Streamlit-Reruns und -Sitzungen (JSON oder SQLite)
+PERSON_STORAGE = open_storage()
+
 
 class Fetus:
     """Repräsentiert einen Fötus mit Name und Schwangerschaftswoche"""
@@ -67,38 +71,48 @@ class Person:
 
     @staticmethod
     def load_by_id(person_id):
-        """Lädt eine Person basierend auf der ID aus der JSON-Datenbank"""
-        person_data = Person.load_person_data()
-        for person in person_data:
-            if person["id"] == person_id:
-                return Person(person)
-        return None
+        """Lädt eine Person basierend auf der ID aus der Datenbank"""
+        person = PERSON_STORAGE.get_by_id(person_id)
+        if person is None:
+            return None
+        return Person(person)
+
+    @staticmethod
+    def id_exists(person_id):
+        """Prüft, ob bereits eine Person mit dieser ID in der Datenbank existiert"""
+        return PERSON_STORAGE.contains_id(person_id)
 
     @staticmethod
     def load_person_data():
-        """Lädt die Personendaten aus der JSON-Datei"""
-        with open("data/person_db.json") as file:
-            person_data = json.load(file)
-        return person_data
+        """Lädt die Personendaten aus der Datenbank"""
+        return PERSON_STORAGE.all()
+
+    @staticmethod
+    def save_person_data(person_dict):
+        """Speichert die Änderungen einer bestehenden Person im Speicher-Backend"""
+        PERSON_STORAGE.save_person(person_dict)
+
+    @staticmethod
+    def add_person_data(person_dict):
+        """Legt eine neue Person im Speicher-Backend an"""
+        PERSON_STORAGE.add_person(person_dict)
 
     @staticmethod
-    def get_person_list(person_data):
+    def get_person_list(person_data=None):
         """Erstellt eine Liste von Personennamen im Format 'Nachname, Vorname'"""
+        if person_data is None:
+            return PERSON_STORAGE.names()
         return [f"{p['lastname']}, {p['firstname']}" for p in person_data]
 
     @staticmethod
     def find_person_data_by_name(suchstring):
         """Findet die Personendaten basierend auf dem Namen im Format 'Nachname, Vorname'"""
-        person_data = Person.load_person_data()
         if suchstring == "None":
             return {}
         two_names = suchstring.split(", ")
         vorname = two_names[1]
         nachname = two_names[0]
-        for eintrag in person_data:
-            if eintrag["lastname"] == nachname and eintrag["firstname"] == vorname:
-                return eintrag
-        return {}
+        return PERSON_STORAGE.get_by_name(nachname, vorname) or {}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""
+ctg_alarms.py
+
+Headless-Replay archivierter CTG-Aufzeichnungen zur Alarmauswertung.
+Alle Alarm-Episoden (FHR unter Schwellwert) werden in einem vektorisierten
+Durchlauf gefunden, nahe beieinanderliegende Episoden zusammengefasst und zu
+kurze Episoden verworfen. Damit lassen sich ganze Aufzeichnungen in
+Millisekunden auswerten und Schwellwerte per Parameter-Sweep abstimmen.
+Das Modul benötigt kein Streamlit.
+"""
+import numpy as np
+import pandas as pd
+
+from ctg_quality import load_clean_frame_with_seconds
+
+EPISODE_COLUMNS = ['start_s', 'end_s', 'duration_s', 'min_bpm', 'samples']
+
+
+def find_alarm_episodes(times, bpm, threshold, merge_gap_s=0.0, min_duration_s=0.0):
+    """
+    Findet alle Alarm-Episoden (bpm < threshold) einer Herzfrequenz-Zeitreihe.
+    Args:
+        times (np.ndarray): Aufsteigende Zeitpunkte in Sekunden.
+        bpm (np.ndarray): Fetale Herzfrequenz (NaN zählt nicht als Alarm).
+        threshold (float): Alarm-Schwellwert in bpm.
+        merge_gap_s (float): Episoden mit höchstens diesem Abstand (s) werden zusammengefasst.
+        min_duration_s (float): Kürzere Episoden werden verworfen.
+    Rückgabe: DataFrame mit einer Zeile pro Episode und den Spalten
+              start_s, end_s, duration_s, min_bpm, samples.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    bpm = np.asarray(bpm, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        below = bpm < threshold
+    if not below.any():
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+
+    # Flanken der Alarm-Maske -> Beginn und (inklusives) Ende jeder Episode
+    edges = np.diff(np.concatenate([[0], below.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    # Episoden mit kleiner Lücke zusammenfassen
+    if merge_gap_s > 0 and len(starts) > 1:
+        new_episode = np.concatenate([[True], times[starts[1:]] - times[ends[:-1]] > merge_gap_s])
+        starts = starts[new_episode]
+        ends = ends[np.concatenate([new_episode[1:], [True]])]
+
+    # Dauer inkl. des letzten Samples (ein Abtastintervall)
+    dt = np.median(np.diff(times)) if len(times) > 1 else 0.0
+    durations = times[ends] - times[starts] + dt
+    keep = durations >= min_duration_s
+    starts, ends, durations = starts[keep], ends[keep], durations[keep]
+
+    # Minimum je Episode über reduceat auf [start, ende + 1)
+    padded = np.append(np.where(np.isnan(bpm), np.inf, bpm), np.inf)
+    bounds = np.stack([starts, ends + 1], axis=1).ravel()
+    min_bpm = np.minimum.reduceat(padded, bounds)[::2] if len(starts) else np.empty(0)
+
+    return pd.DataFrame({
+        'start_s': times[starts],
+        'end_s': times[ends],
+        'duration_s': durations,
+        'min_bpm': min_bpm,
+        'samples': ends - starts + 1,
+    }, columns=EPISODE_COLUMNS)
+
+
+def sweep_thresholds(times, bpm, thresholds, merge_gap_s=0.0, min_duration_s=0.0):
+    """
+    Wertet mehrere Alarm-Schwellwerte auf derselben Aufzeichnung aus.
+    Rückgabe: DataFrame mit je einer Zeile pro Schwellwert (Anzahl Episoden,
+              gesamte Alarmdauer, Zeitpunkt des ersten Alarms).
+    """
+    rows = []
+    for threshold in thresholds:
+        episodes = find_alarm_episodes(times, bpm, threshold, merge_gap_s, min_duration_s)
+        rows.append({
+            'threshold': threshold,
+            'episodes': len(episodes),
+            'alarm_s': float(episodes['duration_s'].sum()) if len(episodes) else 0.0,
+            'first_alarm_s': float(episodes['start_s'].iloc[0]) if len(episodes) else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def replay_recording(csv_path, lb_col, threshold, merge_gap_s=0.0, min_duration_s=0.0):
+    """
+    Spielt eine archivierte (bereinigte) Aufzeichnung ohne Oberfläche ab und gibt alle Alarm-Episoden zurück.
+    Raises:
+        ValueError: Wenn die LB-Spalte nicht existiert.
+    """
+    df, seconds = load_clean_frame_with_seconds(csv_path)
+    if lb_col not in df.columns:
+        raise ValueError(f"Spalte '{lb_col}' nicht gefunden in {csv_path}")
+    return find_alarm_episodes(seconds, df[lb_col].to_numpy(), threshold, merge_gap_s, min_duration_s)
+
+
+if __name__ == "__main__":
+    import time
+
+    path = "data/CTG_data/CTG_twins_hypertension.csv"
+    df, seconds = load_clean_frame_with_seconds(path)
+    t0 = time.perf_counter()
+    episodes = replay_recording(path, "LB2", 130, merge_gap_s=5, min_duration_s=10)
+    print(f"Replay in {(time.perf_counter() - t0) * 1000:.2f} ms: {len(episodes)} Alarm-Episoden")
+    print(episodes.head())
+    print(sweep_thresholds(seconds, df["LB2"].to_numpy(), range(100, 150, 5), merge_gap_s=5, min_duration_s=10))
@@ -0,0 +1,286 @@
+"""
+ctg_cache.py
+
+Persistenter, spaltenweiser Cache für CTG-Aufzeichnungen.
+Beim ersten Einlesen wird die CSV-Datei geparst und jede Spalte als eigene
+.npy-Datei in einem Sidecar-Verzeichnis neben der Aufzeichnung abgelegt.
+Spätere Ladevorgänge öffnen die Spalten nur noch als Memory-Map.
+Der Cache-Schlüssel besteht aus Dateipfad, Änderungszeit (mtime) und Dateigröße,
+eine geänderte CSV-Datei wird daher automatisch neu eingelesen.
+
+Zusätzlich hält ein prozessweiter LRU-Cache (FRAME_CACHE) die geladenen
+DataFrames im Speicher. Da Streamlit Module nur einmal pro Prozess importiert,
+teilen sich alle Tabs und alle gleichzeitigen Sitzungen denselben Cache.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIRNAME = ".ctg_cache"
+META_FILENAME = "meta.json"
+TIME_FILENAME = "time.npy"
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024  # 256 MB
+
+
+def recording_key(filepath):
+    """Gibt den Cache-Schlüssel (absoluter Pfad, mtime in ns, Größe in Bytes) einer Aufzeichnung zurück"""
+    stat = os.stat(filepath)
+    return os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def recording_hash(filepath):
+    """
+    Gibt den SHA-256-Inhaltshash einer Aufzeichnung zurück.
+    Der Hash wird pro Dateistand (recording_key) nur einmal pro Prozess berechnet.
+    """
+    key = recording_key(filepath)
+    with _hash_lock:
+        digest = _hash_memo.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _hash_lock:
+            _hash_memo[key] = digest
+    return digest
+
+
+def sidecar_dir(filepath):
+    """Gibt das Sidecar-Verzeichnis für den aktuellen Dateistand der Aufzeichnung zurück"""
+    abspath, mtime_ns, size = recording_key(filepath)
+    cache_root = os.path.join(os.path.dirname(abspath), CACHE_DIRNAME)
+    return os.path.join(cache_root, f"{os.path.basename(abspath)}.{mtime_ns}.{size}")
+
+
+def parse_ctg_csv(filepath):
+    """Liest die CSV-Datei ein und gibt (Zeit in Sekunden, DataFrame ohne Zeitspalte) zurück"""
+    df = pd.read_csv(filepath, index_col='time', parse_dates=False)
+    if not df.index.is_monotonic_increasing:
+        # Zeitfenster-Abfragen (Binärsuche) setzen einen sortierten Index voraus
+        df = df.sort_index(kind='stable')
+    seconds = df.index.to_numpy(dtype=np.float64)
+    return seconds, df.reset_index(drop=True)
+
+
+def _frame_from_arrays(seconds, columns):
+    """Baut aus Zeit- und Spaltenarrays ein DataFrame mit Timedelta-Index, ohne die Spalten zu kopieren"""
+    df = pd.DataFrame(columns, copy=False)
+    df.index = pd.to_timedelta(seconds, unit='s')
+    df.index.name = 'time'
+    return df
+
+
+def _write_sidecar(target_dir, seconds, df):
+    """Schreibt die Spalten atomar in das Sidecar-Verzeichnis und räumt veraltete Stände auf"""
+    cache_root = os.path.dirname(target_dir)
+    os.makedirs(cache_root, exist_ok=True)
+
+    # Erst in ein temporäres Verzeichnis schreiben, dann umbenennen
+    tmp_dir = tempfile.mkdtemp(dir=cache_root, prefix=".tmp-")
+    try:
+        np.save(os.path.join(tmp_dir, TIME_FILENAME), seconds)
+        names = []
+        for i, col in enumerate(df.columns):
+            np.save(os.path.join(tmp_dir, f"col_{i}.npy"), df[col].to_numpy())
+            names.append(str(col))
+        with open(os.path.join(tmp_dir, META_FILENAME), "w") as f:
+            json.dump({"columns": names, "rows": len(seconds)}, f)
+        os.replace(tmp_dir, target_dir)
+    except OSError:
+        # Eine andere Sitzung war schneller oder das Verzeichnis ist schreibgeschützt
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    # Alte Cache-Stände derselben Aufzeichnung entfernen
+    prefix = os.path.basename(target_dir).rsplit(".", 2)[0] + "."
+    for entry in os.listdir(cache_root):
+        path = os.path.join(cache_root, entry)
+        if entry.startswith(prefix) and path != target_dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _read_sidecar(target_dir):
+    """Öffnet die gecachten Spalten als Memory-Map und gibt (Zeit, Spalten-Dict) zurück"""
+    with open(os.path.join(target_dir, META_FILENAME)) as f:
+        meta = json.load(f)
+    # view(np.ndarray): gleiche Speicherbereiche, aber ohne die memmap-Unterklasse
+    seconds = np.load(os.path.join(target_dir, TIME_FILENAME), mmap_mode='r').view(np.ndarray)
+    columns = {
+        name: np.load(os.path.join(target_dir, f"col_{i}.npy"), mmap_mode='r').view(np.ndarray)
+        for i, name in enumerate(meta["columns"])
+    }
+    return seconds, columns
+
+
+def read_sidecar_json(filepath, name):
+    """Liest ein abgeleitetes Ergebnis (JSON) aus dem Sidecar-Verzeichnis oder gibt None zurück"""
+    path = os.path.join(sidecar_dir(filepath), name)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_sidecar_json(filepath, name, data):
+    """Legt ein abgeleitetes Ergebnis (JSON) atomar im Sidecar-Verzeichnis der Aufzeichnung ab"""
+    target_dir = sidecar_dir(filepath)
+    if not os.path.isdir(target_dir):
+        # Ohne Spalten-Cache (z. B. schreibgeschütztes Verzeichnis) nichts ablegen
+        return
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".tmp-", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(target_dir, name))
+    except OSError:
+        # Schreibgeschütztes Verzeichnis: Ergebnis wird beim nächsten Mal neu berechnet
+        pass
+
+
+def _load_columnar(filepath):
+    """Lädt eine Aufzeichnung über den Sidecar-Cache und baut ihn bei Bedarf auf"""
+    target_dir = sidecar_dir(filepath)
+    if os.path.exists(os.path.join(target_dir, META_FILENAME)):
+        try:
+            seconds, columns = _read_sidecar(target_dir)
+            return _frame_from_arrays(seconds, columns)
+        except (OSError, ValueError, KeyError):
+            # Beschädigter Cache – neu aus der CSV aufbauen
+            shutil.rmtree(target_dir, ignore_errors=True)
+
+    seconds, df = parse_ctg_csv(filepath)
+    _write_sidecar(target_dir, seconds, df)
+    if os.path.exists(os.path.join(target_dir, META_FILENAME)):
+        seconds, columns = _read_sidecar(target_dir)
+        return _frame_from_arrays(seconds, columns)
+
+    # Kein Sidecar möglich: Spalten trotzdem schreibgeschützt ausgeben
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy().copy()
+        values.flags.writeable = False
+        columns[col] = values
+    seconds = seconds.copy()
+    seconds.flags.writeable = False
+    return _frame_from_arrays(seconds, columns)
+
+
+class CTGFrameCache:
+    """
+    Größenbeschränkter LRU-Cache für geladene CTG-DataFrames.
+
+    Attributes:
+        max_bytes (int): Speicherbudget in Bytes; bei Überschreitung werden die
+                         am längsten nicht genutzten Einträge verdrängt.
+        hits (int): Anzahl Treffer.
+        misses (int): Anzahl Fehlversuche (Aufzeichnung musste geladen werden).
+        evictions (int): Anzahl verdrängter Einträge.
+    """
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """Initialisiert einen leeren Cache mit dem angegebenen Speicherbudget"""
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, Sekunden-Array, Größe in Bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, filepath, loader=_load_columnar):
+        """
+        Gibt das DataFrame zur Aufzeichnung zurück und lädt es bei einem Fehlversuch.
+        Rückgabe: flache Kopie des gecachten DataFrames. Die Daten selbst werden
+                  geteilt und sind schreibgeschützt, Index und Spaltenliste darf
+                  der Aufrufer dagegen frei ändern.
+        """
+        return self.get_with_seconds(filepath, loader)[0]
+
+    def get_with_seconds(self, filepath, loader=_load_columnar):
+        """
+        Wie get(), liefert zusätzlich den Zeitindex als aufsteigend sortiertes,
+        schreibgeschütztes float-Array in Sekunden (z. B. für Binärsuche).
+        Rückgabe: (DataFrame, Sekunden-Array)
+        """
+        key = recording_key(filepath)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0].copy(deep=False), entry[1]
+            self.misses += 1
+
+        # Laden außerhalb des Locks, damit andere Sitzungen nicht blockiert werden
+        df = loader(filepath)
+        seconds = df.index.total_seconds().to_numpy()
+        seconds.flags.writeable = False
+        size = int(df.memory_usage(index=True, deep=False).sum()) + seconds.nbytes
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (df, seconds, size)
+                self._bytes += size
+                self._evict()
+        return df.copy(deep=False), seconds
+
+    def _evict(self):
+        """Verdrängt die ältesten Einträge, bis das Speicherbudget eingehalten wird"""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Leert den Cache und setzt die Zähler zurück"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Gibt die aktuellen Cache-Kennzahlen als Dictionary zurück"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Prozessweiter Cache, geteilt von allen Tabs und Streamlit-Sitzungen
+FRAME_CACHE = CTGFrameCache()
+
+
+def load_ctg_frame(filepath):
+    """
+    Lädt eine CTG-Aufzeichnung über den prozessweiten LRU-Cache und den Spalten-Cache.
+    Args:
+        filepath (str): Pfad zur CSV-Datei mit Spalte 'time'.
+    Rückgabe: DataFrame mit Timedelta-Index 'time'. Die Spalten sind
+              schreibgeschützt und werden zwischen allen Aufrufern geteilt.
+    """
+    return FRAME_CACHE.get(filepath)
+
+
+def load_ctg_frame_with_seconds(filepath):
+    """
+    Wie load_ctg_frame, liefert zusätzlich den Zeitindex als sortiertes float-Array in Sekunden.
+    Rückgabe: (DataFrame, Sekunden-Array)
+    """
+    return FRAME_CACHE.get_with_seconds(filepath)
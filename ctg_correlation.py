@@ -0,0 +1,141 @@
+"""
+ctg_correlation.py
+
+Zeitlicher Zusammenhang zwischen Wehen (UC) und Herzfrequenz (LB).
+Für jede erkannte Wehe wird ein Fenster um den Wehengipfel ausgeschnitten und
+die Kreuzkorrelation zwischen UC und dem FHR-Abfall unter die Baseline per FFT
+berechnet - für alle Wehen gleichzeitig als Matrix (Wehen x Fensterlänge),
+ohne Schleifen über die Verschiebungen. Pro Wehe ergeben sich Verzögerung
+(lag) und Stärke des Zusammenhangs; folgt der FHR-Abfall der Wehe deutlich
+verzögert, wird er als mögliche späte Dezeleration markiert.
+"""
+import numpy as np
+import pandas as pd
+
+from ctg_interpretation import epoch_means, rolling_baseline, EPOCH_SECONDS, BASELINE_WINDOW_S
+from ctg_summary import lb_columns
+from wehen_analysis import WehenAnalysis
+
+PRE_SECONDS = 60        # Fenster vor dem Wehengipfel
+POST_SECONDS = 120      # Fenster nach dem Wehengipfel
+MAX_LAG_SECONDS = 90    # größte betrachtete Verzögerung FHR gegenüber UC
+LATE_LAG_SECONDS = 20   # ab dieser Verzögerung gilt ein Abfall als spät
+MIN_STRENGTH = 0.5      # Mindestkorrelation für eine Markierung
+MIN_DEPTH_BPM = 10      # Mindesttiefe des Abfalls unter die Baseline
+LAG_COLUMNS = ["peak_s", "lag_s", "strength", "depth_bpm", "late_deceleration"]
+
+
+def _windows(values, centers, pre, post):
+    """Schneidet für alle Zentren gleichzeitig Fenster [c - pre, c + post) aus (Randwerte werden wiederholt)"""
+    padded = np.pad(values, (pre, post), mode="edge")
+    return padded[centers[:, None] + np.arange(pre + post)[None, :]]
+
+
+def _zscore(rows):
+    """Standardisiert jede Zeile (Mittelwert 0, Standardabweichung 1; konstante Zeilen bleiben 0)"""
+    rows = rows - rows.mean(axis=1, keepdims=True)
+    std = rows.std(axis=1, keepdims=True)
+    return np.divide(rows, std, out=np.zeros_like(rows), where=std > 0)
+
+
+def cross_correlation(a, b, max_lag):
+    """
+    Normierte Kreuzkorrelation zeilenweise per FFT: c[k] ~ sum(a[t] * b[t + k]) für k = 0..max_lag.
+    Args:
+        a, b (np.ndarray): Matrizen gleicher Form (Fenster x Samples), bereits standardisiert.
+        max_lag (int): Größte Verschiebung in Samples.
+    Rückgabe: Matrix (Fenster x max_lag + 1).
+    """
+    length = a.shape[1]
+    n_fft = 1 << int(np.ceil(np.log2(2 * length)))
+    spectrum = np.conj(np.fft.rfft(a, n_fft, axis=1)) * np.fft.rfft(b, n_fft, axis=1)
+    corr = np.fft.irfft(spectrum, n_fft, axis=1)[:, :max_lag + 1]
+    # Normierung auf die Energie der überlappenden Abschnitte a[:L-k] und b[k:] (Kumulativsummen),
+    # damit bleibt |c[k]| <= 1 (Cauchy-Schwarz)
+    lags = np.arange(max_lag + 1)
+    energy_a = np.cumsum(a ** 2, axis=1)[:, length - 1 - lags]
+    energy_b = np.cumsum((b ** 2)[:, ::-1], axis=1)[:, length - 1 - lags]
+    norm = np.sqrt(energy_a * energy_b)
+    return np.divide(corr, norm, out=np.zeros_like(corr), where=norm > 0)
+
+
+def contraction_lags(times, uc, fhr, peak_times, baseline=None, pre_s=PRE_SECONDS, post_s=POST_SECONDS,
+                     max_lag_s=MAX_LAG_SECONDS):
+    """
+    Bestimmt für jede Wehe Verzögerung und Stärke des FHR-Abfalls relativ zur Wehe.
+    Args:
+        times (np.ndarray): Gleichmäßig abgetastete Zeitpunkte in Sekunden.
+        uc (np.ndarray): Wehentätigkeit.
+        fhr (np.ndarray): Fetale Herzfrequenz (0 und NaN = Signalverlust).
+        peak_times (np.ndarray): Zeitpunkte der Wehengipfel in Sekunden.
+        baseline (np.ndarray, optional): Baseline je Sample; Standard: gleitende Baseline (ctg_interpretation).
+    Rückgabe: DataFrame mit peak_s, lag_s, strength, depth_bpm, late_deceleration je Wehe.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    peak_times = np.asarray(peak_times, dtype=np.float64)
+    if len(peak_times) == 0 or len(times) < 2:
+        return pd.DataFrame(columns=LAG_COLUMNS)
+    fhr = np.where(np.asarray(fhr, dtype=np.float64) == 0, np.nan, fhr)
+    if baseline is None:
+        _, means, idx = epoch_means(times, fhr)
+        baseline = rolling_baseline(means, int(round(BASELINE_WINDOW_S / EPOCH_SECONDS)))[idx]
+
+    dt = float(np.median(np.diff(times)))
+    pre, post = int(round(pre_s / dt)), int(round(post_s / dt))
+    max_lag = min(int(round(max_lag_s / dt)), pre + post - 1)
+    centers = np.clip(np.searchsorted(times, peak_times), 0, len(times) - 1)
+
+    # FHR-Abfall unter die Baseline (positiv = tiefer); Signalverlust zählt als kein Abfall
+    dip = np.nan_to_num(baseline - fhr, nan=0.0)
+    uc_win = _windows(np.nan_to_num(np.asarray(uc, dtype=np.float64)), centers, pre, post)
+    dip_win = _windows(dip, centers, pre, post)
+
+    corr = cross_correlation(_zscore(uc_win), _zscore(dip_win), max_lag)
+    best = corr.argmax(axis=1)
+    lag_s = best * dt
+    strength = corr[np.arange(len(best)), best]
+    # Tiefe: größter Abfall ab dem Wehengipfel
+    depth = dip_win[:, pre:].max(axis=1)
+    late = (lag_s >= LATE_LAG_SECONDS) & (strength >= MIN_STRENGTH) & (depth >= MIN_DEPTH_BPM)
+    return pd.DataFrame({
+        "peak_s": times[centers],
+        "lag_s": lag_s,
+        "strength": strength,
+        "depth_bpm": depth,
+        "late_deceleration": late,
+    }, columns=LAG_COLUMNS)
+
+
+def recording_lags(ctg, height=5.0, distance=120):
+    """
+    Verknüpft die Wehen einer eingelesenen Aufzeichnung (CTG_Data) mit allen LB-Spalten.
+    Rückgabe: Dictionary {LB-Spalte: DataFrame wie contraction_lags}
+    """
+    if "UC" not in ctg.df.columns:
+        return {}
+    peaks = WehenAnalysis(ctg).detect_contractions(height=height, distance=distance)
+    peak_times = peaks["Wehenzeitpunkt (min)"].to_numpy() * 60
+    uc = ctg.df["UC"].to_numpy()
+    return {col: contraction_lags(ctg.seconds, uc, ctg.df[col].to_numpy(), peak_times)
+            for col in lb_columns(ctg.df.columns)}
+
+
+if __name__ == "__main__":
+    import time
+
+    # Synthetischer Test: jede Wehe zieht 30 s später einen Abfall von 20 bpm nach sich
+    t = np.arange(0, 3600, 0.5)
+    peaks = np.arange(300, 3400, 240.0)
+    uc = 10 + sum(60 * np.exp(-0.5 * ((t - p) / 20) ** 2) for p in peaks)
+    fhr = 140 - sum(20 * np.exp(-0.5 * ((t - p - 30) / 20) ** 2) for p in peaks)
+    fhr += np.random.default_rng(0).normal(0, 1.5, len(t))
+    t0 = time.perf_counter()
+    result = contraction_lags(t, uc, fhr, peaks)
+    print(f"{len(peaks)} Wehen in {(time.perf_counter() - t0) * 1000:.2f} ms")
+    print(result.round(2))
+
+    from read_CSV import CTG_Data
+    ctg = CTG_Data("data/CTG_data/CTG_twins_hypertension.csv")
+    ctg.read_csv()
+    for col, lags in recording_lags(ctg).items():
+        print(col, f"{len(lags)} Wehen, {int(lags['late_deceleration'].sum())} mögliche späte Dezelerationen")
@@ -0,0 +1,108 @@
+"""
+ctg_downsample.py
+
+Detailstufen (Level of Detail) für CTG-Diagramme.
+Lange Aufzeichnungen werden vor dem Zeichnen auf etwa zwei Punkte pro Pixel
+reduziert. Pro Bucket bleiben Minimum und Maximum erhalten, dadurch bleiben
+z. B. Bradykardie-Einbrüche und Wehenspitzen sichtbar. Für jede Aufzeichnung
+wird eine Pyramide aus immer gröberen Stufen einmalig aufgebaut und im Prozess
+gecacht; für den sichtbaren Bereich wird die passende Stufe per Binärsuche gewählt.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+LEVEL_FACTOR = 4          # jede Stufe fasst 4 Samples der feineren Stufe zusammen
+MIN_LEVEL_POINTS = 512    # gröbste Stufe
+MAX_PYRAMIDS = 32         # Anzahl gecachter Pyramiden (Aufzeichnung x Spalte)
+
+
+def minmax_downsample(x, y, n_buckets):
+    """
+    Reduziert eine Zeitreihe auf höchstens 2 * n_buckets Punkte.
+    Die Samples werden in gleich große Buckets geteilt; pro Bucket bleiben
+    Minimum und Maximum in zeitlicher Reihenfolge erhalten.
+    Args:
+        x (np.ndarray): Aufsteigende Zeitpunkte.
+        y (np.ndarray): Messwerte (NaN erlaubt).
+        n_buckets (int): Anzahl Buckets.
+    Rückgabe: (x_reduziert, y_reduziert)
+    """
+    n = len(y)
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return x, y
+    size = int(np.ceil(n / n_buckets))
+    rows = int(np.ceil(n / size))
+    y = np.asarray(y, dtype=np.float64)
+
+    # Auf volle Buckets auffüllen; NaN und Auffüllwerte nie als Min/Max wählen
+    pad = rows * size - n
+    lo = np.concatenate([np.where(np.isnan(y), np.inf, y), np.full(pad, np.inf)]).reshape(rows, size)
+    hi = np.concatenate([np.where(np.isnan(y), -np.inf, y), np.full(pad, -np.inf)]).reshape(rows, size)
+    offsets = np.arange(rows) * size
+    i_min = offsets + lo.argmin(axis=1)
+    i_max = offsets + hi.argmax(axis=1)
+
+    # Pro Bucket beide Indizes in zeitlicher Reihenfolge, doppelte entfernen
+    idx = np.sort(np.stack([i_min, i_max], axis=1), axis=1).ravel()
+    idx = idx[idx < n]
+    idx = idx[np.concatenate([[True], np.diff(idx) != 0])]
+    return x[idx], y[idx]
+
+
+class LODPyramid:
+    """
+    Mehrstufige Min/Max-Pyramide einer Zeitreihe.
+    Stufe 0 sind die Originaldaten, jede weitere Stufe ist um LEVEL_FACTOR gröber.
+    """
+    def __init__(self, x, y):
+        """Baut alle Stufen bis zur gröbsten Stufe (MIN_LEVEL_POINTS) auf"""
+        self.levels = [(np.asarray(x), np.asarray(y))]
+        n = len(y)
+        while n > 2 * MIN_LEVEL_POINTS:
+            n = n // LEVEL_FACTOR
+            px, py = self.levels[-1]
+            self.levels.append(minmax_downsample(px, py, max(n // 2, 1)))
+            if len(self.levels[-1][1]) >= len(py):
+                self.levels.pop()
+                break
+
+    def query(self, start_s, end_s, max_points):
+        """
+        Gibt die Punkte im Bereich [start_s, end_s] mit höchstens max_points Punkten zurück.
+        Es wird die feinste Stufe gewählt, die das Punktbudget einhält; reicht auch die
+        gröbste Stufe nicht, wird der Ausschnitt zusätzlich reduziert.
+        """
+        for x, y in self.levels:
+            i = np.searchsorted(x, start_s, side='left')
+            j = np.searchsorted(x, end_s, side='right')
+            if j - i <= max_points:
+                return x[i:j], y[i:j]
+        return minmax_downsample(x[i:j], y[i:j], max_points // 2)
+
+
+_pyramids = OrderedDict()
+_pyramid_lock = threading.Lock()
+
+
+def get_pyramid(key, column, x, y):
+    """
+    Gibt die gecachte Pyramide für (Aufzeichnung, Spalte) zurück und baut sie bei Bedarf auf.
+    Args:
+        key: Cache-Schlüssel der Aufzeichnung (siehe ctg_cache.recording_key).
+        column (str): Spaltenname.
+        x, y: Zeitpunkte in Sekunden und Messwerte der Spalte.
+    """
+    cache_key = (key, column)
+    with _pyramid_lock:
+        pyramid = _pyramids.get(cache_key)
+        if pyramid is not None:
+            _pyramids.move_to_end(cache_key)
+            return pyramid
+    pyramid = LODPyramid(x, y)
+    with _pyramid_lock:
+        _pyramids[cache_key] = pyramid
+        while len(_pyramids) > MAX_PYRAMIDS:
+            _pyramids.popitem(last=False)
+    return pyramid
@@ -0,0 +1,382 @@
+"""
+ctg_features.py
+
+Feature-Store für kohortenweite Auswertungen.
+Pro Aufzeichnung und LB-Spalte werden Kennzahlen (Baseline, Variabilität,
+Akzelerationen/Dezelerationen, Anzahl Wehen und späte Dezelerationen,
+HF-Statistik) einmalig beim Einlesen berechnet, zusammen mit den Risikomerkmalen der Person in einer
+SQLite-Datenbank abgelegt und für Abfragen als spaltenorientiertes DataFrame
+im Speicher gehalten. Filter wie "alle Zwillingsschwangerschaften mit mittlerer
+FHR unter 120" laufen damit in Millisekunden, ohne eine einzige CSV zu laden.
+
+Zusätzlich werden dieselben Kennzahlen pro Zeitfenster (Standard: 10 Minuten)
+gespeichert.
+"""
+import operator
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Person import Person
+from ctg_cache import recording_key
+from ctg_correlation import contraction_lags
+from ctg_interpretation import interpret_fhr
+from ctg_quality import CLEAN_DATA_VERSION
+from ctg_summary import lb_columns
+from read_CSV import CTG_Data
+from wehen_analysis import WehenAnalysis
+
+FEATURE_DB_PATH = "data/ctg_features.sqlite"
+WINDOW_SECONDS = 600
+SCHEMA_VERSION = 5  # bei geänderten Kennzahlen erhöhen: Tabellen werden dann neu aufgebaut
+WEHEN_HEIGHT = 5.0
+WEHEN_DISTANCE = 120
+
+FEATURE_COLUMNS = ["baseline", "variability", "stv_ms", "accelerations", "decelerations", "contractions",
+                   "late_decelerations",
+                   "mean_hr", "min_hr", "max_hr", "signal_loss"]
+
+# Erlaubte Filter für Kohorten-Abfragen: nur numerische Spalten und Vergleichsoperatoren
+FILTER_COLUMNS = ["age", "fetuses", "gestational_age_weeks", "high_risk", "ctg_index", "duration_s"] + FEATURE_COLUMNS
+FILTER_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+def fhr_features(times, fhr, contraction_times=(), late_decelerations=0):
+    """
+    Berechnet die Kennzahlen einer FHR-Zeitreihe (ein Zeitfenster oder eine ganze Aufzeichnung).
+    Baseline, Kurzzeitvariabilität (stv_ms), Langzeitvariabilität (variability) sowie
+    Akzelerationen/Dezelerationen stammen aus ctg_interpretation; late_decelerations ist die
+    Anzahl der Wehen mit verzögertem FHR-Abfall (ctg_correlation).
+    Rückgabe: Dictionary mit den Werten aus FEATURE_COLUMNS.
+    """
+    fhr = np.where(fhr == 0, np.nan, np.asarray(fhr, dtype=np.float64))
+    valid = ~np.isnan(fhr)
+    features = dict.fromkeys(FEATURE_COLUMNS, np.nan)
+    features.update(accelerations=0, decelerations=0, contractions=len(contraction_times),
+                    late_decelerations=int(late_decelerations),
+                    signal_loss=float(1 - valid.mean()) if len(fhr) else 1.0)
+    if not valid.any():
+        return features
+
+    interp = interpret_fhr(times, fhr)
+    v = fhr[valid]
+    features.update(
+        baseline=interp.baseline_bpm,
+        variability=interp.ltv_bpm,
+        stv_ms=interp.stv_ms,
+        accelerations=len(interp.accelerations),
+        decelerations=len(interp.decelerations),
+        mean_hr=float(v.mean()),
+        min_hr=float(v.min()),
+        max_hr=float(v.max()),
+    )
+    return features
+
+
+def person_features(person_data):
+    """Risikomerkmale einer Person als flaches Dictionary"""
+    person = Person(person_data)
+    return {
+        "person_id": str(person.id),
+        "name": f"{person.lastname}, {person.firstname}",
+        "age": person.calculate_age(),
+        "fetuses": person.fetuses,
+        "gestational_age_weeks": person.gestational_age_weeks,
+        "high_risk": int(person.is_high_risk_pregnancy()),
+        "medical_conditions": ", ".join(person.medical_conditions),
+    }
+
+
+def recording_features(csv_path, window_seconds=WINDOW_SECONDS):
+    """
+    Berechnet die Kennzahlen aller LB-Spalten einer Aufzeichnung, gesamt und je Zeitfenster.
+    Rückgabe: (Liste der Gesamtzeilen, Liste der Fensterzeilen) als Dictionaries.
+    """
+    ctg = CTG_Data(csv_path)
+    df = ctg.read_csv()
+    times = ctg.seconds
+    contractions = np.empty(0)
+    if "UC" in df.columns:
+        contractions = WehenAnalysis(ctg).detect_contractions(
+            height=WEHEN_HEIGHT, distance=WEHEN_DISTANCE)["Wehenzeitpunkt (min)"].to_numpy() * 60
+        uc = df["UC"].to_numpy()
+
+    duration = float(times[-1] - times[0]) if len(times) else 0.0
+    starts = np.arange(times[0], times[-1], window_seconds) if len(times) else np.empty(0)
+    bounds = np.searchsorted(times, starts, side="left")
+    rows, windows = [], []
+    for lb_col in lb_columns(df.columns):
+        fhr = df[lb_col].to_numpy()
+        late = np.empty(0)
+        if len(contractions):
+            lags = contraction_lags(times, uc, fhr, contractions)
+            late = lags["peak_s"].to_numpy()[lags["late_deceleration"].to_numpy(dtype=bool)]
+        rows.append({"lb_col": lb_col, "duration_s": duration,
+                     **fhr_features(times, fhr, contractions, len(late))})
+        for start_s, i, j in zip(starts, bounds, np.append(bounds[1:], len(times))):
+            end_s = start_s + window_seconds
+            in_window = contractions[(contractions >= start_s) & (contractions < end_s)]
+            late_in_window = np.count_nonzero((late >= start_s) & (late < end_s))
+            windows.append({"lb_col": lb_col, "window_start_s": float(start_s),
+                            **fhr_features(times[i:j], fhr[i:j], in_window, late_in_window)})
+    return rows, windows
+
+
+class FeatureStore:
+    """
+    SQLite-gestützter Feature-Store mit spaltenorientiertem Abfrage-Cache (pandas).
+    Jeder Thread erhält eine eigene Verbindung; der Abfrage-Cache wird neu geladen,
+    sobald eine Sitzung (auch in einem anderen Prozess) Daten geschrieben hat.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS person_features (
+            person_id TEXT PRIMARY KEY,
+            name TEXT,
+            age INTEGER,
+            fetuses INTEGER,
+            gestational_age_weeks INTEGER,
+            high_risk INTEGER,
+            medical_conditions TEXT
+        );
+        CREATE TABLE IF NOT EXISTS recording_features (
+            person_id TEXT NOT NULL REFERENCES person_features (person_id) ON DELETE CASCADE,
+            ctg_index INTEGER NOT NULL,
+            lb_col TEXT NOT NULL,
+            ctg_date TEXT,
+            result_link TEXT,
+            source_key TEXT NOT NULL,
+            duration_s REAL,
+            baseline REAL,
+            variability REAL,
+            stv_ms REAL,
+            accelerations INTEGER,
+            decelerations INTEGER,
+            contractions INTEGER,
+            late_decelerations INTEGER,
+            mean_hr REAL,
+            min_hr REAL,
+            max_hr REAL,
+            signal_loss REAL,
+            PRIMARY KEY (person_id, ctg_index, lb_col)
+        );
+        CREATE INDEX IF NOT EXISTS idx_recording_mean_hr ON recording_features (mean_hr);
+        CREATE TABLE IF NOT EXISTS window_features (
+            person_id TEXT NOT NULL REFERENCES person_features (person_id) ON DELETE CASCADE,
+            ctg_index INTEGER NOT NULL,
+            lb_col TEXT NOT NULL,
+            window_start_s REAL NOT NULL,
+            baseline REAL,
+            variability REAL,
+            stv_ms REAL,
+            accelerations INTEGER,
+            decelerations INTEGER,
+            contractions INTEGER,
+            late_decelerations INTEGER,
+            mean_hr REAL,
+            min_hr REAL,
+            max_hr REAL,
+            signal_loss REAL,
+            PRIMARY KEY (person_id, ctg_index, lb_col, window_start_s)
+        );
+    """
+    RECORDING_COLUMNS = ["person_id", "ctg_index", "lb_col", "ctg_date", "result_link", "source_key",
+                         "duration_s"] + FEATURE_COLUMNS
+    WINDOW_COLUMNS = ["person_id", "ctg_index", "lb_col", "window_start_s"] + FEATURE_COLUMNS
+    PERSON_COLUMNS = ["person_id", "name", "age", "fetuses", "gestational_age_weeks", "high_risk",
+                      "medical_conditions"]
+
+    def __init__(self, path=FEATURE_DB_PATH, window_seconds=WINDOW_SECONDS):
+        """Öffnet (bzw. erzeugt) die Datenbank und legt das Schema an"""
+        self.path = path
+        self.window_seconds = window_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._frames_version = None
+        conn = self._connect()
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Abgeleitete Daten: bei neuem Schema verwerfen und beim nächsten Einlesen neu berechnen
+            conn.executescript("""
+                DROP TABLE IF EXISTS window_features;
+                DROP TABLE IF EXISTS recording_features;
+                DROP TABLE IF EXISTS person_features;
+            """)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        """Gibt die Verbindung des aktuellen Threads zurück und öffnet sie bei Bedarf"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _version(self):
+        """Änderungszähler der Datenbankdatei (ändert sich bei jedem Commit, auch aus anderen Prozessen)"""
+        try:
+            stat = os.stat(self.path + "-wal")
+            wal = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            wal = None
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size, wal
+
+    def ingest_person(self, person_data, force=False):
+        """
+        Übernimmt eine Person in den Feature-Store.
+        Die Risikomerkmale werden immer aktualisiert; Aufzeichnungen nur, wenn sie neu sind
+        oder sich die CSV-Datei seit der letzten Berechnung geändert hat (oder force=True).
+        Rückgabe: Anzahl neu berechneter Aufzeichnungen.
+        """
+        person = person_features(person_data)
+        conn = self._connect()
+        stored = dict(conn.execute(
+            "SELECT ctg_index, source_key FROM recording_features WHERE person_id = ?",
+            (person["person_id"],)).fetchall())
+
+        computed = []
+        for ctg_index, test in enumerate(person_data.get("CTG_tests", [])):
+            path = test["result_link"]
+            if not os.path.exists(path):
+                continue
+            # Dateistand und Stand der Bereinigung: beides macht gespeicherte Kennzahlen ungültig
+            source_key = "|".join(map(str, (*recording_key(path), CLEAN_DATA_VERSION)))
+            if not force and stored.get(ctg_index) == source_key:
+                continue
+            rows, windows = recording_features(path, self.window_seconds)
+            computed.append((ctg_index, test, source_key, rows, windows))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO person_features ({', '.join(self.PERSON_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.PERSON_COLUMNS))}) "
+                f"ON CONFLICT (person_id) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in self.PERSON_COLUMNS[1:]),
+                [person[c] for c in self.PERSON_COLUMNS])
+            # Nicht mehr vorhandene CTG-Tests entfernen
+            n_tests = len(person_data.get("CTG_tests", []))
+            for table in ("recording_features", "window_features"):
+                conn.execute(f"DELETE FROM {table} WHERE person_id = ? AND ctg_index >= ?",
+                             (person["person_id"], n_tests))
+            for ctg_index, test, source_key, rows, windows in computed:
+                for table in ("recording_features", "window_features"):
+                    conn.execute(f"DELETE FROM {table} WHERE person_id = ? AND ctg_index = ?",
+                                 (person["person_id"], ctg_index))
+                base = {"person_id": person["person_id"], "ctg_index": ctg_index,
+                        "ctg_date": test.get("date"), "result_link": test["result_link"],
+                        "source_key": source_key}
+                self._insert(conn, "recording_features", self.RECORDING_COLUMNS,
+                             [{**base, **row} for row in rows])
+                self._insert(conn, "window_features", self.WINDOW_COLUMNS,
+                             [{**base, **row} for row in windows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(computed)
+
+    @staticmethod
+    def _insert(conn, table, columns, rows):
+        """Fügt mehrere Zeilen (Dictionaries) in einem executemany ein"""
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [[row.get(c) for c in columns] for row in rows])
+
+    def ingest_all(self, persons, force=False):
+        """Übernimmt alle Personen; Personen, die es nicht mehr gibt, werden entfernt"""
+        computed = sum(self.ingest_person(person, force=force) for person in persons)
+        ids = [str(person["id"]) for person in persons]
+        conn = self._connect()
+        conn.execute(f"DELETE FROM person_features WHERE person_id NOT IN ({', '.join('?' * len(ids))})", ids)
+        return computed
+
+    def _frame(self, name, sql):
+        """Lädt eine Abfrage als DataFrame und hält sie bis zur nächsten Änderung der Datenbank im Speicher"""
+        version = self._version()
+        with self._lock:
+            if version != self._frames_version:
+                self._frames = {}
+                self._frames_version = version
+            frame = self._frames.get(name)
+        if frame is None:
+            frame = pd.read_sql_query(sql, self._connect())
+            with self._lock:
+                self._frames[name] = frame
+        return frame
+
+    def recordings(self):
+        """Alle Aufzeichnungen (je LB-Spalte) mit Risikomerkmalen der Person als DataFrame"""
+        return self._frame("recordings", """
+            SELECT p.*, r.ctg_index, r.lb_col, r.ctg_date, r.result_link, r.duration_s,
+                   r.baseline, r.variability, r.stv_ms, r.accelerations, r.decelerations, r.contractions,
+                   r.late_decelerations, r.mean_hr, r.min_hr, r.max_hr, r.signal_loss
+            FROM recording_features r JOIN person_features p USING (person_id)
+            ORDER BY p.name, r.ctg_index, r.lb_col
+        """)
+
+    def windows(self):
+        """Kennzahlen je Zeitfenster mit Risikomerkmalen der Person als DataFrame"""
+        return self._frame("windows", """
+            SELECT p.*, w.ctg_index, w.lb_col, w.window_start_s,
+                   w.baseline, w.variability, w.stv_ms, w.accelerations, w.decelerations, w.contractions,
+                   w.late_decelerations, w.mean_hr, w.min_hr, w.max_hr, w.signal_loss
+            FROM window_features w JOIN person_features p USING (person_id)
+            ORDER BY p.name, w.ctg_index, w.lb_col, w.window_start_s
+        """)
+
+    def cohort(self, filters=()):
+        """
+        Filtert die Aufzeichnungen mit UND-verknüpften Bedingungen.
+        Args:
+            filters: Folge von (Spalte, Operator, Zahl), z. B. [("fetuses", ">", 1), ("mean_hr", "<", 120)].
+                     Spalten aus FILTER_COLUMNS, Operatoren aus FILTER_OPERATORS.
+        Rückgabe: Gefilterte Aufzeichnungen als DataFrame (ohne Filter: alle).
+        Raises:
+            ValueError: Bei unbekannter Spalte, unbekanntem Operator oder nicht numerischem Wert.
+        """
+        frame = self.recordings()
+        mask = np.ones(len(frame), dtype=bool)
+        for column, op, value in filters:
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unbekannte Spalte: {column}")
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f"Unbekannter Operator: {op}")
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Kein Zahlenwert: {value!r}") from None
+            mask &= FILTER_OPERATORS[op](frame[column].to_numpy(dtype=np.float64), value)
+        return frame[mask]
+
+
+def open_feature_store(path=None):
+    """Öffnet den Feature-Store (Standard: Umgebungsvariable CTG_FEATURE_DB oder FEATURE_DB_PATH)"""
+    return FeatureStore(path or os.environ.get("CTG_FEATURE_DB", FEATURE_DB_PATH))
+
+
+if __name__ == "__main__":
+    import time
+
+    store = open_feature_store()
+    t0 = time.perf_counter()
+    computed = store.ingest_all(Person.load_person_data())
+    print(f"{computed} Aufzeichnungen in {time.perf_counter() - t0:.2f} s berechnet")
+    store.recordings()
+    t0 = time.perf_counter()
+    twins = store.cohort([("fetuses", ">", 1), ("mean_hr", "<", 150)])
+    print(f"Kohorte in {(time.perf_counter() - t0) * 1000:.2f} ms: {len(twins)} Aufzeichnungen")
+    print(twins[["name", "lb_col", "baseline", "variability", "accelerations", "decelerations", "mean_hr"]])
@@ -0,0 +1,136 @@
+"""
+ctg_figure_cache.py
+
+Inhaltsadressierter Cache für gerenderte CTG-Diagramme (PNG).
+Der Schlüssel ergibt sich aus dem Inhaltshash der Aufzeichnung, der LB-Spalte,
+dem Zeitfenster, der Bildgröße, einer Variante, der Renderer-Version und dem Stand
+der Bereinigung (ctg_quality.CLEAN_DATA_VERSION).
+Gleiche Eingaben ergeben also immer dieselbe Datei; wiederholte Berichte und
+Stapel-Berichte (auch aus mehreren Worker-Prozessen) lesen das fertige Bild.
+Die Bilder liegen unter .ctg_cache/figures/v<RENDER_VERSION> neben den Aufzeichnungen.
+Nach jedem neu geschriebenen Bild werden Verzeichnisse älterer Renderer-Versionen
+entfernt und die am längsten nicht genutzten Bilder gelöscht, sobald das Verzeichnis
+MAX_FIGURE_BYTES überschreitet (Treffer aktualisieren die mtime).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from ctg_cache import CACHE_DIRNAME, recording_hash
+from ctg_quality import CLEAN_DATA_VERSION
+
+FIGURE_DIRNAME = "figures"
+RENDER_VERSION = 3  # erhöhen, wenn sich das Aussehen der Diagramme ändert
+MAX_FIGURE_BYTES = 256 * 1024 * 1024  # Obergrenze je Datenverzeichnis
+
+stats = {"hits": 0, "misses": 0}
+
+
+def figure_key(filepath, lb_col, start_s, end_s, width, height, variant=""):
+    """Gibt den Inhaltsschlüssel (SHA-256, hex) eines Diagramms zurück"""
+    params = {
+        "recording": recording_hash(filepath),
+        "lb_col": lb_col,
+        "window": [float(start_s), float(end_s)],
+        "size": [int(width), int(height)],
+        "variant": variant,
+        "version": RENDER_VERSION,
+        "clean": CLEAN_DATA_VERSION,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def figure_root(filepath):
+    """Verzeichnis aller Diagramm-Caches neben der Aufzeichnung"""
+    return os.path.join(os.path.dirname(os.path.abspath(filepath)), CACHE_DIRNAME, FIGURE_DIRNAME)
+
+
+def figure_path(filepath, key):
+    """Pfad der PNG-Datei zu einem Schlüssel (Unterverzeichnis der aktuellen RENDER_VERSION)"""
+    return os.path.join(figure_root(filepath), f"v{RENDER_VERSION}", f"{key}.png")
+
+
+def prune_figures(root, max_bytes=MAX_FIGURE_BYTES):
+    """
+    Räumt den Diagramm-Cache auf: entfernt Bilder älterer Renderer-Versionen und löscht
+    die am längsten nicht genutzten Bilder (mtime), bis höchstens max_bytes belegt sind.
+    Dateien, die ein paralleler Worker bereits entfernt hat, werden übersprungen.
+    Rückgabe: Anzahl gelöschter Bilder der aktuellen Version.
+    """
+    current = f"v{RENDER_VERSION}"
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.name == current:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            elif entry.name.endswith(".png"):
+                try:
+                    os.remove(entry.path)  # Bilder aus der Zeit vor den Versionsverzeichnissen
+                except FileNotFoundError:
+                    pass
+
+    files = []
+    with os.scandir(os.path.join(root, current)) as it:
+        for entry in it:
+            if entry.name.endswith(".png") and not entry.name.startswith(".tmp-"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def get_or_render(filepath, lb_col, start_s, end_s, width, height, render, variant=""):
+    """
+    Gibt das PNG eines Diagramms zurück; nur bei einem Cache-Fehlschlag wird render() aufgerufen.
+    Args:
+        filepath (str): Pfad zur Aufzeichnung.
+        lb_col (str): Gezeichnete LB-Spalte.
+        start_s, end_s (float): Zeitfenster in Sekunden.
+        width, height (int): Bildgröße in Pixeln.
+        render: Funktion ohne Argumente, die das PNG als Bytes liefert.
+        variant (str): Unterscheidet verschiedene Darstellungen desselben Fensters.
+    Rückgabe: PNG als Bytes.
+    """
+    path = figure_path(filepath, figure_key(filepath, lb_col, start_s, end_s, width, height, variant))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        stats["hits"] += 1
+    except FileNotFoundError:
+        pass
+    else:
+        try:
+            os.utime(path)  # zuletzt genutzt: schützt das Bild vor der Verdrängung
+        except OSError:
+            pass
+        return data
+
+    stats["misses"] += 1
+    data = render()
+    try:
+        # Atomar schreiben: parallele Worker sehen nie ein halb geschriebenes Bild
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".png")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        prune_figures(figure_root(filepath), MAX_FIGURE_BYTES)
+    except OSError:
+        pass  # Schreibgeschütztes Datenverzeichnis: Bild trotzdem zurückgeben
+    return data
@@ -0,0 +1,289 @@
+"""
+ctg_ingest.py
+
+Kleiner TCP-Ingest-Server für Live-CTG-Geräte.
+Geräte senden LB1/LB2/UC-Samples in einem kompakten Binärformat; der Server
+legt sie pro Patientin in einem Ringpuffer fester Größe ab, aus dem die
+Oberfläche ohne Dateizugriffe lesen kann.
+
+Binärformat (Little Endian), ein Frame:
+    Header  : magic b"CT" | version (uint8) | Anzahl Samples n (uint16) | Patienten-ID (uint32)
+    Samples : n x (Zeit in s (float64) | LB1 (float32) | LB2 (float32) | UC (float32))
+Fehlende Kanäle werden als NaN übertragen.
+
+Ein Geräte-Emulator spielt aufgezeichnete CSV-Dateien mit einstellbarem Tempo
+in den Server ein. Lasttest auf einem Rechner:
+    python ctg_ingest.py --bench
+"""
+import asyncio
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from ctg_cache import load_ctg_frame_with_seconds
+
+MAGIC = b"CT"
+VERSION = 1
+HEADER = struct.Struct("<2sBHI")
+SAMPLE_DTYPE = np.dtype([("time", "<f8"), ("LB1", "<f4"), ("LB2", "<f4"), ("UC", "<f4")])
+MAX_SAMPLES_PER_FRAME = 65535
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9750
+DEFAULT_CAPACITY = 4 * 3600 * 4  # 4 Stunden bei 4 Hz
+
+
+def patient_key(person_id):
+    """Bildet eine Personen-ID auf die 32-Bit-Patienten-ID des Binärformats ab"""
+    try:
+        return int(person_id) & 0xFFFFFFFF
+    except (TypeError, ValueError):
+        return zlib.crc32(str(person_id).encode("utf-8"))
+
+
+def encode_frame(patient_id, samples):
+    """
+    Kodiert Samples (strukturiertes Array mit SAMPLE_DTYPE) als Binär-Frame.
+    Raises:
+        ValueError: Wenn mehr als MAX_SAMPLES_PER_FRAME Samples übergeben werden.
+    """
+    if len(samples) > MAX_SAMPLES_PER_FRAME:
+        raise ValueError(f"Höchstens {MAX_SAMPLES_PER_FRAME} Samples pro Frame.")
+    header = HEADER.pack(MAGIC, VERSION, len(samples), patient_id)
+    return header + np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).tobytes()
+
+
+def samples_from_frame(df, seconds):
+    """Wandelt ein CTG-DataFrame (LB oder LB1/LB2, UC) in ein Sample-Array mit SAMPLE_DTYPE um"""
+    samples = np.empty(len(df), dtype=SAMPLE_DTYPE)
+    samples["time"] = seconds
+    samples["LB1"] = df["LB1"] if "LB1" in df.columns else df["LB"] if "LB" in df.columns else np.nan
+    samples["LB2"] = df["LB2"] if "LB2" in df.columns else np.nan
+    samples["UC"] = df["UC"] if "UC" in df.columns else np.nan
+    return samples
+
+
+class PatientRingBuffer:
+    """Ringpuffer fester Kapazität für die Samples einer Patientin (threadsicher)"""
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Legt den Puffer mit der angegebenen Kapazität (Samples) an"""
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self._count = 0  # insgesamt geschriebene Samples
+        self._lock = threading.Lock()
+
+    def extend(self, samples):
+        """
+        Hängt Samples an; bei vollem Puffer werden die ältesten überschrieben.
+        Beginnt die Zeitbasis neu (erstes Sample nicht nach dem neuesten gespeicherten, z. B. bei
+        einem erneut gestarteten Gerät), wird der Puffer zuvor geleert. So bleiben die Zeitpunkte
+        aufsteigend, wie es since() und window() voraussetzen.
+        """
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        with self._lock:
+            if n and self._count and samples["time"][0] <= self._data[(self._count - 1) % self.capacity]["time"]:
+                self._count = 0  # neue Sitzung
+            start = self._count % self.capacity
+            first = min(n, self.capacity - start)
+            self._data[start:start + first] = samples[:first]
+            self._data[:n - first] = samples[first:]
+            self._count += n
+
+    def __len__(self):
+        """Anzahl aktuell gespeicherter Samples"""
+        return min(self._count, self.capacity)
+
+    def latest(self, n=None):
+        """Gibt die letzten n Samples (Standard: alle gespeicherten) in zeitlicher Reihenfolge zurück"""
+        with self._lock:
+            size = min(self._count, self.capacity)
+            n = size if n is None else min(n, size)
+            end = self._count % self.capacity
+            idx = (np.arange(end - n, end)) % self.capacity
+            return self._data[idx].copy()
+
+    def since(self, t_s):
+        """Gibt alle gespeicherten Samples mit Zeitpunkt nach t_s zurück (für inkrementelles Lesen)"""
+        data = self.latest()
+        return data[np.searchsorted(data["time"], t_s, side="right"):]
+
+    def window(self, seconds):
+        """Gibt alle Samples der letzten 'seconds' Sekunden (bezogen auf das neueste Sample) zurück"""
+        data = self.latest()
+        if len(data) == 0:
+            return data
+        start = np.searchsorted(data["time"], data["time"][-1] - seconds, side="left")
+        return data[start:]
+
+
+class IngestServer:
+    """
+    asyncio-TCP-Server, der Binär-Frames entgegennimmt und pro Patientin puffert.
+
+    Attributes:
+        buffers (dict): Patienten-ID -> PatientRingBuffer.
+        frames (int): Anzahl empfangener Frames.
+        samples (int): Anzahl empfangener Samples.
+    """
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, capacity=DEFAULT_CAPACITY):
+        """Initialisiert den Server (gestartet wird er mit serve() bzw. start_in_background())"""
+        self.host = host
+        self.port = port
+        self.capacity = capacity
+        self.buffers = {}
+        self.frames = 0
+        self.samples = 0
+        self._server = None
+        self._loop = None
+        self._buffers_lock = threading.Lock()
+
+    def buffer(self, patient_id):
+        """Gibt den Ringpuffer der Patientin zurück und legt ihn bei Bedarf an"""
+        with self._buffers_lock:
+            buf = self.buffers.get(patient_id)
+            if buf is None:
+                buf = self.buffers[patient_id] = PatientRingBuffer(self.capacity)
+            return buf
+
+    async def _handle(self, reader, writer):
+        """Liest Frames einer Geräteverbindung, bis diese geschlossen wird"""
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                magic, version, n, patient_id = HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION:
+                    break  # Unbekanntes Format: Verbindung schließen
+                payload = await reader.readexactly(n * SAMPLE_DTYPE.itemsize)
+                self.buffer(patient_id).extend(np.frombuffer(payload, dtype=SAMPLE_DTYPE))
+                self.frames += 1
+                self.samples += n
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """Startet den Server auf der aktuellen Event-Loop (Port 0: freier Port wird gewählt)"""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start_in_background(self, timeout=5.0):
+        """
+        Startet den Server mit eigener Event-Loop in einem Daemon-Thread.
+        Raises:
+            OSError: Wenn der Port nicht gebunden werden kann (z. B. bereits belegt).
+            TimeoutError: Wenn der Server nicht innerhalb von timeout Sekunden bereit ist.
+        """
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            async def main():
+                await self.serve()
+                ready.set()
+                async with self._server:
+                    await self._server.serve_forever()
+            try:
+                asyncio.run(main())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                errors.append(e)
+                ready.set()
+
+        threading.Thread(target=run, name="ctg-ingest", daemon=True).start()
+        if not ready.wait(timeout=timeout):
+            raise TimeoutError(f"Ingest-Server auf {self.host}:{self.port} nicht innerhalb von {timeout} s gestartet.")
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self):
+        """Beendet einen im Hintergrund gestarteten Server"""
+        if self._server is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+
+async def emulate_device(csv_path, patient_id, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                         speed=1.0, samples_per_frame=4):
+    """
+    Geräte-Emulator: spielt eine aufgezeichnete CSV-Datei in den Ingest-Server ein.
+    Args:
+        csv_path (str): Pfad zur CTG-Datei.
+        patient_id (int): Patienten-ID im Binärformat (siehe patient_key).
+        speed (float): Aufzeichnungssekunden pro Echtzeitsekunde; 0 = so schnell wie möglich.
+        samples_per_frame (int): Anzahl Samples pro gesendetem Frame.
+    Rückgabe: Anzahl gesendeter Samples.
+    """
+    df, seconds = load_ctg_frame_with_seconds(csv_path)
+    samples = samples_from_frame(df, seconds)
+    reader, writer = await asyncio.open_connection(host, port)
+    start = time.monotonic()
+    try:
+        for i in range(0, len(samples), samples_per_frame):
+            chunk = samples[i:i + samples_per_frame]
+            if speed > 0:
+                # Bis zum Aufzeichnungszeitpunkt des ersten Samples im Frame warten
+                due = start + (chunk["time"][0] - samples["time"][0]) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(encode_frame(patient_id, chunk))
+            await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return len(samples)
+
+
+def start_emulator_thread(csv_path, patient_id, host=DEFAULT_HOST, port=DEFAULT_PORT, speed=1.0):
+    """Startet den Geräte-Emulator in einem Daemon-Thread (z. B. aus Streamlit heraus)"""
+    thread = threading.Thread(
+        target=lambda: asyncio.run(emulate_device(csv_path, patient_id, host, port, speed)),
+        name=f"ctg-emulator-{patient_id}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+async def _benchmark(paths, devices, samples_per_frame):
+    """Lasttest: mehrere Emulatoren senden gleichzeitig so schnell wie möglich"""
+    server = IngestServer(port=0)
+    await server.serve()
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        emulate_device(paths[i % len(paths)], i, server.host, server.port,
+                       speed=0, samples_per_frame=samples_per_frame)
+        for i in range(devices)
+    ])
+    # Warten, bis der Server alle Frames verarbeitet hat
+    expected = sum(len(load_ctg_frame_with_seconds(paths[i % len(paths)])[1]) for i in range(devices))
+    while server.samples < expected:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    print(f"{devices} Geräte, {samples_per_frame} Samples/Frame: {server.samples} Samples "
+          f"in {elapsed:.2f} s ({server.samples / elapsed:,.0f} Samples/s, {server.frames / elapsed:,.0f} Frames/s)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    paths = ["data/CTG_data/CTG_twins_healthy.csv", "data/CTG_data/CTG_data3.csv"]
+    if "--bench" in sys.argv:
+        for spf in (1, 4, 64):
+            asyncio.run(_benchmark(paths, devices=10, samples_per_frame=spf))
+    else:
+        server = IngestServer().start_in_background()
+        print(f"Ingest-Server läuft auf {server.host}:{server.port} (Strg+C beendet)")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"{server.frames} Frames, {server.samples} Samples, {len(server.buffers)} Patientinnen")
+        except KeyboardInterrupt:
+            server.stop()
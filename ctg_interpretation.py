@@ -0,0 +1,239 @@
+"""
+ctg_interpretation.py
+
+Vektorisierte CTG-Interpretation je LB-Spalte:
+- gleitende FHR-Baseline (Kumulativsummen über Epochen, Akzelerationen und
+  Dezelerationen werden in einem zweiten Durchlauf ausgeblendet)
+- Kurzzeitvariabilität (STV, nach Dawes-Redman in ms über 1/16-Minuten-Epochen)
+- Langzeitvariabilität (LTV, Schwankungsbreite je Minute über ein Stride-Fenster)
+- Akzelerationen und Dezelerationen als Episoden (Lauflängenkodierung)
+
+Alle Kernels arbeiten ohne Python-Schleifen über die Samples; eine zweistündige
+Zwillingsaufzeichnung wird in wenigen Millisekunden ausgewertet.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ctg_cache import recording_key
+from ctg_summary import lb_columns
+
+EPOCH_SECONDS = 3.75          # 1/16 Minute (Dawes-Redman)
+EPOCHS_PER_MINUTE = 16
+BASELINE_WINDOW_S = 600       # gleitendes Fenster der Baseline (10 Minuten)
+EPISODE_BPM = 15              # Akzeleration/Dezeleration: mindestens 15 bpm Abweichung ...
+EPISODE_MIN_SECONDS = 15      # ... für mindestens 15 Sekunden
+EPISODE_COLUMNS = ["start_s", "end_s", "duration_s", "amplitude_bpm"]
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class FHRInterpretation:
+    """
+    Ergebnis der Interpretation einer FHR-Zeitreihe.
+
+    Attributes:
+        epoch_times (np.ndarray): Mittelpunkt jeder Epoche in Sekunden.
+        baseline (np.ndarray): Gleitende Baseline je Epoche (bpm, NaN ohne gültige Werte).
+        baseline_bpm (float): Baseline der gesamten Aufzeichnung (Median, bpm).
+        stv_ms (float): Kurzzeitvariabilität in ms.
+        ltv_bpm (float): Langzeitvariabilität (Median der Schwankungsbreite je Minute, bpm).
+        accelerations (pd.DataFrame): Episoden mit start_s, end_s, duration_s, amplitude_bpm.
+        decelerations (pd.DataFrame): wie accelerations (Amplitude negativ).
+    """
+    def __init__(self, epoch_times, baseline, stv_ms, ltv_bpm, accelerations, decelerations):
+        """Speichert die berechneten Kennzahlen"""
+        self.epoch_times = epoch_times
+        self.baseline = baseline
+        valid = baseline[~np.isnan(baseline)]
+        self.baseline_bpm = float(np.median(valid)) if len(valid) else float("nan")
+        self.stv_ms = stv_ms
+        self.ltv_bpm = ltv_bpm
+        self.accelerations = accelerations
+        self.decelerations = decelerations
+
+    def summary(self):
+        """Kennzahlen als flaches Dictionary (z. B. für Feature-Store und Bericht)"""
+        return {
+            "baseline": self.baseline_bpm,
+            "stv_ms": self.stv_ms,
+            "ltv_bpm": self.ltv_bpm,
+            "accelerations": len(self.accelerations),
+            "decelerations": len(self.decelerations),
+        }
+
+
+def epoch_means(times, fhr, epoch_s=EPOCH_SECONDS):
+    """
+    Mittelt die gültigen FHR-Werte je Epoche fester Länge (bincount statt Gruppierung).
+    Nullwerte und NaN gelten als Signalverlust.
+    Rückgabe: (Epochen-Mittelpunkte in s, Mittelwerte je Epoche (NaN für leere Epochen), Epochenindex je Sample)
+    """
+    t0 = times[0]
+    idx = ((times - t0) // epoch_s).astype(np.int64)
+    n_epochs = int(idx[-1]) + 1
+    valid = ~np.isnan(fhr) & (fhr != 0)
+    sums = np.bincount(idx[valid], weights=fhr[valid], minlength=n_epochs)
+    counts = np.bincount(idx[valid], minlength=n_epochs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    means[counts == 0] = np.nan
+    centers = t0 + (np.arange(n_epochs) + 0.5) * epoch_s
+    return centers, means, idx
+
+
+def rolling_mean(values, window):
+    """
+    Zentrierter gleitender Mittelwert über Kumulativsummen; NaN-Werte werden ausgelassen.
+    Rückgabe: Array gleicher Länge (NaN, wenn das Fenster keine gültigen Werte enthält).
+    """
+    valid = ~np.isnan(values)
+    csum = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+    ccnt = np.concatenate([[0], np.cumsum(valid)])
+    n = len(values)
+    half = window // 2
+    lo = np.clip(np.arange(n) - half, 0, n)
+    hi = np.clip(np.arange(n) + half + 1, 0, n)
+    counts = ccnt[hi] - ccnt[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (csum[hi] - csum[lo]) / counts
+    mean[counts == 0] = np.nan
+    return mean
+
+
+def rolling_baseline(means, window_epochs, exclude_bpm=EPISODE_BPM):
+    """
+    Gleitende Baseline je Epoche in zwei Durchläufen: Epochen, die mehr als exclude_bpm
+    vom ersten gleitenden Mittel abweichen (Akzelerationen/Dezelerationen), gehen in den
+    zweiten Durchlauf nicht ein.
+    """
+    first = rolling_mean(means, window_epochs)
+    with np.errstate(invalid="ignore"):
+        outlier = np.abs(means - first) > exclude_bpm
+    baseline = rolling_mean(np.where(outlier, np.nan, means), window_epochs)
+    # Lücken (z. B. lange Signalverluste) mit dem ersten Durchlauf füllen
+    return np.where(np.isnan(baseline), first, baseline)
+
+
+def short_term_variability(means):
+    """
+    Kurzzeitvariabilität nach Dawes-Redman: mittlere absolute Differenz aufeinanderfolgender
+    Epochen, gemessen als Pulsintervall in ms (60000 / bpm).
+    """
+    with np.errstate(divide="ignore"):
+        interval_ms = 60000.0 / means
+    diffs = np.abs(np.diff(interval_ms))
+    diffs = diffs[~np.isnan(diffs)]
+    return float(diffs.mean()) if len(diffs) else float("nan")
+
+
+def long_term_variability(means, epochs_per_minute=EPOCHS_PER_MINUTE):
+    """
+    Langzeitvariabilität: Schwankungsbreite (Max - Min) der Epochen-Mittel je Minute,
+    berechnet über ein nicht überlappendes Stride-Fenster; Rückgabe ist der Median in bpm.
+    """
+    if len(means) < epochs_per_minute:
+        return float("nan")
+    minutes = sliding_window_view(means, epochs_per_minute)[::epochs_per_minute]
+    filled = (~np.isnan(minutes)).sum(axis=1) >= epochs_per_minute // 2
+    if not filled.any():
+        return float("nan")
+    minutes = minutes[filled]
+    ranges = np.nanmax(minutes, axis=1) - np.nanmin(minutes, axis=1)
+    return float(np.median(ranges))
+
+
+def find_episodes(times, deviation, min_bpm=EPISODE_BPM, min_seconds=EPISODE_MIN_SECONDS):
+    """
+    Findet zusammenhängende Abschnitte mit deviation >= min_bpm (Lauflängenkodierung der Maske).
+    Args:
+        times (np.ndarray): Zeitpunkte der Samples in Sekunden.
+        deviation (np.ndarray): Abweichung von der Baseline (bpm, NaN beendet eine Episode).
+    Rückgabe: DataFrame mit start_s, end_s, duration_s und maximaler Abweichung (amplitude_bpm).
+    """
+    with np.errstate(invalid="ignore"):
+        mask = deviation >= min_bpm
+    if not mask.any():
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exklusiv
+    dt = np.median(np.diff(times)) if len(times) > 1 else 0.0
+    durations = times[ends - 1] - times[starts] + dt
+    keep = durations >= min_seconds
+    starts, ends, durations = starts[keep], ends[keep], durations[keep]
+    if not len(starts):
+        return pd.DataFrame(columns=EPISODE_COLUMNS)
+    padded = np.append(np.where(np.isnan(deviation), -np.inf, deviation), -np.inf)
+    amplitude = np.maximum.reduceat(padded, np.stack([starts, ends], axis=1).ravel())[::2]
+    return pd.DataFrame({
+        "start_s": times[starts],
+        "end_s": times[ends - 1],
+        "duration_s": durations,
+        "amplitude_bpm": amplitude,
+    }, columns=EPISODE_COLUMNS)
+
+
+def interpret_fhr(times, fhr, baseline_window_s=BASELINE_WINDOW_S):
+    """
+    Interpretiert eine FHR-Zeitreihe (Baseline, STV, LTV, Akzelerationen, Dezelerationen).
+    Args:
+        times (np.ndarray): Aufsteigende Zeitpunkte in Sekunden.
+        fhr (np.ndarray): Fetale Herzfrequenz in bpm (0 und NaN = Signalverlust).
+    Rückgabe: FHRInterpretation
+    """
+    times = np.asarray(times, dtype=np.float64)
+    fhr = np.asarray(fhr, dtype=np.float64)
+    if len(times) == 0:
+        empty = pd.DataFrame(columns=EPISODE_COLUMNS)
+        return FHRInterpretation(np.empty(0), np.empty(0), float("nan"), float("nan"), empty, empty)
+
+    centers, means, idx = epoch_means(times, fhr)
+    window_epochs = max(int(round(baseline_window_s / EPOCH_SECONDS)), 1)
+    baseline = rolling_baseline(means, window_epochs)
+
+    # Abweichung jedes Samples von der Baseline seiner Epoche
+    signal = np.where(fhr == 0, np.nan, fhr)
+    deviation = signal - baseline[idx]
+    return FHRInterpretation(
+        epoch_times=centers,
+        baseline=baseline,
+        stv_ms=short_term_variability(means),
+        ltv_bpm=long_term_variability(means),
+        accelerations=find_episodes(times, deviation),
+        decelerations=find_episodes(times, -deviation).assign(
+            amplitude_bpm=lambda d: -d["amplitude_bpm"].astype(float)),
+    )
+
+
+def interpret_recording(ctg):
+    """
+    Interpretiert alle LB-Spalten einer eingelesenen Aufzeichnung (CTG_Data).
+    Ergebnisse werden pro Dateistand im Prozess gecacht.
+    Rückgabe: Dictionary {LB-Spalte: FHRInterpretation}
+    """
+    key = recording_key(ctg.filepath)
+    with _memo_lock:
+        result = _memo.get(key)
+    if result is None:
+        result = {col: interpret_fhr(ctg.seconds, ctg.df[col].to_numpy()) for col in lb_columns(ctg.df.columns)}
+        with _memo_lock:
+            _memo[key] = result
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    from read_CSV import CTG_Data
+
+    ctg = CTG_Data("data/CTG_data/CTG_twins_healthy.csv")
+    ctg.read_csv()
+    t0 = time.perf_counter()
+    results = {col: interpret_fhr(ctg.seconds, ctg.df[col].to_numpy()) for col in lb_columns(ctg.df.columns)}
+    print(f"{len(ctg.df)} Samples x {len(results)} LB-Spalten in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    for col, res in results.items():
+        print(col, res.summary())
@@ -0,0 +1,244 @@
+"""
+ctg_monitor.py
+
+Zentrale Überwachung mehrerer CTG-Aufzeichnungen gleichzeitig.
+Ein asyncio-Scheduler treibt beliebig viele Datenquellen (eine pro Patientin
+bzw. Fötus) auf einer einzigen Event-Loop voran, prüft für jede Quelle eigene
+Alarmregeln und übergibt die Aktualisierungen gesammelt (gebündelt) an die
+Oberfläche. Eine weitere Patientin ist nur ein weiterer leichter Task,
+keine weitere blockierende Schleife. Das Modul selbst benötigt kein Streamlit.
+"""
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+from Person import Person
+from ctg_quality import load_clean_frame_with_seconds
+from read_CSV import select_lb_column
+
+HIGH_RISK_MARGIN_BPM = 5.0       # Risikoschwangerschaft: Schwelle um so viel höher ...
+HIGH_RISK_DURATION_FACTOR = 0.5  # ... und Alarm schon nach der halben Mindestdauer
+
+
+class AlarmRule:
+    """
+    Alarmregel einer Datenquelle.
+    Ein Alarm wird ausgelöst, sobald die FHR mindestens min_duration_s lang
+    unter bpm_threshold liegt; pro Episode genau einmal.
+    """
+    def __init__(self, bpm_threshold=110.0, min_duration_s=0.0):
+        """Initialisiert die Regel mit Schwellwert (bpm) und Mindestdauer (s)"""
+        self.bpm_threshold = bpm_threshold
+        self.min_duration_s = min_duration_s
+
+
+def alarm_rule_for_person(person, base=None):
+    """
+    Leitet die Alarmregel einer Patientin aus ihrem Risikoprofil ab (Person.is_high_risk_pregnancy):
+    bei einer Risikoschwangerschaft wird früher und schon bei höherer FHR alarmiert.
+    Args:
+        person (dict): Personendaten wie in person_db.json.
+        base (AlarmRule, optional): Regel für Patientinnen ohne erhöhtes Risiko.
+    Rückgabe: AlarmRule
+    """
+    base = base or AlarmRule()
+    if not Person(person).is_high_risk_pregnancy():
+        return AlarmRule(base.bpm_threshold, base.min_duration_s)
+    return AlarmRule(base.bpm_threshold + HIGH_RISK_MARGIN_BPM, base.min_duration_s * HIGH_RISK_DURATION_FACTOR)
+
+
+class CTGStream:
+    """
+    Eine überwachte Datenquelle (Aufzeichnung + LB-Spalte) mit eigenem Fortschritt,
+    Ringpuffer für das sichtbare Zeitfenster und Alarmzustand.
+    """
+    def __init__(self, stream_id, label, csv_path, lb_col, rule=None, window_seconds=120.0):
+        """
+        Initialisiert die Datenquelle.
+        stream_id: eindeutiger Schlüssel (z. B. (Personen-ID, Fötus))
+        label: Anzeigename
+        csv_path: Pfad zur CTG-Datei
+        lb_col: Spalte mit fetaler Herzfrequenz
+        rule: AlarmRule dieser Quelle
+        window_seconds: Länge des sichtbaren Zeitfensters (s)
+        """
+        self.stream_id = stream_id
+        self.label = label
+        self.rule = rule or AlarmRule()
+        df, self.times = load_clean_frame_with_seconds(csv_path)
+        if lb_col not in df.columns:
+            raise ValueError(f"Spalte '{lb_col}' nicht gefunden in {csv_path}")
+        self.values = df[lb_col].to_numpy()
+        self.position = 0
+        dt = np.median(np.diff(self.times)) if len(self.times) > 1 else 1.0
+        window_len = max(int(np.ceil(window_seconds / dt)), 1)
+        self.window_x = deque(maxlen=window_len)
+        self.window_y = deque(maxlen=window_len)
+        self._below_since = None
+        self._alarm_active = False
+
+    @property
+    def finished(self):
+        """True, wenn alle Samples der Aufzeichnung abgespielt wurden"""
+        return self.position >= len(self.values)
+
+    def advance(self, until_s):
+        """
+        Übernimmt alle Samples bis zum Aufzeichnungszeitpunkt until_s und prüft die Alarmregel.
+        Rückgabe: Liste neu ausgelöster Alarme als Dictionaries.
+        """
+        end = int(np.searchsorted(self.times, until_s, side='right'))
+        alarms = []
+        for t, bpm in zip(self.times[self.position:end], self.values[self.position:end]):
+            self.window_x.append(t)
+            self.window_y.append(bpm)
+            if bpm < self.rule.bpm_threshold:
+                if self._below_since is None:
+                    self._below_since = t
+                if not self._alarm_active and t - self._below_since >= self.rule.min_duration_s:
+                    self._alarm_active = True
+                    alarms.append({"stream_id": self.stream_id, "label": self.label,
+                                   "time_s": float(t), "bpm": float(bpm)})
+            else:
+                self._below_since = None
+                self._alarm_active = False
+        self.position = max(self.position, end)
+        return alarms
+
+    def snapshot(self):
+        """Gibt den aktuellen Zustand für die Oberfläche zurück"""
+        return {
+            "label": self.label,
+            "time_s": float(self.window_x[-1]) if self.window_x else 0.0,
+            "bpm": float(self.window_y[-1]) if self.window_y else float('nan'),
+            "alarm": self._alarm_active,
+            "finished": self.finished,
+            "x": list(self.window_x),
+            "y": list(self.window_y),
+        }
+
+
+class StreamScheduler:
+    """
+    Treibt mehrere CTGStreams auf einer asyncio-Event-Loop voran und
+    veröffentlicht gebündelte Aktualisierungen in festen Abständen.
+    """
+    def __init__(self, speed=10.0, tick_s=0.1, publish_every_s=1.0):
+        """
+        speed: Aufzeichnungssekunden pro Echtzeitsekunde
+        tick_s: Schrittweite der einzelnen Stream-Tasks (Echtzeit, s)
+        publish_every_s: Abstand zwischen zwei gebündelten UI-Aktualisierungen (Echtzeit, s)
+        """
+        self.speed = speed
+        self.tick_s = tick_s
+        self.publish_every_s = publish_every_s
+        self.streams = {}
+        self._pending_alarms = []
+        self._stop = None
+
+    def add_stream(self, stream):
+        """Fügt eine Datenquelle hinzu"""
+        self.streams[stream.stream_id] = stream
+
+    def stop(self):
+        """Beendet die laufende Überwachung nach dem nächsten Schritt"""
+        if self._stop is not None:
+            self._stop.set()
+
+    async def _run_stream(self, stream, start):
+        """Task einer Datenquelle: rückt im Takt tick_s auf den aktuellen Aufzeichnungszeitpunkt vor"""
+        t0 = stream.times[0] if len(stream.times) else 0.0
+        while not stream.finished and not self._stop.is_set():
+            recording_s = t0 + (time.monotonic() - start) * self.speed
+            self._pending_alarms.extend(stream.advance(recording_s))
+            await asyncio.sleep(self.tick_s)
+
+    async def _publish_loop(self, publish):
+        """Veröffentlicht in festen Abständen alle Änderungen gebündelt über den Callback"""
+        while not self._stop.is_set():
+            await asyncio.sleep(self.publish_every_s)
+            self._publish(publish)
+
+    def _publish(self, publish):
+        """Sammelt Zustand aller Streams und neue Alarme und übergibt sie in einem Aufruf"""
+        alarms, self._pending_alarms = self._pending_alarms, []
+        publish({
+            "streams": {sid: s.snapshot() for sid, s in self.streams.items()},
+            "alarms": alarms,
+        })
+
+    async def run(self, publish, duration_s=None):
+        """
+        Startet alle Streams nebenläufig und ruft publish(batch) gebündelt auf.
+        Args:
+            publish: Callback, der ein Dictionary {"streams": {...}, "alarms": [...]} erhält.
+            duration_s (float, optional): maximale Laufzeit in Echtzeitsekunden.
+        """
+        self._stop = asyncio.Event()
+        start = time.monotonic()
+        tasks = [asyncio.create_task(self._run_stream(s, start)) for s in self.streams.values()]
+        publisher = asyncio.create_task(self._publish_loop(publish))
+        try:
+            if not tasks:
+                return
+            if duration_s is None:
+                await asyncio.gather(*tasks)
+            else:
+                await asyncio.wait(tasks, timeout=duration_s)
+        finally:
+            self._stop.set()
+            publisher.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(publisher, *tasks, return_exceptions=True)
+            self._publish(publish)
+
+
+def streams_for_active_patients(persons, rule=None, window_seconds=120.0, rule_for=alarm_rule_for_person):
+    """
+    Erstellt je Patientin und Fötus eine Datenquelle aus dem ersten CTG-Test.
+    Als aktiv gelten alle Personen mit mindestens einem CTG-Test.
+    Args:
+        persons: Liste von Personendaten (Dictionaries wie in person_db.json).
+        rule: Grundregel (optional), aus der rule_for die Regel je Patientin ableitet.
+        rule_for: Funktion (Personendaten, Grundregel) -> AlarmRule; jede Datenquelle
+                  erhält ihre eigene Regel und kann danach einzeln angepasst werden.
+    """
+    streams = []
+    for person in persons:
+        if not person.get("CTG_tests"):
+            continue
+        csv_path = person["CTG_tests"][0]["result_link"]
+        df, _ = load_clean_frame_with_seconds(csv_path)
+        fetus_names = [f"Fötus {i}" for i in range(1, person.get("fetuses", 0) + 1)] or [None]
+        used = set()
+        for fetus_name in fetus_names:
+            try:
+                lb_col = select_lb_column(df.columns, fetus_name)
+            except ValueError:
+                continue
+            if lb_col in used:
+                continue
+            used.add(lb_col)
+            label = f"{person['lastname']}, {person['firstname']}"
+            if fetus_name and len(fetus_names) > 1:
+                label += f" – {fetus_name}"
+            streams.append(CTGStream((person["id"], lb_col), label, csv_path, lb_col,
+                                     rule=rule_for(person, rule), window_seconds=window_seconds))
+    return streams
+
+
+if __name__ == "__main__":
+    scheduler = StreamScheduler(speed=600, tick_s=0.05, publish_every_s=0.5)
+    for stream in streams_for_active_patients(Person.load_person_data(), rule=AlarmRule(120, 5)):
+        print(f"{stream.label}: Schwelle {stream.rule.bpm_threshold:g} bpm, "
+              f"Mindestdauer {stream.rule.min_duration_s:g} s")
+        scheduler.add_stream(stream)
+
+    def print_batch(batch):
+        states = ", ".join(f"{s['label']}: {s['bpm']:.0f}" for s in batch["streams"].values())
+        print(f"{states} | neue Alarme: {len(batch['alarms'])}")
+
+    asyncio.run(scheduler.run(print_batch, duration_s=3))
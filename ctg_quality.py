@@ -0,0 +1,279 @@
+"""
+ctg_quality.py
+
+Bereinigung und Signalqualität von CTG-Aufzeichnungen.
+Vor Statistik, Diagrammen, Wehenerkennung und Alarmen durchläuft jede Aufzeichnung
+eine vektorisierte Bereinigung:
+- Werte außerhalb des plausiblen Bereichs (inkl. Nullwerten bei LB) werden maskiert
+- Sprungartefakte (starke Abweichung vom gleitenden Median) werden maskiert
+- kurze Lücken werden linear interpoliert, lange bleiben als NaN (Signalverlust)
+- je Zeitfenster wird ein Signalqualitätsindex (SQI, Anteil gültiger Samples) berechnet
+
+Die bereinigten Spalten werden auf das einheitliche Zeitraster (ctg_resample)
+gebracht und wie der Spalten-Cache als .npy-Dateien im Sidecar-Verzeichnis der
+Aufzeichnung abgelegt (Unterordner "clean"), der Qualitätsbericht (bezogen auf
+die Original-Samples) als quality.json. Jede Aufzeichnung wird damit nur einmal bereinigt.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ctg_cache import (CTGFrameCache, _frame_from_arrays, _read_sidecar, load_ctg_frame_with_seconds,
+                       read_sidecar_json, sidecar_dir, write_sidecar_json)
+from ctg_resample import CANONICAL_HZ, resample_uniform
+from ctg_summary import lb_columns
+
+LB_RANGE = (50.0, 210.0)      # plausible fetale Herzfrequenz in bpm
+UC_RANGE = (0.0, 100.0)       # Wehentätigkeit
+STEP_BPM = 25.0               # Sprungartefakt: Abweichung vom gleitenden Median in bpm ...
+STEP_WINDOW_S = 15.0          # ... über dieses Fenster
+MAX_GAP_S = 10.0              # kürzere Lücken werden interpoliert
+SQI_WINDOW_S = 60.0           # Fensterlänge des Signalqualitätsindex
+
+QUALITY_VERSION = 3           # erhöhen, wenn sich Bereinigung oder Zeitraster ändern
+# Stand der bereinigten Daten; Teil der Schlüssel aller daraus abgeleiteten Caches
+# (Zusammenfassung, Diagramme, Feature-Store), damit diese mit der Bereinigung veralten
+CLEAN_DATA_VERSION = f"q{QUALITY_VERSION}-{CANONICAL_HZ:g}hz"
+CLEAN_DIRNAME = "clean"
+QUALITY_FILENAME = "quality.json"
+
+# Bereinigte Aufzeichnungen getrennt von den Rohdaten im Speicher halten
+CLEAN_FRAME_CACHE = CTGFrameCache()
+
+
+def rolling_median(values, window):
+    """Zentrierter gleitender Median über ein Stride-Fenster (Ränder mit NaN aufgefüllt, NaN wird ignoriert)"""
+    window = max(int(window) | 1, 3)  # ungerade Fensterlänge
+    half = window // 2
+    padded = np.pad(np.asarray(values, dtype=np.float64), half, constant_values=np.nan)
+    windows = sliding_window_view(padded, window)
+    result = np.full(len(values), np.nan)
+    filled = (~np.isnan(windows)).any(axis=1)
+    result[filled] = np.nanmedian(windows[filled], axis=1)
+    return result
+
+
+def mask_artifacts(values, valid_range, step_samples=None, step_bpm=STEP_BPM):
+    """
+    Ermittelt ungültige Samples einer Spalte.
+    Args:
+        values (np.ndarray): Messwerte.
+        valid_range (tuple): Plausibler Bereich (min, max), Grenzen eingeschlossen.
+        step_samples (int, optional): Fensterlänge des gleitenden Medians; None = keine Sprungerkennung.
+    Rückgabe: (außerhalb des Bereichs oder NaN, Sprungartefakt) als boolesche Masken
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        out_of_range = np.isnan(values) | (values < valid_range[0]) | (values > valid_range[1])
+    step = np.zeros(len(values), dtype=bool)
+    if step_samples and len(values):
+        median = rolling_median(np.where(out_of_range, np.nan, values), step_samples)
+        with np.errstate(invalid="ignore"):
+            step = ~out_of_range & (np.abs(values - median) > step_bpm)
+    return out_of_range, step
+
+
+def interpolate_gaps(times, values, invalid, max_gap_s=MAX_GAP_S):
+    """
+    Füllt Lücken bis max_gap_s linear; längere Lücken und Lücken am Rand bleiben NaN.
+    Rückgabe: (bereinigte Werte, Maske der interpolierten Samples)
+    """
+    cleaned = np.where(invalid, np.nan, np.asarray(values, dtype=np.float64))
+    interpolated = np.zeros(len(cleaned), dtype=bool)
+    if not invalid.any() or invalid.all():
+        return cleaned, interpolated
+    # Lücken als Läufe der Maske; Dauer vom letzten gültigen bis zum nächsten gültigen Sample
+    edges = np.diff(np.concatenate([[0], invalid.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exklusiv
+    inner = (starts > 0) & (ends < len(cleaned))
+    starts, ends = starts[inner], ends[inner]
+    short = times[ends] - times[starts - 1] <= max_gap_s
+    if not short.any():
+        return cleaned, interpolated
+    lengths = (ends - starts)[short]
+    # Alle Indizes der kurzen Lücken ohne Python-Schleife aufzählen
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    idx = np.repeat(starts[short], lengths) + offsets
+    valid = ~invalid
+    cleaned[idx] = np.interp(times[idx], times[valid], cleaned[valid])
+    interpolated[idx] = True
+    return cleaned, interpolated
+
+
+def window_quality(times, valid, window_s=SQI_WINDOW_S):
+    """
+    Signalqualitätsindex je Zeitfenster: Anteil gültiger (nicht maskierter) Samples.
+    Rückgabe: (Fensterbeginn in s, SQI je Fenster zwischen 0 und 1)
+    """
+    if len(times) == 0:
+        return np.empty(0), np.empty(0)
+    idx = ((times - times[0]) // window_s).astype(np.int64)
+    n_windows = int(idx[-1]) + 1
+    counts = np.bincount(idx, minlength=n_windows)
+    good = np.bincount(idx, weights=valid.astype(np.float64), minlength=n_windows)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sqi = good / counts
+    return times[0] + np.arange(n_windows) * window_s, sqi
+
+
+def clean_recording(seconds, df):
+    """
+    Bereinigt alle LB-Spalten und die UC-Spalte einer Aufzeichnung.
+    Andere Spalten werden unverändert übernommen.
+    Args:
+        seconds (np.ndarray): Aufsteigende Zeitpunkte in Sekunden.
+        df (pd.DataFrame): Rohdaten.
+    Rückgabe: (Dictionary {Spalte: bereinigtes Array}, Qualitätsbericht als JSON-fähiges Dictionary)
+    """
+    dt = float(np.median(np.diff(seconds))) if len(seconds) > 1 else 1.0
+    step_samples = int(round(STEP_WINDOW_S / dt))
+    lb_cols = lb_columns(df.columns)
+    columns, report = {}, {"version": QUALITY_VERSION, "columns": {}, "windows": {}}
+    for col in df.columns:
+        if col not in lb_cols and col != "UC":
+            columns[col] = df[col].to_numpy()
+            continue
+        values = df[col].to_numpy(dtype=np.float64)
+        if col in lb_cols:
+            out_of_range, step = mask_artifacts(values, LB_RANGE, step_samples)
+        else:
+            out_of_range, step = mask_artifacts(values, UC_RANGE)
+        invalid = out_of_range | step
+        columns[col], interpolated = interpolate_gaps(seconds, values, invalid)
+        starts, sqi = window_quality(seconds, ~invalid)
+        report["columns"][col] = {
+            "out_of_range": int(out_of_range.sum()),
+            "zero": int((values == 0).sum()),
+            "step": int(step.sum()),
+            "interpolated": int(interpolated.sum()),
+            "missing": int(np.isnan(columns[col]).sum()),
+            "sqi": float(1 - invalid.mean()) if len(values) else 0.0,
+        }
+        report["windows"]["start_s"] = starts.tolist()
+        report["windows"][col] = sqi.tolist()
+    return columns, report
+
+
+def quality_frame(report):
+    """SQI je Zeitfenster aus einem Qualitätsbericht als DataFrame (Index: Fensterbeginn in s)"""
+    windows = dict(report["windows"])
+    starts = windows.pop("start_s", [])
+    return pd.DataFrame(windows, index=pd.Index(starts, name="window_start_s"))
+
+
+def _clean_dir(filepath):
+    """Verzeichnis der bereinigten Spalten im Sidecar der Aufzeichnung"""
+    return os.path.join(sidecar_dir(filepath), CLEAN_DIRNAME)
+
+
+def _write_clean(filepath, seconds, columns, report):
+    """Schreibt bereinigte Spalten atomar (temporäres Verzeichnis, dann umbenennen), danach den Qualitätsbericht"""
+    target_dir = _clean_dir(filepath)
+    parent = os.path.dirname(target_dir)
+    if not os.path.isdir(parent):
+        # Ohne Spalten-Cache (z. B. schreibgeschütztes Verzeichnis) nichts ablegen
+        return
+    try:
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    except OSError:
+        return
+    try:
+        np.save(os.path.join(tmp_dir, "time.npy"), seconds)
+        for i, values in enumerate(columns.values()):
+            np.save(os.path.join(tmp_dir, f"col_{i}.npy"), values)
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"columns": [str(col) for col in columns], "rows": len(seconds)}, f)
+        shutil.rmtree(target_dir, ignore_errors=True)  # veralteter Stand (andere QUALITY_VERSION)
+        os.replace(tmp_dir, target_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+    # Der Bericht markiert den bereinigten Stand als gültig, daher zuletzt schreiben
+    write_sidecar_json(filepath, QUALITY_FILENAME, report)
+
+
+def _cached_report(filepath):
+    """Qualitätsbericht aus dem Sidecar, sofern er zur aktuellen QUALITY_VERSION passt"""
+    report = read_sidecar_json(filepath, QUALITY_FILENAME)
+    if report is None or report.get("version") != QUALITY_VERSION:
+        return None
+    return report
+
+
+def _load_clean(filepath):
+    """Loader für CLEAN_FRAME_CACHE: bereinigte Spalten aus dem Sidecar oder neu berechnet"""
+    target_dir = _clean_dir(filepath)
+    if _cached_report(filepath) is not None and os.path.isdir(target_dir):
+        try:
+            seconds, columns = _read_sidecar(target_dir)
+            return _frame_from_arrays(seconds, columns)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(target_dir, ignore_errors=True)
+
+    raw, seconds = load_ctg_frame_with_seconds(filepath)
+    columns, report = clean_recording(seconds, raw)
+    # Nach der Bereinigung auf das einheitliche Zeitraster bringen (ctg_resample);
+    # fehlende Zeilen der Rohdaten werden wie Lücken in den Werten nur bis MAX_GAP_S überbrückt
+    seconds, columns = resample_uniform(seconds, columns, max_gap_s=MAX_GAP_S)
+    _write_clean(filepath, seconds, columns, report)
+    if _cached_report(filepath) is not None:
+        seconds, columns = _read_sidecar(target_dir)
+        return _frame_from_arrays(seconds, columns)
+    for values in columns.values():
+        values.flags.writeable = False
+    return _frame_from_arrays(seconds, columns)
+
+
+def load_clean_frame_with_seconds(filepath):
+    """
+    Lädt eine bereinigte CTG-Aufzeichnung auf dem einheitlichen Zeitraster (CANONICAL_HZ)
+    (Aufbau wie ctg_cache.load_ctg_frame_with_seconds).
+    Rückgabe: (DataFrame mit Timedelta-Index, Sekunden-Array); Spalten schreibgeschützt und geteilt.
+    """
+    return CLEAN_FRAME_CACHE.get_with_seconds(filepath, loader=_load_clean)
+
+
+def load_clean_frame(filepath):
+    """Wie load_clean_frame_with_seconds, nur das DataFrame"""
+    return load_clean_frame_with_seconds(filepath)[0]
+
+
+def load_quality_report(filepath):
+    """
+    Gibt den Qualitätsbericht einer Aufzeichnung zurück (bereinigt sie bei Bedarf zuerst).
+    Rückgabe: Dictionary mit "columns" ({Spalte: Zähler und SQI}) und "windows" (SQI je Fenster).
+    """
+    report = _cached_report(filepath)
+    if report is None:
+        raw, seconds = load_ctg_frame_with_seconds(filepath)
+        report = clean_recording(seconds, raw)[1]
+    return report
+
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    for path in sorted(glob.glob("data/CTG_data/*.csv")):
+        raw, seconds = load_ctg_frame_with_seconds(path)
+        t0 = time.perf_counter()
+        _, report = clean_recording(seconds, raw)
+        elapsed = (time.perf_counter() - t0) * 1000
+        print(f"{os.path.basename(path)}: {elapsed:.1f} ms")
+        for col, stats in report["columns"].items():
+            print(f"  {col}: {stats}")
+
+    # Synthetischer Test: Nullwerte, ein Sprung und eine lange Lücke
+    t = np.arange(0, 600.0)
+    lb = 140 + 5 * np.sin(t / 30)
+    lb[100:104] = 0
+    lb[200:203] = 75
+    lb[300:340] = np.nan
+    columns, report = clean_recording(t, pd.DataFrame({"LB": lb, "UC": np.full(len(t), 10.0)}))
+    print(report["columns"]["LB"], quality_frame(report).round(2).T)
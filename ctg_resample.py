@@ -0,0 +1,90 @@
+"""
+ctg_resample.py
+
+Einheitliches Zeitraster für CTG-Aufzeichnungen.
+Die Beispieldateien haben unterschiedliche Zeitbasen (z. B. 1 s oder 0,5 s). Nach der
+Bereinigung (ctg_quality) wird jede Aufzeichnung per linearer Interpolation auf ein
+festes Raster von CANONICAL_HZ gebracht. Alle Auswertungen und Caches arbeiten danach
+mit derselben Schrittweite, Parameter in Sekunden bedeuten für jede Datei dasselbe.
+Lücken werden nicht überbrückt: Rasterpunkte neben einem fehlenden Sample (NaN) bleiben NaN,
+ebenso Rasterpunkte zwischen zwei Samples, die mehr als max_gap_s auseinanderliegen.
+"""
+import numpy as np
+
+CANONICAL_HZ = 4.0
+
+
+def uniform_grid(seconds, hz=CANONICAL_HZ):
+    """Gleichmäßiges Zeitraster vom ersten bis (höchstens) zum letzten Zeitpunkt der Aufzeichnung"""
+    if len(seconds) == 0:
+        return np.empty(0)
+    n = int(np.floor((seconds[-1] - seconds[0]) * hz + 1e-9)) + 1
+    return seconds[0] + np.arange(n) / hz
+
+
+def gap_mask(seconds, grid, max_gap_s):
+    """
+    Markiert Rasterpunkte, die echt zwischen zwei Samples mit mehr als max_gap_s Abstand liegen.
+    Args:
+        seconds (np.ndarray): Aufsteigende Zeitpunkte der Samples in Sekunden.
+        grid (np.ndarray): Zielraster in Sekunden.
+        max_gap_s (float): Größter Sample-Abstand, über den noch interpoliert wird.
+    Rückgabe: np.ndarray (bool) mit einem Wert je Rasterpunkt.
+    """
+    if len(seconds) < 2:
+        return np.zeros(len(grid), dtype=bool)
+    wide = np.diff(seconds) > max_gap_s
+    # Index des linken Nachbar-Samples jedes Rasterpunkts
+    left = np.clip(np.searchsorted(seconds, grid, side="right") - 1, 0, len(seconds) - 2)
+    return wide[left] & (grid > seconds[left]) & (grid < seconds[left + 1])
+
+
+def resample_column(seconds, values, grid, max_gap_s=None):
+    """
+    Interpoliert eine Spalte linear auf das Raster.
+    Args:
+        seconds (np.ndarray): Aufsteigende Zeitpunkte der Samples in Sekunden.
+        values (np.ndarray): Messwerte (NaN = fehlend).
+        grid (np.ndarray): Zielraster in Sekunden.
+        max_gap_s (float, optional): Rasterpunkte in Lücken der Zeitbasis, die länger sind, bleiben NaN.
+    Rückgabe: np.ndarray (float64) mit einem Wert je Rasterpunkt.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    resampled = np.interp(grid, seconds, np.where(missing, 0.0, values))
+    if missing.any():
+        # Jeder Rasterpunkt, in dessen Interpolation ein fehlendes Sample eingeht, bleibt fehlend
+        resampled[np.interp(grid, seconds, missing.astype(np.float64)) > 0] = np.nan
+    if max_gap_s is not None:
+        resampled[gap_mask(seconds, grid, max_gap_s)] = np.nan
+    return resampled
+
+
+def resample_uniform(seconds, columns, hz=CANONICAL_HZ, max_gap_s=None):
+    """
+    Bringt alle Spalten einer Aufzeichnung auf ein gemeinsames Raster von hz Samples pro Sekunde.
+    Args:
+        seconds (np.ndarray): Aufsteigende Zeitpunkte in Sekunden.
+        columns (dict): {Spalte: Werte}.
+        max_gap_s (float, optional): Lücken der Zeitbasis, die länger sind, werden nicht überbrückt.
+    Rückgabe: (Raster in Sekunden, {Spalte: interpolierte Werte})
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    grid = uniform_grid(seconds, hz)
+    return grid, {col: resample_column(seconds, values, grid, max_gap_s) for col, values in columns.items()}
+
+
+if __name__ == "__main__":
+    import glob
+    import os
+    import time
+
+    from ctg_cache import load_ctg_frame_with_seconds
+
+    for path in sorted(glob.glob("data/CTG_data/*.csv")):
+        df, seconds = load_ctg_frame_with_seconds(path)
+        t0 = time.perf_counter()
+        grid, columns = resample_uniform(seconds, {col: df[col].to_numpy() for col in df.columns})
+        elapsed = (time.perf_counter() - t0) * 1000
+        print(f"{os.path.basename(path)}: {len(seconds)} Samples (dt {np.median(np.diff(seconds))} s) "
+              f"-> {len(grid)} Samples in {elapsed:.2f} ms")
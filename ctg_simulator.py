@@ -7,6 +7,59 @@ import numpy as np
 import io
 import wave
 import base64
+import json
+from functools import lru_cache
+from collections import deque
+from ctg_quality import load_clean_frame
+from ctg_alarms import find_alarm_episodes
+from ctg_ingest import DEFAULT_HOST, DEFAULT_PORT, start_emulator_thread
+
+# Alarmtöne je Schweregrad: (Frequenz in Hz, Dauer in ms, Lautstärke 0..1)
+ALARM_TONES = {
+    "warnung": (440, 200, 0.5),
+    "kritisch": (880, 300, 0.7),
+}
+CRITICAL_MARGIN_BPM = 10.0
+
+# Legt die Alarmtöne einmal pro Sitzung als versteckte <audio>-Elemente im Hauptdokument an
+_TONE_LOADER = """<script>
+const doc = window.parent.document;
+for (const [id, src] of Object.entries(%s)) {
+  if (!doc.getElementById(id)) {
+    const el = doc.createElement("audio");
+    el.id = id; el.src = src; el.preload = "auto"; el.style.display = "none";
+    doc.body.appendChild(el);
+  }
+}
+</script>"""
+# Spielt einen bereits geladenen Ton ab; die Nummer macht jedes Element eindeutig
+_TONE_TRIGGER = """<script data-alarm="%d">
+const el = window.parent.document.getElementById(%s);
+if (el) { el.currentTime = 0; el.play().catch(() => {}); }
+</script>"""
+
+
+@lru_cache(maxsize=32)
+def synthesize_beep(freq=440, duration_ms=200, volume=0.5, sample_rate=44100) -> bytes:
+    """Erzeugt einen Sinus-Beep als WAV-Byte-Stream; pro Parametersatz nur einmal pro Prozess."""
+    t = np.linspace(0, duration_ms/1000, int(sample_rate * duration_ms/1000), False)
+    tone = (volume * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)  # 16 bit
+        wf.setframerate(sample_rate)
+        wf.writeframes((tone * 32767).astype(np.int16).tobytes())
+    buf.seek(0)
+    return buf.read()
+
+
+@lru_cache(maxsize=32)
+def beep_data_uri(freq=440, duration_ms=200, volume=0.5) -> str:
+    """Gibt den Beep als data-URI zurück; Base64-Kodierung nur einmal pro Parametersatz."""
+    return "data:audio/wav;base64," + base64.b64encode(synthesize_beep(freq, duration_ms, volume)).decode("ascii")
+
 
 class CTGSimulator:
     """
@@ -14,18 +67,32 @@ class CTGSimulator:
     Liest fetale Herzfrequenzdaten (FHR) ein, zeigt Live-Metriken und Diagramme an
     und löst Alarmtöne sowie Warnmeldungen aus, wenn die FHR unter einen definierten Schwellenwert fällt.
     """
-    def __init__(self, csv_path: str, lb_col: str, bpm_threshold: float = 110.0, interval: float = 1.0):
+    def __init__(self, csv_path: str, lb_col: str, bpm_threshold: float = 110.0, interval: float = 1.0,
+                 window_seconds: float = 300.0, max_fps: float = 4.0, live_buffer=None, idle_timeout: float = 10.0,
+                 step_seconds: float = 1.0):
         """
         Initialisiert den CTG-Simulator.
         csv_path: Pfad zur CTG-Datei (CSV)
         lb_col: Spalte mit fetaler Herzfrequenz
         bpm_threshold: Schwellwert für den Alarm (bpm)
         interval: Sekunden pro Simulationsschritt
+        window_seconds: sichtbares Zeitfenster der Live-Grafik (s)
+        max_fps: maximale Anzahl Grafik-Aktualisierungen pro Sekunde
+        live_buffer: optionaler PatientRingBuffer des Ingest-Servers; statt der CSV werden dann
+                     die live empfangenen Samples angezeigt
+        idle_timeout: Live-Modus endet, wenn so viele Sekunden keine neuen Samples ankommen
+        step_seconds: Aufzeichnungssekunden pro Simulationsschritt (CSV-Modus); bei dem
+                      einheitlichen Zeitraster wird dazu jedes n-te Sample ausgegeben
         """
         self.csv_path = csv_path
         self.lb_col = lb_col
         self.bpm_threshold = bpm_threshold
         self.interval = interval
+        self.window_seconds = window_seconds
+        self.max_fps = max_fps
+        self.live_buffer = live_buffer
+        self.idle_timeout = idle_timeout
+        self.step_seconds = step_seconds
         self.df = None
 
         # Session-State initialisieren
@@ -35,84 +102,168 @@ class CTGSimulator:
             st.session_state['sim_running'] = False
 
     def load(self):
-        """Lädt die CSV und wandelt den Zeitindex in pandas Timedelta um."""
-        self.df = pd.read_csv(self.csv_path, index_col='time')
-        self.df.index = pd.to_timedelta(self.df.index, unit='s')
+        """Lädt die bereinigte CSV über den Spalten-Cache (Zeitindex als pandas Timedelta)."""
+        self.df = load_clean_frame(self.csv_path)
         if self.lb_col not in self.df.columns:
             raise ValueError(f"Spalte '{self.lb_col}' nicht gefunden in {self.csv_path}")
 
     def _generate_beep(self, freq=440, duration_ms=200, volume=0.5, sample_rate=44100) -> bytes:
-        """Erzeugt einen einfachen Sinus-Beep als WAV-Byte-Stream."""
-        t = np.linspace(0, duration_ms/1000, int(sample_rate * duration_ms/1000), False)
-        tone = (volume * np.sin(2 * np.pi * freq * t)).astype(np.float32)
-
-        buf = io.BytesIO()
-        with wave.open(buf, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)  # 16 bit
-            wf.setframerate(sample_rate)
-            wf.writeframes((tone * 32767).astype(np.int16).tobytes())
-        buf.seek(0)
-        return buf.read()
+        """Gibt einen einfachen Sinus-Beep als WAV-Byte-Stream zurück (einmal erzeugt, danach aus dem Cache)."""
+        return synthesize_beep(freq, duration_ms, volume, sample_rate)
 
-    def run_live(self):
+    def _alarm_severity(self, bpm: float) -> str:
+        """Stuft einen Alarm ein: 'kritisch' ab CRITICAL_MARGIN_BPM unter der Schwelle, sonst 'warnung'."""
+        return "kritisch" if bpm < self.bpm_threshold - CRITICAL_MARGIN_BPM else "warnung"
+
+    def _tone_id(self, severity: str) -> str:
+        """DOM-ID des versteckten Audio-Elements für einen Schweregrad"""
+        return f"ctg-alarm-{severity}"
+
+    def _load_tones(self):
         """
-        Führt die Live-Simulation aus, spielt Alarm-Töne automatisch ab und
-        zeigt alle Alarm-Messages auch nach Stoppen der Simulation.
+        Überträgt die Alarmtöne einmal pro Sitzung an den Browser. Spätere Alarme senden
+        nur noch einen kurzen Auslöser mit der ID des Tons statt der Audiodaten.
+        """
+        if st.session_state.get('sim_tones_loaded'):
+            return
+        sources = {self._tone_id(severity): beep_data_uri(*tone) for severity, tone in ALARM_TONES.items()}
+        components.html(_TONE_LOADER % json.dumps(sources), height=0)
+        st.session_state['sim_tones_loaded'] = True
+
+    def _window_figure(self, x_buf, y_buf, now_s):
+        """Baut die Grafik nur aus dem sichtbaren Zeitfenster (Ringpuffer) – Kosten unabhängig von der Laufzeit."""
+        fig = go.Figure(go.Scatter(x=list(x_buf), y=list(y_buf), mode="lines", name="FHR"))
+        fig.update_layout(
+            xaxis_title="Zeit (s)",
+            yaxis_title="Herzfrequenz (bpm)",
+            template="simple_white",
+            xaxis=dict(range=[max(0.0, now_s - self.window_seconds), max(now_s, self.window_seconds)]),
+        )
+        return fig
+
+    def _csv_samples(self):
+        """
+        Liefert (Samples, Abtastintervall) der CSV-Aufzeichnung. Pro Schritt wird ein Sample
+        (Schrittweite step_seconds) in einem festen Takt (interval) ausgegeben; die Rechenzeit
+        eines Schritts wird von der Wartezeit abgezogen.
         """
         if self.df is None:
             self.load()
+        times = self.df.index.total_seconds().to_numpy()
+        dt = np.median(np.diff(times)) if len(times) > 1 else 1.0
+        stride = max(int(round(self.step_seconds / dt)), 1)
+        times = times[::stride]
+        values = self.df[self.lb_col].to_numpy()[::stride]
+        dt *= stride
+
+        def paced():
+            next_tick = time.monotonic()
+            for current_time, bpm in zip(times, values):
+                yield current_time, bpm
+                next_tick += self.interval
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+        return paced(), dt
+
+    def _live_samples(self):
+        """
+        Liefert (Samples, Abtastintervall) aus dem Ringpuffer des Ingest-Servers.
+        Neue Samples werden direkt aus dem Speicher gelesen, sobald das Gerät sie gesendet hat;
+        ohne neue Daten für idle_timeout Sekunden endet die Anzeige.
+        """
+        # Einlings-Aufzeichnungen (LB) werden vom Gerät im Kanal LB1 gesendet
+        channel = self.lb_col if self.lb_col in ("LB1", "LB2") else "LB1"
+        recent = self.live_buffer.latest(16)
+        dt = float(np.median(np.diff(recent["time"]))) if len(recent) > 1 else self.interval
 
+        def received():
+            last_t = float('-inf')
+            last_data = time.monotonic()
+            while time.monotonic() - last_data < self.idle_timeout:
+                new = self.live_buffer.since(last_t)
+                if len(new) == 0:
+                    latest = self.live_buffer.latest(1)
+                    if len(latest) and latest["time"][0] < last_t:
+                        last_t = float('-inf')  # Gerät neu gestartet: Puffer beginnt eine neue Sitzung
+                        continue
+                    time.sleep(self.interval)
+                    continue
+                last_t = float(new["time"][-1])
+                last_data = time.monotonic()
+                yield from zip(new["time"], new[channel])
+        return received(), dt
+
+    def emulate_device(self, patient_id: int, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                       speed: float = 1.0):
+        """
+        Nutzt die Aufzeichnung als Geräte-Emulator: die CSV wird im Hintergrund mit dem
+        Tempo speed (Aufzeichnungssekunden pro Echtzeitsekunde) an den Ingest-Server gesendet.
+        Rückgabe: der Sende-Thread.
+        """
+        return start_emulator_thread(self.csv_path, patient_id, host, port, speed)
+
+    def run_live(self):
+        """
+        Führt die Live-Simulation aus, spielt Alarm-Töne automatisch ab und
+        zeigt alle Alarm-Messages auch nach Stoppen der Simulation.
+        Neue Werte werden nur an einen Ringpuffer fester Länge (window_seconds)
+        angehängt; die Grafik wird höchstens max_fps-mal pro Sekunde aus diesem
+        Puffer neu gezeichnet. Die Kosten pro Schritt bleiben dadurch konstant.
+        """
         # Markiere Simulation als aktiv
         st.session_state['sim_running'] = True
 
+        self._load_tones()
         metric_pl = st.empty()
         chart_pl  = st.empty()
+        audio_pl  = st.empty()
 
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=[], y=[], mode="lines", name="FHR"))
-        fig.update_layout(
-            xaxis_title="Zeit (s)",
-            yaxis_title="Herzfrequenz (bpm)",
-            template="simple_white"
-        )
+        samples, dt = self._live_samples() if self.live_buffer is not None else self._csv_samples()
+        window_len = max(int(np.ceil(self.window_seconds / dt)), 1)
+        x_buf = deque(maxlen=window_len)
+        y_buf = deque(maxlen=window_len)
 
-        x_data = []
-        y_data = []
+        frame_budget = 1.0 / self.max_fps
+        last_frame = float('-inf')
+        drawn_time = None  # Zeitpunkt des zuletzt gezeichneten Samples
+        alarm_count = 0
+        fig = None
 
-        for tdelta, row in self.df.iterrows():
+        for current_time, bpm in samples:
             if not st.session_state['sim_running']:
                 break
 
-            bpm = row[self.lb_col]
             metric_pl.metric("Fetale Herzfrequenz (bpm)", f"{bpm:.1f}")
 
-            # Daten anhängen und Chart aktualisieren
-            x_data.append(tdelta.total_seconds())
-            y_data.append(bpm)
-            fig.data[0].x, fig.data[0].y = x_data, y_data
-            chart_pl.plotly_chart(fig, use_container_width=True)
-            st.session_state['sim_last_fig'] = fig
+            # Daten anhängen (ältere Werte fallen aus dem Ringpuffer heraus)
+            x_buf.append(current_time)
+            y_buf.append(bpm)
+
+            # Chart nur innerhalb des Frame-Budgets neu zeichnen
+            now = time.monotonic()
+            if now - last_frame >= frame_budget:
+                fig = self._window_figure(x_buf, y_buf, current_time)
+                chart_pl.plotly_chart(fig, use_container_width=True)
+                st.session_state['sim_last_fig'] = fig
+                last_frame = now
+                drawn_time = current_time
 
             # Alarm prüfen
             if bpm < self.bpm_threshold:
-                current_time = tdelta.total_seconds()
                 msg = f"⚠️ Alarm! FHR niedrig bei {current_time} Sekunden HRF {bpm:.1f} bpm"
                 st.error(msg)
                 st.session_state['sim_alerts'].append(msg)
 
-                # Beep automatisch abspielen
-                beep = self._generate_beep()
-                b64 = base64.b64encode(beep).decode('utf-8')
-                components.html(
-                    f"""
-                    <audio autoplay>
-                      <source src="data:audio/wav;base64,{b64}" type="audio/wav">
-                    </audio>
-                    """, height=0
-                )
+                # Bereits geladenen Ton abspielen (nur ID und laufende Nummer, keine Audiodaten)
+                alarm_count += 1
+                tone_id = self._tone_id(self._alarm_severity(bpm))
+                with audio_pl:
+                    components.html(_TONE_TRIGGER % (alarm_count, json.dumps(tone_id)), height=0)
 
-            time.sleep(self.interval)
+        # Letzten Stand zeichnen, falls er wegen des Frame-Budgets noch fehlt
+        if x_buf and x_buf[-1] != drawn_time:
+            fig = self._window_figure(x_buf, y_buf, x_buf[-1])
+            chart_pl.plotly_chart(fig, use_container_width=True)
+            st.session_state['sim_last_fig'] = fig
 
         # Ende der Simulation
         st.session_state['sim_running'] = False
@@ -124,6 +275,21 @@ class CTGSimulator:
             for alert in st.session_state['sim_alerts']:
                 st.error(alert)
 
+    def replay(self, merge_gap_s: float = 0.0, min_duration_s: float = 0.0) -> pd.DataFrame:
+        """
+        Spielt die gesamte Aufzeichnung ohne Wartezeiten ab (Headless-Replay) und
+        gibt alle Alarm-Episoden als DataFrame zurück (siehe ctg_alarms.find_alarm_episodes).
+        """
+        if self.df is None:
+            self.load()
+        return find_alarm_episodes(
+            self.df.index.total_seconds().to_numpy(),
+            self.df[self.lb_col].to_numpy(),
+            self.bpm_threshold,
+            merge_gap_s=merge_gap_s,
+            min_duration_s=min_duration_s,
+        )
+
     def run(self):
         """Starte die Live-Simulation und bereite Alerts vor.
         Löscht vorherige Alerts aus dem Session-State."""
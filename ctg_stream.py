@@ -0,0 +1,187 @@
+"""
+ctg_stream.py
+
+Blockweises (streamendes) Einlesen und Auswerten langer CTG-Aufzeichnungen.
+Die CSV-Datei wird in festen Zeitabschnitten gelesen, sodass auch mehrstündige
+oder mehrtägige Aufzeichnungen mit begrenztem Speicher ausgewertet werden können.
+Enthalten sind blockweise Versionen der HF-Statistik und der Wehenerkennung.
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks, peak_widths
+
+from read_CSV import select_lb_column
+from wehen_analysis import contractions_frame, select_by_peak_distance
+
+ROWS_PER_READ = 50_000
+
+
+def iter_ctg_chunks(filepath, chunk_seconds=600, rows_per_read=ROWS_PER_READ):
+    """
+    Liest eine CTG-CSV-Datei blockweise in festen Zeitabschnitten.
+    Args:
+        filepath (str): Pfad zur CSV-Datei mit Spalte 'time'.
+        chunk_seconds (float): Länge eines Zeitabschnitts in Sekunden.
+        rows_per_read (int): Anzahl Zeilen pro Lesevorgang aus der Datei.
+    Rückgabe: Generator über DataFrames mit Timedelta-Index 'time'. Jeder Block
+              enthält die Samples des Intervalls [k * chunk_seconds, (k + 1) * chunk_seconds).
+    """
+    pending = None
+    for part in pd.read_csv(filepath, index_col='time', parse_dates=False, chunksize=rows_per_read):
+        part.index = part.index.astype(np.float64)
+        if pending is not None:
+            part = pd.concat([pending, part])
+        # Alle vollständig abgeschlossenen Zeitabschnitte ausgeben
+        block = np.floor(part.index.to_numpy() / chunk_seconds)
+        last_block = block[-1]
+        complete = block < last_block
+        for _, chunk in part[complete].groupby(block[complete], sort=True):
+            yield _with_timedelta_index(chunk)
+        pending = part[~complete]
+    if pending is not None and len(pending):
+        yield _with_timedelta_index(pending)
+
+
+def _with_timedelta_index(chunk):
+    """Wandelt den Sekunden-Index eines Blocks in einen Timedelta-Index um"""
+    chunk = chunk.copy(deep=False)
+    chunk.index = pd.to_timedelta(chunk.index, unit='s')
+    chunk.index.name = 'time'
+    return chunk
+
+
+class StreamingHRStats:
+    """
+    Laufende Herzfrequenz-Statistik (Anzahl, Mittelwert, Minimum, Maximum, Standardabweichung),
+    die Block für Block aktualisiert wird und nur konstant viel Speicher benötigt.
+    """
+    def __init__(self):
+        """Initialisiert eine leere Statistik"""
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values):
+        """Nimmt die Werte eines Blocks auf (NaN-Werte werden ignoriert)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+        # Zusammenführen der Teilstatistiken (Chan et al.) – numerisch stabil
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+
+    @property
+    def mean(self):
+        """Mittelwert aller bisher aufgenommenen Werte"""
+        return self._mean if self.count else np.nan
+
+    @property
+    def std(self):
+        """Standardabweichung (Stichprobe) aller bisher aufgenommenen Werte"""
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+def streaming_hr_stats(filepath, fetus=None, chunk_seconds=600):
+    """
+    Berechnet die HF-Statistik einer Aufzeichnung blockweise.
+    Rückgabe: StreamingHRStats für die zum Fötus passende LB-Spalte.
+    """
+    stats = StreamingHRStats()
+    lb_col = None
+    for chunk in iter_ctg_chunks(filepath, chunk_seconds=chunk_seconds):
+        if lb_col is None:
+            lb_col = select_lb_column(chunk.columns, fetus)
+        stats.update(chunk[lb_col].to_numpy())
+    return stats
+
+
+def detect_contractions_streaming(chunks, height=None, distance=None, overlap_seconds=300):
+    """
+    Blockweise Wehenerkennung mit denselben Parametern wie WehenAnalysis.detect_contractions.
+    Die Blöcke enthalten die Rohdaten der CSV-Datei (ohne Bereinigung und ohne das
+    einheitliche Zeitraster), die Ergebnisse können daher geringfügig abweichen.
+    Jeder Block wird zusammen mit dem Ende des vorherigen Blocks (overlap_seconds)
+    untersucht, damit Wehen an Blockgrenzen vollständig erfasst werden. Der
+    Mindestabstand wird erst am Ende über alle gefundenen Peaks angewendet.
+    Die Wehendauer kann minimal abweichen, wenn die Prominenz-Basis eines Peaks
+    weiter als overlap_seconds zurückliegt.
+    Args:
+        chunks: Iterierbare DataFrames mit Timedelta-Index und Spalte 'UC'
+                (z. B. aus iter_ctg_chunks).
+        height (float, optional): Mindesthöhe der Peaks.
+        distance (float, optional): Mindestabstand zwischen Peaks in Sekunden; wird wie in
+                                    WehenAnalysis.detect_contractions mit der Abtastrate in Samples umgerechnet.
+        overlap_seconds (float): Überlappung zum vorherigen Block in Sekunden.
+    Rückgabe: DataFrame wie WehenAnalysis.detect_contractions.
+    """
+    tail_y = np.empty(0)
+    tail_t = np.empty(0)
+    offset = 0  # globaler Sample-Index des ersten Tail-Samples
+    dt = None
+    peak_idx, peak_heights, peak_times, peak_durations = [], [], [], []
+
+    def collect(y, t, start, accept_until):
+        # Peaks mit Index in [start, accept_until) aus dem Puffer übernehmen
+        peaks, props = find_peaks(y, height=height)
+        own = (peaks >= start) & (peaks < accept_until)
+        peaks = peaks[own]
+        widths = peak_widths(y, peaks, rel_height=0.5)[0]
+        peak_idx.append(peaks + offset)
+        peak_heights.append(y[peaks])
+        peak_times.append(t[peaks])
+        peak_durations.append(widths * dt)
+
+    last_accepted = 0
+    for chunk in chunks:
+        if 'UC' not in chunk.columns:
+            raise ValueError("Die UC-Spalte fehlt im DataFrame.")
+        y = np.concatenate([tail_y, chunk['UC'].to_numpy(dtype=np.float64)])
+        t = np.concatenate([tail_t, chunk.index.total_seconds().to_numpy()])
+        if dt is None and len(t) > 1:
+            dt = np.median(np.diff(t))
+        if dt is None:
+            tail_y, tail_t = y, t
+            continue
+        overlap = int(np.ceil(overlap_seconds / dt))
+        # Peaks im hinteren Überlappungsbereich erst mit dem nächsten Block übernehmen
+        accept_until = max(len(y) - overlap, last_accepted)
+        collect(y, t, last_accepted, accept_until)
+        keep_from = max(len(y) - 2 * overlap, 0)
+        offset += keep_from
+        last_accepted = accept_until - keep_from
+        tail_y, tail_t = y[keep_from:], t[keep_from:]
+
+    if dt is None:
+        dt = 1.0
+    if len(tail_y):
+        collect(tail_y, tail_t, last_accepted, len(tail_y))
+
+    if not peak_idx:
+        return contractions_frame(np.empty(0), np.empty(0))
+    idx = np.concatenate(peak_idx)
+    heights = np.concatenate(peak_heights)
+    times = np.concatenate(peak_times)
+    durations = np.concatenate(peak_durations)
+    if distance is not None:
+        keep = select_by_peak_distance(idx, heights, max(distance / dt, 1))
+        times, durations = times[keep], durations[keep]
+    return contractions_frame(times, durations)
+
+
+if __name__ == "__main__":
+    path = "data/CTG_data/CTG_twins_healthy.csv"
+    stats = streaming_hr_stats(path, fetus="Fötus 1", chunk_seconds=600)
+    print(f"HF (blockweise): Mittelwert {stats.mean:.1f}, Min {stats.min:.1f}, Max {stats.max:.1f} bpm")
+    df = detect_contractions_streaming(iter_ctg_chunks(path, chunk_seconds=600), height=20, distance=120)
+    print(f"{len(df)} Wehen erkannt")
@@ -0,0 +1,97 @@
+"""
+ctg_summary.py
+
+Vorberechnete Herzfrequenz-Kennzahlen pro Aufzeichnung.
+Für alle LB-Spalten werden Mittelwert, Minimum, Maximum, Standardabweichung,
+Perzentile und Signalverlust-Anteil in einem einzigen vektorisierten Durchlauf
+berechnet und als summary.json im Sidecar-Verzeichnis der Aufzeichnung abgelegt.
+Wiederholte Ansichten lesen nur noch die fertigen Zahlen.
+"""
+import threading
+import warnings
+
+import numpy as np
+
+from ctg_cache import read_sidecar_json, recording_key, write_sidecar_json
+
+SUMMARY_VERSION = 3  # erhöhen, wenn sich die Kennzahlen ändern; der Stand der Bereinigung kommt hinzu
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+LB_PREFIX = "LB"
+
+_summary_memo = {}
+_memo_lock = threading.Lock()
+
+
+def lb_columns(columns):
+    """Gibt alle LB-Spalten (LB, LB1, LB2, ...) einer Aufzeichnung in ihrer Reihenfolge zurück"""
+    return [col for col in columns if col == LB_PREFIX or (col.startswith(LB_PREFIX) and col[2:].isdigit())]
+
+
+def summary_filename():
+    """Dateiname der Zusammenfassung im Sidecar, abhängig von Kennzahl- und Bereinigungsstand"""
+    from ctg_quality import CLEAN_DATA_VERSION  # hier statt oben: ctg_quality importiert ctg_summary
+    return f"summary.v{SUMMARY_VERSION}.{CLEAN_DATA_VERSION}.json"
+
+
+def compute_hr_summary(df):
+    """
+    Berechnet die HF-Kennzahlen aller LB-Spalten in einem vektorisierten Durchlauf.
+    Als Signalverlust zählen fehlende Werte (NaN) und Nullwerte; in die übrigen
+    Kennzahlen gehen nur fehlende Werte nicht ein (wie bei pandas mean/min/max).
+    Args:
+        df (pd.DataFrame): CTG-Daten mit mindestens einer LB-Spalte.
+    Rückgabe: Dictionary {LB-Spalte: {mean, min, max, std, count, signal_loss, percentiles}}.
+    """
+    cols = lb_columns(df.columns)
+    if not cols or len(df) == 0:
+        return {}
+    # Alle LB-Spalten als eine (Samples x Spalten)-Matrix
+    values = np.column_stack([df[col].to_numpy(dtype=np.float64) for col in cols])
+    missing = np.isnan(values)
+    count = (~missing).sum(axis=0)
+    lost = (missing | (values == 0)).sum(axis=0)
+
+    with warnings.catch_warnings():
+        # Spalten ganz ohne gültige Werte liefern NaN statt einer Warnung
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0, ddof=1)
+        vmin = np.nanmin(values, axis=0)
+        vmax = np.nanmax(values, axis=0)
+        pct = np.nanpercentile(values, PERCENTILES, axis=0)
+
+    summary = {}
+    for i, col in enumerate(cols):
+        summary[col] = {
+            "mean": float(mean[i]),
+            "min": float(vmin[i]),
+            "max": float(vmax[i]),
+            "std": float(std[i]),
+            "count": int(count[i]),
+            "signal_loss": float(lost[i] / len(values)),
+            "percentiles": {str(p): float(pct[j, i]) for j, p in enumerate(PERCENTILES)},
+        }
+    return summary
+
+
+def load_hr_summary(filepath, df):
+    """
+    Gibt die HF-Kennzahlen einer Aufzeichnung zurück.
+    Reihenfolge: Speicher des Prozesses -> summary.json im Sidecar -> Neuberechnung.
+    Args:
+        filepath (str): Pfad zur Aufzeichnung (bestimmt den Cache-Schlüssel).
+        df (pd.DataFrame): Bereits geladene Daten dieser Aufzeichnung.
+    """
+    key = recording_key(filepath)
+    with _memo_lock:
+        summary = _summary_memo.get(key)
+    if summary is not None:
+        return summary
+
+    summary = read_sidecar_json(filepath, summary_filename())
+    if summary is None:
+        summary = compute_hr_summary(df)
+        write_sidecar_json(filepath, summary_filename(), summary)
+    with _memo_lock:
+        _summary_memo[key] = summary
+    return summary
@@ -0,0 +1,242 @@
+"""
+ctg_twins.py
+
+Gemeinsame Auswertung aller LB-Kanäle einer Aufzeichnung (z. B. Zwillinge mit LB1/LB2).
+Statt pro Fötus ein eigenes CTG_Data-Objekt auszuwerten, werden die Kennzahlen aller
+Kanäle aus einem einzigen Ladevorgang gewonnen (HF-Statistik und Interpretation
+arbeiten bereits spaltenübergreifend).
+
+Zusätzlich wird erkannt, ob zwei Kanäle einander folgen: Eine über längere Zeit
+nahezu gleiche Herzfrequenz deutet darauf hin, dass beide Aufnehmer dasselbe Herz
+(oder die mütterliche Herzfrequenz) erfassen. Die gleitende Korrelation dient nur
+zur Bestätigung, wo beide Kanäle deutlich über dem Rauschen schwanken; bei flachem
+Verlauf ist sie selbst für dasselbe Herz niedrig. Gleitende Korrelation, mittlere
+Differenz und Streuung werden über Kumulativsummen in O(n) berechnet.
+"""
+import threading
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from ctg_cache import recording_key
+from ctg_interpretation import find_episodes, interpret_recording
+from ctg_summary import lb_columns, load_hr_summary
+
+COINCIDENCE_WINDOW_S = 120      # Fensterlänge der gleitenden Statistik
+COINCIDENCE_BPM = 3             # Hauptkriterium: mittlere absolute Differenz höchstens so groß
+COINCIDENCE_CORR = 0.9          # Bestätigung durch die Korrelation ...
+COINCIDENCE_NOISE_BPM = 2       # ... nur, wenn beide Kanäle im Fenster stärker streuen (Standardabweichung)
+COINCIDENCE_MERGE_GAP_S = 30    # Abschnitte mit kürzeren Unterbrechungen werden zusammengefasst
+COINCIDENCE_MIN_SECONDS = 60    # Mindestdauer einer gemeldeten Koinzidenz
+EPISODE_COLUMNS = ["channels", "start_s", "end_s", "duration_s", "correlation"]
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+class ChannelAnalysis:
+    """
+    Ergebnis der gemeinsamen Auswertung aller LB-Kanäle einer Aufzeichnung.
+
+    Attributes:
+        channels (pd.DataFrame): Kennzahlen je LB-Spalte (Index), u. a. mean, min, max, baseline, stv_ms.
+        correlation (dict): {(Kanal a, Kanal b): gleitende Korrelation je Sample (NaN ohne Überlappung)}.
+        coincidence (pd.DataFrame): Abschnitte, in denen zwei Kanäle einander folgen.
+        coincidence_fraction (dict): {(Kanal a, Kanal b): Anteil der Aufzeichnung mit Koinzidenz}.
+    """
+    def __init__(self, channels, correlation, coincidence, coincidence_fraction):
+        """Speichert die berechneten Ergebnisse"""
+        self.channels = channels
+        self.correlation = correlation
+        self.coincidence = coincidence
+        self.coincidence_fraction = coincidence_fraction
+
+    @property
+    def suspicious(self):
+        """True, wenn mindestens ein Kanalpaar zeitweise dasselbe Signal zu zeigen scheint"""
+        return len(self.coincidence) > 0
+
+
+def _window_sums(values, window):
+    """Zentrierte gleitende Summen über Kumulativsummen (Fenster am Rand verkürzt)"""
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    n = len(values)
+    half = window // 2
+    lo = np.clip(np.arange(n) - half, 0, n)
+    hi = np.clip(np.arange(n) + half + 1, 0, n)
+    return csum[hi] - csum[lo]
+
+
+def rolling_pair_stats(a, b, window):
+    """
+    Gleitende Pearson-Korrelation, mittlere absolute Differenz und Streuung zweier Kanäle.
+    Es zählen nur Samples, in denen beide Kanäle gültig sind (0 und NaN = Signalverlust);
+    Fenster mit weniger als der Hälfte gültiger Paare liefern NaN.
+    Args:
+        a, b (np.ndarray): Herzfrequenzen gleicher Länge in bpm.
+        window (int): Fensterlänge in Samples.
+    Rückgabe: (Korrelation, mittlere absolute Differenz in bpm, kleinere der beiden
+              Standardabweichungen im Fenster in bpm) je Sample
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    valid = ~np.isnan(a) & ~np.isnan(b) & (a != 0) & (b != 0)
+    if not valid.any():
+        nan = np.full(len(a), np.nan)
+        return nan, nan.copy(), nan.copy()
+    # Um den Gesamtmittelwert zentrieren, damit die Differenzen der Summen numerisch stabil bleiben
+    x = np.where(valid, a - a[valid].mean(), 0.0)
+    y = np.where(valid, b - b[valid].mean(), 0.0)
+    n = _window_sums(valid.astype(np.float64), window)
+    sx, sy = _window_sums(x, window), _window_sums(y, window)
+    sxx, syy, sxy = _window_sums(x * x, window), _window_sums(y * y, window), _window_sums(x * y, window)
+    sad = _window_sums(np.where(valid, np.abs(a - b), 0.0), window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        corr = cov / np.sqrt(var)
+        diff = sad / n
+        spread = np.sqrt(np.maximum(np.minimum(n * sxx - sx * sx, n * syy - sy * sy), 0.0)) / n
+    enough = n >= max(window // 2, 2)
+    corr[~enough | ~(var > 0)] = np.nan
+    diff[~enough] = np.nan
+    spread[~enough] = np.nan
+    return corr, diff, spread
+
+
+def coincidence_episodes(times, corr, diff, spread, max_bpm=COINCIDENCE_BPM, min_corr=COINCIDENCE_CORR,
+                         noise_bpm=COINCIDENCE_NOISE_BPM, merge_gap_s=COINCIDENCE_MERGE_GAP_S,
+                         min_seconds=COINCIDENCE_MIN_SECONDS):
+    """
+    Abschnitte, in denen zwei Kanäle anhaltend auf nahezu gleicher Höhe verlaufen.
+    Wo beide Kanäle stärker als noise_bpm schwanken, muss zusätzlich die Korrelation
+    mindestens min_corr betragen; Unterbrechungen bis merge_gap_s werden wie in
+    ctg_alarms.find_alarm_episodes überbrückt.
+    Args:
+        times (np.ndarray): Zeitpunkte der Samples in Sekunden.
+        corr, diff, spread (np.ndarray): Ergebnis von rolling_pair_stats.
+    Rückgabe: DataFrame mit start_s, end_s, duration_s und mittlerer Korrelation.
+    """
+    with np.errstate(invalid="ignore"):
+        confirmed = (corr >= min_corr) | (spread < noise_bpm)
+        mask = (diff <= max_bpm) & confirmed
+    if not mask.any():
+        return pd.DataFrame(columns=EPISODE_COLUMNS[1:])
+
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # exklusiv
+    if merge_gap_s > 0 and len(starts) > 1:
+        new_episode = np.concatenate([[True], times[starts[1:]] - times[ends[:-1] - 1] > merge_gap_s])
+        starts = starts[new_episode]
+        ends = ends[np.concatenate([new_episode[1:], [True]])]
+
+    dt = np.median(np.diff(times)) if len(times) > 1 else 0.0
+    durations = times[ends - 1] - times[starts] + dt
+    keep = durations >= min_seconds
+    starts, ends, durations = starts[keep], ends[keep], durations[keep]
+    if not len(starts):
+        return pd.DataFrame(columns=EPISODE_COLUMNS[1:])
+
+    # Mittlere Korrelation je Abschnitt über die Samples mit gültiger Korrelation
+    bounds = np.stack([starts, ends], axis=1).ravel()
+    valid = ~np.isnan(corr)
+    sums = np.add.reduceat(np.append(np.where(valid, corr, 0.0), 0.0), bounds)[::2]
+    counts = np.add.reduceat(np.append(valid.astype(np.float64), 0.0), bounds)[::2]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = sums / counts
+    return pd.DataFrame({
+        "start_s": times[starts],
+        "end_s": times[ends - 1],
+        "duration_s": durations,
+        "correlation": correlation,
+    }, columns=EPISODE_COLUMNS[1:])
+
+
+def analyze_channels(ctg, window_s=COINCIDENCE_WINDOW_S):
+    """
+    Wertet alle LB-Spalten einer eingelesenen Aufzeichnung (CTG_Data) gemeinsam aus.
+    Ergebnisse werden pro Dateistand im Prozess gecacht.
+    Rückgabe: ChannelAnalysis
+    """
+    key = (recording_key(ctg.filepath), window_s)
+    with _memo_lock:
+        result = _memo.get(key)
+    if result is not None:
+        return result
+
+    cols = lb_columns(ctg.df.columns)
+    summary = load_hr_summary(ctg.filepath, ctg.df)
+    interpretation = interpret_recording(ctg)
+    channels = pd.DataFrame({
+        col: {
+            "mean": summary[col]["mean"],
+            "min": summary[col]["min"],
+            "max": summary[col]["max"],
+            "signal_loss": summary[col]["signal_loss"],
+            **interpretation[col].summary(),
+        } for col in cols
+    }).T.rename_axis("LB-Spalte")
+
+    times = ctg.seconds
+    dt = float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+    window = max(int(round(window_s / dt)), 2)
+    correlation, fraction, episodes = {}, {}, []
+    for col_a, col_b in combinations(cols, 2):
+        corr, diff, spread = rolling_pair_stats(ctg.df[col_a].to_numpy(), ctg.df[col_b].to_numpy(), window)
+        pair_episodes = coincidence_episodes(times, corr, diff, spread)
+        correlation[(col_a, col_b)] = corr
+        fraction[(col_a, col_b)] = float(pair_episodes["duration_s"].sum() / (len(times) * dt)) if len(times) else 0.0
+        if len(pair_episodes):
+            episodes.append(pair_episodes.assign(channels=f"{col_a}/{col_b}"))
+    coincidence = (pd.concat(episodes, ignore_index=True)[EPISODE_COLUMNS] if episodes
+                   else pd.DataFrame(columns=EPISODE_COLUMNS))
+
+    result = ChannelAnalysis(channels, correlation, coincidence, fraction)
+    with _memo_lock:
+        _memo[key] = result
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    from read_CSV import CTG_Data
+
+    for name in ("CTG_twins_healthy", "CTG_twins_hypertension"):
+        ctg = CTG_Data(f"data/CTG_data/{name}.csv")
+        ctg.read_csv()
+        t0 = time.perf_counter()
+        analysis = analyze_channels(ctg)
+        print(f"{name}: {len(analysis.channels)} Kanäle in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        print(analysis.channels.round(2))
+        print("Koinzidenz:", analysis.coincidence_fraction)
+
+    # Synthetische Prüfungen (1 Hz): beide Kanäle erfassen dasselbe Herz
+    rng = np.random.default_rng(0)
+    t = np.arange(0, 3600.0)
+
+    # Flacher Verlauf: die Korrelation ist hier nur Rauschen, die Differenz entscheidet
+    lb1 = 140 + rng.normal(0, 1, len(t))
+    lb2 = lb1 + rng.normal(0, 1, len(t))
+    episodes = coincidence_episodes(t, *rolling_pair_stats(lb1, lb2, COINCIDENCE_WINDOW_S))
+    print(episodes.round(2))
+    assert len(episodes) == 1 and episodes["duration_s"].iloc[0] >= 3500
+
+    # Ab Minute 20 folgt der zweite Kanal dem ersten (Sinusverlauf mit Extrema alle 2 Minuten)
+    lb1 = 140 + 8 * np.sin(2 * np.pi * t / 240) + rng.normal(0, 1, len(t))
+    lb2 = np.where(t < 1200, 130 + rng.normal(0, 3, len(t)), lb1 + rng.normal(0, 1, len(t)))
+    episodes = coincidence_episodes(t, *rolling_pair_stats(lb1, lb2, COINCIDENCE_WINDOW_S))
+    print(episodes.round(2))
+    assert len(episodes) == 1
+    assert abs(episodes["start_s"].iloc[0] - 1200) <= COINCIDENCE_WINDOW_S / 2
+    assert episodes["end_s"].iloc[0] >= 3500
+
+    # Zwei unabhängige Herzen mit ähnlicher Baseline: keine Koinzidenz
+    kernel = np.ones(30) / 30
+    lb1 = 140 + 25 * np.convolve(rng.normal(0, 1, len(t)), kernel, mode="same") + rng.normal(0, 1, len(t))
+    lb2 = 140 + 25 * np.convolve(rng.normal(0, 1, len(t)), kernel, mode="same") + rng.normal(0, 1, len(t))
+    episodes = coincidence_episodes(t, *rolling_pair_stats(lb1, lb2, COINCIDENCE_WINDOW_S))
+    assert episodes["duration_s"].sum() < 0.1 * len(t), episodes
@@ -2,14 +2,20 @@ import streamlit as st
 from PIL import Image
 from Person import Person  # Deine bestehende Person-Klasse
 from datetime import date, datetime
-import json
 import os
 from read_CSV import CTG_Data  # Deine CTG_Data-Klasse
 from wehen_analysis import WehenAnalysis
 from report_generator import generate_pdf
 from ctg_simulator import CTGSimulator
+from ctg_alarms import find_alarm_episodes
+from ctg_monitor import HIGH_RISK_MARGIN_BPM, AlarmRule, StreamScheduler, streams_for_active_patients
+from ctg_ingest import IngestServer, patient_key
+from ctg_features import FILTER_COLUMNS, FILTER_OPERATORS, open_feature_store
+from ctg_quality import quality_frame
+import asyncio
 import tempfile
 import pandas as pd
+import numpy as np
 import time
 import plotly.graph_objects as go
 from streamlit.runtime.scriptrunner import RerunException
@@ -17,14 +23,27 @@ from streamlit.runtime.scriptrunner import RerunException
 
 st.set_page_config(page_title="CTG APP")
 
+
+@st.cache_resource
+def get_ingest_server():
+    """Startet den Ingest-Server für Live-Geräte einmalig pro Streamlit-Prozess."""
+    return IngestServer().start_in_background()
+
+
+@st.cache_resource
+def get_feature_store():
+    """Öffnet den Feature-Store einmalig pro Streamlit-Prozess und übernimmt alle Personen."""
+    store = open_feature_store()
+    store.ingest_all(Person.load_person_data())
+    return store
+
 # -------------------------------
 # Globale Personenauswahl in Sidebar
 # -------------------------------
 with st.sidebar:
     st.markdown("### 👤 Versuchsperson wählen")
 
-    person_list_data = Person.load_person_data()
-    person_names = Person.get_person_list(person_list_data)
+    person_names = Person.get_person_list()
 
     if "current_user" not in st.session_state:
         st.session_state.current_user = "None"
@@ -37,12 +56,14 @@ with st.sidebar:
 # ---------------------------------------------
 # Tabs einrichten
 # ---------------------------------------------
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "👤 Person anzeigen",
     "📊 CTG Auswertung",
     "📄 PDF-Bericht",
     "▶️ Live-Simulation",
-    "➕ Neue Person anlegen"
+    "➕ Neue Person anlegen",
+    "🖥️ Zentrale Überwachung",
+    "🔬 Kohorten"
 ])
 #----------------------------------------------
 # Tab 1: Person anzeigen & bearbeiten
@@ -143,17 +164,12 @@ with tab1:
                             })
                             next_ctg_id += 1
 
-            # ✅ Änderungen in person_list_data zurückspeichern
-                    for idx, person in enumerate(person_list_data):
-                        if person["id"] == selected_person_data["id"]:
-                            person_list_data[idx] = selected_person_data
-                            break    
-
-                    with open("data/person_db.json", "w") as f:
-                        json.dump(person_list_data, f, indent=4)
+            # ✅ Änderungen dieser einen Person speichern
+                    Person.save_person_data(selected_person_data)
+                    get_feature_store().ingest_person(selected_person_data)
 
-                        st.success("Änderungen gespeichert!")
-                        st.rerun()
+                    st.success("Änderungen gespeichert!")
+                    st.rerun()
            
 # ---------------------------------------------
 # Tab 2: CTG Auswertung
@@ -181,17 +197,81 @@ with tab2:
             ctg = CTG_Data(selected_ctg_path, fetus=selected_fetus_name)
             ctg.read_csv()
 
-            avg_hr = ctg.average_HR_baby()
-            max_hr = ctg.max_HR_baby()
-            min_hr = ctg.min_HR_baby()
+            hr_stats = ctg.hr_summary()
+            avg_hr = hr_stats["mean"]
+            max_hr = hr_stats["max"]
+            min_hr = hr_stats["min"]
 
             st.write("### Fötus-Herzfrequenz-Auswertung")
             st.metric("Durchschnittliche HF", f"{avg_hr:.1f} bpm")
             st.metric("Maximale HF", f"{max_hr:.1f} bpm")
             st.metric("Minimale HF", f"{min_hr:.1f} bpm")
+            st.caption(
+                f"Standardabweichung: {hr_stats['std']:.1f} bpm · "
+                f"Median: {hr_stats['percentiles']['50']:.1f} bpm · "
+                f"Signalverlust: {hr_stats['signal_loss'] * 100:.1f} %"
+            )
+
+            # --- SIGNALQUALITÄT ---
+            quality = ctg.quality_report()
+            lb_quality = quality["columns"][ctg.get_lb_column()]
+            st.metric("Signalqualität (SQI)", f"{lb_quality['sqi'] * 100:.1f} %",
+                      help="Anteil gültiger Samples nach der Bereinigung (ohne Artefakte und Signalverlust)")
+            st.caption(
+                f"Außerhalb des Messbereichs: {lb_quality['out_of_range']} · "
+                f"Sprungartefakte: {lb_quality['step']} · "
+                f"Interpoliert: {lb_quality['interpolated']} · "
+                f"Verbleibende Lücken: {lb_quality['missing']} Samples"
+            )
+            if lb_quality["sqi"] < 1:
+                with st.expander("Signalqualität je Minute"):
+                    st.line_chart(quality_frame(quality))
+
+            # --- CTG-INTERPRETATION ---
+            interp = ctg.interpretation()
+            st.write("### CTG-Interpretation")
+            int_cols = st.columns(5)
+            int_cols[0].metric("Baseline", f"{interp.baseline_bpm:.0f} bpm")
+            int_cols[1].metric("STV", f"{interp.stv_ms:.1f} ms", help="Kurzzeitvariabilität (Dawes-Redman, 1/16-Minuten-Epochen)")
+            int_cols[2].metric("LTV", f"{interp.ltv_bpm:.1f} bpm", help="Langzeitvariabilität: Schwankungsbreite je Minute (Median)")
+            int_cols[3].metric("Akzelerationen", len(interp.accelerations), help="≥ 15 bpm über der Baseline für ≥ 15 s")
+            int_cols[4].metric("Dezelerationen", len(interp.decelerations), help="≥ 15 bpm unter der Baseline für ≥ 15 s")
+            if len(interp.decelerations):
+                with st.expander("Dezelerationen anzeigen"):
+                    st.dataframe(interp.decelerations, hide_index=True)
+
+            # --- ZWILLINGE: alle LB-Kanäle gemeinsam ---
+            channels = ctg.channel_analysis()
+            if len(channels.channels) > 1:
+                st.write("### Zwillingsanalyse")
+                st.dataframe(channels.channels.rename(columns={
+                    "mean": "Mittel (bpm)", "min": "Min (bpm)", "max": "Max (bpm)", "signal_loss": "Signalverlust",
+                    "baseline": "Baseline (bpm)", "stv_ms": "STV (ms)", "ltv_bpm": "LTV (bpm)",
+                    "accelerations": "Akzelerationen", "decelerations": "Dezelerationen",
+                }).round(2))
+                if channels.suspicious:
+                    share = ", ".join(f"{a}/{b}: {f * 100:.0f} %" for (a, b), f in channels.coincidence_fraction.items() if f)
+                    st.warning(f"⚠️ Die Kanäle verlaufen zeitweise nahezu identisch ({share} der Aufzeichnung) – "
+                               "möglicherweise wird dasselbe Herz doppelt erfasst.")
+                    with st.expander("Abschnitte mit Signalkoinzidenz"):
+                        st.dataframe(channels.coincidence.round(2), hide_index=True)
+                else:
+                    st.caption("Keine Signalkoinzidenz zwischen den Kanälen erkannt.")
 
             st.write("### CTG-Diagramm")
-            st.plotly_chart(ctg.plotly_figure(), use_container_width=True)
+            # Sichtbarer Bereich: beim Hineinzoomen wird nur die feinere Detailstufe dieses Bereichs geladen
+            total_s = int(np.ceil(ctg.seconds[-1]))
+            view_start, view_end = st.slider(
+                "Sichtbarer Zeitbereich (s)",
+                min_value=0, max_value=total_s, value=(0, total_s), step=10, key="ctg_view_range"
+            )
+            ctg_fig = ctg.plotly_figure(time_range=(view_start, view_end))
+            in_view = (interp.epoch_times >= view_start) & (interp.epoch_times <= view_end)
+            ctg_fig.add_trace(go.Scatter(
+                x=interp.epoch_times[in_view], y=interp.baseline[in_view], mode='lines', name='Baseline',
+                line=dict(width=1, color="black", dash="dash"), yaxis='y1'
+            ))
+            st.plotly_chart(ctg_fig, use_container_width=True)
 
              # --- WEHEN-ANALYSE ---
             st.write("### Wehen-Abstand und -Dauer")
@@ -212,6 +292,18 @@ with tab2:
             summary = df_cat['Wehenart'].value_counts().rename_axis('Kategorie').reset_index(name='Anzahl')
             st.subheader("Anzahl Wehen pro Kategorie")
             st.table(summary)
+
+            # Verzögerung des FHR-Abfalls gegenüber jeder Wehe (Kreuzkorrelation)
+            lags = ctg.contraction_lags(df_peaks)
+            if len(lags):
+                st.subheader("Zeitlicher Zusammenhang Wehe / Herzfrequenz")
+                n_late = int(lags["late_deceleration"].sum())
+                if n_late:
+                    st.warning(f"⚠️ {n_late} mögliche späte Dezeleration(en): FHR-Abfall folgt der Wehe verzögert.")
+                st.dataframe(lags.rename(columns={
+                    "peak_s": "Wehengipfel (s)", "lag_s": "Verzögerung (s)", "strength": "Korrelation",
+                    "depth_bpm": "Abfall (bpm)", "late_deceleration": "Späte Dezeleration",
+                }).round(2), hide_index=True)
             # ------------------------
         else:
             st.warning("⚠️ Keine CTG-Dateien für diese Person hinterlegt.")
@@ -244,7 +336,7 @@ with tab5:
         add_btn = st.form_submit_button("Neue Person speichern")
 
         if add_btn:
-            if any(p["id"] == new_id for p in person_list_data):
+            if Person.id_exists(new_id):
                 st.error("ID existiert bereits!")
             else:
                 new_picture_path = "data/pictures/none.png"
@@ -279,9 +371,8 @@ with tab5:
                     "CTG_tests": ctg_tests
                 }
 
-                person_list_data.append(new_person)
-                with open("data/person_db.json", "w") as f:
-                    json.dump(person_list_data, f, indent=4)
+                Person.add_person_data(new_person)
+                get_feature_store().ingest_person(new_person)
 
                 st.success(f"Neue Person {new_firstname} {new_lastname} gespeichert!")
                 if uploaded_csvs:
@@ -307,7 +398,13 @@ with tab3:
         include_ctg = st.checkbox("📊 CTG-Auswertung", value=True)
         include_image = st.checkbox("🖼 Profilbild in Bericht aufnehmen", value=True)
         include_ctg_plot = st.checkbox("📈 CTG-Diagramm einfügen", value=True)
+        plot_mode = st.radio(
+            "Diagramm-Darstellung", ["vector", "raster"], horizontal=True,
+            format_func=lambda m: "Vektorgrafik (klein, schnell)" if m == "vector" else "Bild (matplotlib)",
+            disabled=not include_ctg_plot
+        )
         include_wehen = st.checkbox("💢 Wehenanalyse aufnehmen", value=True)
+        include_strips = st.checkbox("🧾 Gesamte Aufzeichnung als CTG-Streifen (mehrseitig, 1 cm/min)", value=False)
 
         # 📁 CTG-Auswahl basierend auf Datum
         ctg_labels = [test["date"] for test in selected_person.CTG_tests]
@@ -325,11 +422,13 @@ with tab3:
             fetus_options = [f.name for f in selected_person.fetuses_list]
             fetus_name = st.selectbox("👶 Fötus für Bericht wählen", options=fetus_options)
 
-        # Zeitbereichs-Auswahl (maximal 750 Sekunden)
+        # Zeitbereichs-Auswahl (bis zum Ende der gewählten Aufzeichnung)
         selected_time_range = None
-        if include_ctg_plot:
+        if include_ctg_plot and selected_person.CTG_tests:
             st.write("### Zeitbereich für Diagramm (Sekunden)")
-            MAX_TIME = 740
+            report_ctg = CTG_Data(selected_person.CTG_tests[selected_ctg_index]["result_link"])
+            report_ctg.read_csv()
+            MAX_TIME = max(int(report_ctg.seconds[-1]), 10) if len(report_ctg.seconds) else 10
             start_time = st.number_input("Startzeit (s)", min_value=0, max_value=MAX_TIME - 10, value=0, step=10)
             end_time = st.number_input(
                 "Endzeit (s)", 
@@ -358,7 +457,9 @@ with tab3:
                 include_wehen=include_wehen,
                 wehen_height=wehen_height,
                 wehen_distance=wehen_distance,
-                ctg_index=selected_ctg_index
+                ctg_index=selected_ctg_index,
+                plot_mode=plot_mode,
+                include_strips=include_strips
             )
 
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmpfile:
@@ -373,6 +474,124 @@ with tab3:
     else:
         st.info("Bitte links im Menü eine Person auswählen.")
 
+#----------------------------------------------
+# Tab 6: Zentrale Überwachung aller aktiven Patientinnen
+# (vor Tab 4, da Tab 4 das Skript ohne Personenauswahl mit st.stop() beendet)
+# ---------------------------------------------
+with tab6:
+    st.title("🖥️ Zentrale Überwachung")
+    st.write("Alle Patientinnen mit CTG-Daten werden gleichzeitig abgespielt und auf Alarme geprüft.")
+
+    mon_thr = st.number_input("Standard-Alarmschwelle (bpm)", 60, 160, 110, 1, key="mon_bpm_thr")
+    mon_min_dur = st.number_input("Standard: Alarm erst nach (s) unter der Schwelle", 0, 60, 5, 1, key="mon_min_dur")
+
+    # Alarmregel je Datenquelle: aus dem Risikoprofil abgeleitet, pro Zeile anpassbar
+    mon_streams = streams_for_active_patients(Person.load_person_data(), rule=AlarmRule(mon_thr, mon_min_dur))
+    st.caption("Alarmregeln je Patientin (Risikoschwangerschaften: "
+               f"+{HIGH_RISK_MARGIN_BPM:g} bpm, halbe Mindestdauer) – Werte in der Tabelle anpassbar.")
+    mon_rules = st.data_editor(
+        pd.DataFrame({
+            "Patientin": [stream.label for stream in mon_streams],
+            "Schwelle (bpm)": [stream.rule.bpm_threshold for stream in mon_streams],
+            "Mindestdauer (s)": [stream.rule.min_duration_s for stream in mon_streams],
+        }),
+        disabled=["Patientin"], hide_index=True, use_container_width=True, key="mon_rules"
+    )
+    for stream, threshold, min_duration in zip(mon_streams, mon_rules["Schwelle (bpm)"], mon_rules["Mindestdauer (s)"]):
+        stream.rule = AlarmRule(float(threshold), float(min_duration))
+
+    mon_speed = st.select_slider("Tempo (Aufzeichnungssekunden pro Sekunde)", [1, 5, 10, 30, 60], 10, key="mon_speed")
+    mon_duration = st.number_input("Laufzeit (s)", 10, 3600, 60, 10, key="mon_duration")
+
+    if st.button("▶️ Überwachung starten", key="btn_start_monitor"):
+        scheduler = StreamScheduler(speed=mon_speed, tick_s=0.1, publish_every_s=1.0)
+        for stream in mon_streams:
+            scheduler.add_stream(stream)
+
+        # Ein Platzhalter pro Stream, zwei Streams pro Zeile
+        placeholders = {}
+        stream_ids = list(scheduler.streams)
+        for row_start in range(0, len(stream_ids), 2):
+            cols = st.columns(2)
+            for col, sid in zip(cols, stream_ids[row_start:row_start + 2]):
+                placeholders[sid] = col.empty()
+        alarm_pl = st.empty()
+        monitor_alerts = []
+        drawn_states = {}  # zuletzt gezeichneter (Zeitpunkt, Alarm) je Stream
+
+        def publish(batch):
+            """Zeichnet alle Streams einer gebündelten Aktualisierung neu, die sich seit dem letzten Mal verändert haben"""
+            for sid, state in batch["streams"].items():
+                # Unveränderte Streams (z. B. bereits beendet) nicht erneut zeichnen:
+                # ein identisches Element würde eine doppelte Element-ID erzeugen
+                drawn = (state["time_s"], state["alarm"])
+                if drawn_states.get(sid) == drawn:
+                    continue
+                drawn_states[sid] = drawn
+                with placeholders[sid].container():
+                    st.metric(
+                        ("🔴 " if state["alarm"] else "🟢 ") + state["label"],
+                        f"{state['bpm']:.0f} bpm",
+                        help=f"Zeitpunkt {state['time_s']:.0f} s"
+                    )
+                    fig = go.Figure(go.Scatter(x=state["x"], y=state["y"], mode="lines"))
+                    fig.update_layout(template="simple_white", height=180, margin=dict(l=30, r=10, t=10, b=30),
+                                      yaxis=dict(range=[70, 200]))
+                    st.plotly_chart(fig, use_container_width=True)
+            for alarm in batch["alarms"]:
+                monitor_alerts.append(
+                    f"⚠️ {alarm['label']}: FHR {alarm['bpm']:.0f} bpm bei {alarm['time_s']:.0f} s"
+                )
+            if monitor_alerts:
+                alarm_pl.error("\n\n".join(monitor_alerts[-10:]))
+
+        asyncio.run(scheduler.run(publish, duration_s=mon_duration))
+        st.success("✅ Überwachung beendet.")
+
+#----------------------------------------------
+# Tab 7: Kohorten-Abfragen über den Feature-Store
+# (vor Tab 4, da Tab 4 das Skript ohne Personenauswahl mit st.stop() beendet)
+# ---------------------------------------------
+with tab7:
+    st.title("🔬 Kohorten")
+    st.write("Vorberechnete Kennzahlen aller Aufzeichnungen – gefiltert ohne erneutes Einlesen der CSV-Dateien.")
+    feature_store = get_feature_store()
+
+    coh_col1, coh_col2, coh_col3 = st.columns(3)
+    with coh_col1:
+        coh_twins = st.checkbox("Nur Mehrlingsschwangerschaften", key="coh_twins")
+    with coh_col2:
+        coh_risk = st.checkbox("Nur Risikoschwangerschaften", key="coh_risk")
+    with coh_col3:
+        coh_max_hr = st.number_input("Mittlere FHR unter (bpm)", 60, 220, 220, 5, key="coh_max_hr")
+    # Zusätzliche Bedingung aus festen Auswahllisten (kein freier Ausdruck)
+    coh_col4, coh_col5, coh_col6 = st.columns(3)
+    with coh_col4:
+        coh_column = st.selectbox("Weitere Bedingung", ["–"] + FILTER_COLUMNS, key="coh_column")
+    with coh_col5:
+        coh_op = st.selectbox("Vergleich", list(FILTER_OPERATORS), key="coh_op")
+    with coh_col6:
+        coh_value = st.number_input("Wert", value=0.0, key="coh_value")
+
+    filters = [("mean_hr", "<", coh_max_hr)]
+    if coh_twins:
+        filters.append(("fetuses", ">", 1))
+    if coh_risk:
+        filters.append(("high_risk", "==", 1))
+    if coh_column != "–":
+        filters.append((coh_column, coh_op, coh_value))
+
+    t_query = time.perf_counter()
+    cohort = feature_store.cohort(filters)
+    query_ms = (time.perf_counter() - t_query) * 1000
+
+    st.caption(f"{len(cohort)} Aufzeichnung(en) von {cohort['person_id'].nunique()} Person(en) · Abfrage in {query_ms:.1f} ms")
+    st.dataframe(cohort.drop(columns=["result_link"]), hide_index=True)
+
+    if st.button("🔄 Feature-Store neu berechnen", key="btn_refresh_features"):
+        computed = feature_store.ingest_all(Person.load_person_data(), force=True)
+        st.success(f"{computed} Aufzeichnung(en) neu berechnet.")
+
 #----------------------------------------------
 # Tab 4: Live-Simulation & Alarm
 # ---------------------------------------------
@@ -404,6 +623,47 @@ with tab4:
         [0.1, 0.5, 1.0, 2.0], 0.1, key="sim_interval"
     )
 
+    # Datenquelle: aufgezeichnete CSV oder Live-Gerät über den Ingest-Server
+    source = st.radio("Datenquelle", ["CSV-Aufzeichnung", "Live-Gerät"], horizontal=True, key="sim_source")
+    live_buffer = None
+    if source == "Live-Gerät":
+        try:
+            ingest_server = get_ingest_server()
+        except OSError as e:
+            # Port belegt oder Start zu langsam (TimeoutError ist ein OSError)
+            st.error(f"Ingest-Server konnte nicht gestartet werden: {e}")
+        else:
+            device_id = patient_key(person_data["id"])
+            live_buffer = ingest_server.buffer(device_id)
+            st.caption(f"Ingest-Server {ingest_server.host}:{ingest_server.port} · Patienten-ID {device_id} · "
+                       f"{len(live_buffer)} Samples im Puffer")
+            emu_col1, emu_col2 = st.columns(2)
+            with emu_col1:
+                emu_speed = st.select_slider("Emulator-Tempo (x Echtzeit)", [1, 2, 5, 10, 30], 10, key="emu_speed")
+            with emu_col2:
+                if st.button("📡 Geräte-Emulator starten", key="btn_start_emulator"):
+                    CTGSimulator(ctg_path, CTG_Data(ctg_path, fetus=selected_fetus_name).get_lb_column()).emulate_device(
+                        device_id, ingest_server.host, ingest_server.port, speed=emu_speed
+                    )
+                    st.success("Emulator sendet die Aufzeichnung an den Ingest-Server.")
+
+    # Alarm-Vorschau: gesamte Aufzeichnung ohne Wartezeiten auswerten
+    with st.expander("🔎 Alarm-Vorschau (gesamte Aufzeichnung)"):
+        merge_gap = st.number_input("Episoden zusammenfassen bei Lücken bis (s)", 0, 60, 5, key="replay_merge_gap")
+        min_duration = st.number_input("Minimale Episodendauer (s)", 0, 300, 10, key="replay_min_duration")
+        replay_ctg = CTG_Data(ctg_path, fetus=selected_fetus_name)
+        replay_ctg.read_csv()
+        episodes = find_alarm_episodes(
+            replay_ctg.seconds,
+            replay_ctg.df[replay_ctg.get_lb_column()].to_numpy(),
+            bpm_thr, merge_gap_s=merge_gap, min_duration_s=min_duration
+        )
+        if episodes.empty:
+            st.success("✅ Keine Alarm-Episoden mit dieser Schwelle.")
+        else:
+            st.write(f"{len(episodes)} Alarm-Episode(n), insgesamt {episodes['duration_s'].sum():.0f} s")
+            st.dataframe(episodes, hide_index=True)
+
     # 4) Session-State für Start/Stop (einmalig)
     if "sim_running" not in st.session_state:
         st.session_state.sim_running = False
@@ -427,7 +687,8 @@ with tab4:
             csv_path=ctg_path,
             lb_col=CTG_Data(ctg_path, fetus=selected_fetus_name).get_lb_column(),
             bpm_threshold=bpm_thr,
-            interval=interval
+            interval=interval,
+            live_buffer=live_buffer
         )
         simulator.run_live()
 
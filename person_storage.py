@@ -0,0 +1,367 @@
+"""
+person_storage.py
+
+Austauschbare Speicherschicht für Personen- und CTG-Metadaten.
+Es gibt zwei Implementierungen mit derselben Schnittstelle (PersonStorage):
+  - PersonRepository: bisherige JSON-Datei, im Speicher indiziert, atomar geschrieben
+  - SQLitePersonStorage: eingebettete SQLite-Datenbank mit Tabellen für Personen,
+    Vorerkrankungen und CTG-Tests; jede Änderung ist eine Transaktion über
+    genau eine Person. Föten werden wie in der JSON-Datei nur als Anzahl gespeichert
+    (Namen und Schwangerschaftswoche leitet Person daraus ab)
+Welche Implementierung genutzt wird, bestimmt die Umgebungsvariable CTG_PERSON_DB
+(Endung .db/.sqlite -> SQLite, sonst JSON).
+
+Einmaliger Import der JSON-Datenbank:
+    python person_storage.py data/person_db.json data/person_db.sqlite
+"""
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+
+PERSON_DB_PATH = "data/person_db.json"
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class PersonStorage(ABC):
+    """Gemeinsame Schnittstelle aller Speicher-Backends für Personendaten (Dictionaries wie in person_db.json)"""
+    @abstractmethod
+    def all(self):
+        """Gibt alle Personendaten als Liste von Dictionaries zurück"""
+
+    def names(self):
+        """Gibt alle Personennamen im Format 'Nachname, Vorname' zurück"""
+        return [f"{p['lastname']}, {p['firstname']}" for p in self.all()]
+
+    @abstractmethod
+    def get_by_id(self, person_id):
+        """Gibt die Personendaten zur ID zurück oder None"""
+
+    @abstractmethod
+    def get_by_name(self, lastname, firstname):
+        """Gibt die Personendaten zu (Nachname, Vorname) zurück oder None"""
+
+    def contains_id(self, person_id):
+        """Prüft, ob eine Person mit dieser ID existiert"""
+        return self.get_by_id(person_id) is not None
+
+    @abstractmethod
+    def save_person(self, person_dict):
+        """Speichert die Änderungen einer bestehenden Person"""
+
+    @abstractmethod
+    def add_person(self, person_dict):
+        """Legt eine neue Person an"""
+
+
+class PersonRepository(PersonStorage):
+    """
+    Lädt die Personen-Datenbank (JSON) einmalig und hält Indizes nach ID und Name.
+    Die Datei wird nur neu eingelesen, wenn sie sich auf der Festplatte geändert hat
+    (mtime oder Größe), sodass Abfragen nicht mehr mit der Anzahl der Personen wachsen.
+    """
+    def __init__(self, path=PERSON_DB_PATH):
+        """Initialisiert das Repository für die angegebene JSON-Datei (noch ohne sie zu lesen)"""
+        self.path = path
+        self._file_state = None
+        self._persons = []
+        self._by_id = {}
+        self._by_name = {}
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        """Liest die JSON-Datei neu ein, falls sie sich seit dem letzten Laden geändert hat"""
+        stat = os.stat(self.path)
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state == self._file_state:
+            return
+        with self._lock:
+            if file_state == self._file_state:
+                return
+            with open(self.path) as file:
+                persons = json.load(file)
+            self._set_persons(persons, file_state)
+
+    def _set_persons(self, persons, file_state):
+        """Übernimmt die Personenliste und baut die Indizes neu auf"""
+        by_id = {}
+        by_name = {}
+        for person in persons:
+            # Bei Duplikaten gewinnt wie bisher der erste Eintrag
+            by_id.setdefault(person["id"], person)
+            by_name.setdefault((person["lastname"], person["firstname"]), person)
+        self._persons, self._by_id, self._by_name = persons, by_id, by_name
+        self._file_state = file_state
+
+    def all(self):
+        """Gibt eine Kopie aller Personendaten als Liste von Dictionaries zurück"""
+        self._refresh()
+        return copy.deepcopy(self._persons)
+
+    def names(self):
+        """Gibt alle Personennamen im Format 'Nachname, Vorname' zurück"""
+        self._refresh()
+        return [f"{p['lastname']}, {p['firstname']}" for p in self._persons]
+
+    def get_by_id(self, person_id):
+        """Gibt eine Kopie der Personendaten zur ID zurück oder None"""
+        self._refresh()
+        person = self._by_id.get(person_id)
+        return copy.deepcopy(person) if person is not None else None
+
+    def get_by_name(self, lastname, firstname):
+        """Gibt eine Kopie der Personendaten zu (Nachname, Vorname) zurück oder None"""
+        self._refresh()
+        person = self._by_name.get((lastname, firstname))
+        return copy.deepcopy(person) if person is not None else None
+
+    def contains_id(self, person_id):
+        """Prüft, ob eine Person mit dieser ID existiert"""
+        self._refresh()
+        return person_id in self._by_id
+
+    def _write(self, persons):
+        """Schreibt die Personenliste atomar (temporäre Datei + os.replace) zurück"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".person_db-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(persons, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        stat = os.stat(self.path)
+        self._set_persons(persons, (stat.st_mtime_ns, stat.st_size))
+
+    def save_person(self, person_dict):
+        """Ersetzt den Eintrag mit derselben ID und schreibt die Datei atomar zurück"""
+        with self._lock:
+            self._refresh()
+            persons = copy.deepcopy(self._persons)
+            for idx, person in enumerate(persons):
+                if person["id"] == person_dict["id"]:
+                    persons[idx] = copy.deepcopy(person_dict)
+                    break
+            else:
+                raise KeyError(f"Person mit ID {person_dict['id']} nicht gefunden.")
+            self._write(persons)
+
+    def add_person(self, person_dict):
+        """Hängt eine neue Person an und schreibt die Datei atomar zurück"""
+        with self._lock:
+            self._refresh()
+            if person_dict["id"] in self._by_id:
+                raise ValueError(f"ID {person_dict['id']} existiert bereits.")
+            persons = copy.deepcopy(self._persons)
+            persons.append(copy.deepcopy(person_dict))
+            self._write(persons)
+
+
+class SQLitePersonStorage(PersonStorage):
+    """
+    SQLite-Backend für Personendaten.
+    Jede Schreiboperation betrifft genau eine Person und läuft in einer eigenen
+    Transaktion (BEGIN IMMEDIATE), gleichzeitige Sitzungen sehen daher immer einen
+    konsistenten Stand. Jeder Thread erhält eine eigene Verbindung.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS persons (
+            id PRIMARY KEY,
+            firstname TEXT NOT NULL,
+            lastname TEXT NOT NULL,
+            date_of_birth TEXT NOT NULL,
+            picture_path TEXT,
+            gender TEXT,
+            pregnancies INTEGER DEFAULT 0,
+            fetuses INTEGER DEFAULT 0,
+            gestational_age_weeks INTEGER DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_persons_name ON persons (lastname, firstname);
+        CREATE TABLE IF NOT EXISTS medical_conditions (
+            person_id NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            condition TEXT NOT NULL,
+            PRIMARY KEY (person_id, position)
+        );
+        DROP TABLE IF EXISTS fetuses;
+        CREATE TABLE IF NOT EXISTS CTG_tests (
+            person_id NOT NULL REFERENCES persons (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            date TEXT,
+            result_link TEXT,
+            PRIMARY KEY (person_id, position)
+        );
+    """
+    PERSON_COLUMNS = ("id", "firstname", "lastname", "date_of_birth", "picture_path", "gender",
+                      "pregnancies", "fetuses", "gestational_age_weeks")
+
+    def __init__(self, path):
+        """Öffnet (bzw. erzeugt) die SQLite-Datenbank und legt das Schema an"""
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        """Gibt die Verbindung des aktuellen Threads zurück und öffnet sie bei Bedarf"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _person_from_row(self, conn, row):
+        """Baut aus einer Zeile der Tabelle persons das Personen-Dictionary inkl. Untertabellen"""
+        person = {key: row[key] for key in self.PERSON_COLUMNS}
+        person["medical_conditions"] = [
+            r["condition"] for r in conn.execute(
+                "SELECT condition FROM medical_conditions WHERE person_id = ? ORDER BY position",
+                (row["id"],))
+        ]
+        person["CTG_tests"] = [
+            {"id": r["id"], "date": r["date"], "result_link": r["result_link"]}
+            for r in conn.execute(
+                "SELECT id, date, result_link FROM CTG_tests WHERE person_id = ? ORDER BY position",
+                (row["id"],))
+        ]
+        return person
+
+    def all(self):
+        """Gibt alle Personendaten in Einfügereihenfolge zurück"""
+        conn = self._connect()
+        rows = conn.execute("SELECT * FROM persons ORDER BY rowid").fetchall()
+        return [self._person_from_row(conn, row) for row in rows]
+
+    def names(self):
+        """Gibt alle Personennamen im Format 'Nachname, Vorname' zurück, ohne Untertabellen zu lesen"""
+        rows = self._connect().execute("SELECT lastname, firstname FROM persons ORDER BY rowid")
+        return [f"{r['lastname']}, {r['firstname']}" for r in rows]
+
+    def get_by_id(self, person_id):
+        """Gibt die Personendaten zur ID zurück oder None"""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM persons WHERE id = ?", (person_id,)).fetchone()
+        return self._person_from_row(conn, row) if row is not None else None
+
+    def get_by_name(self, lastname, firstname):
+        """Gibt die Personendaten zu (Nachname, Vorname) zurück oder None"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT * FROM persons WHERE lastname = ? AND firstname = ? ORDER BY rowid LIMIT 1",
+            (lastname, firstname)).fetchone()
+        return self._person_from_row(conn, row) if row is not None else None
+
+    def contains_id(self, person_id):
+        """Prüft, ob eine Person mit dieser ID existiert"""
+        row = self._connect().execute("SELECT 1 FROM persons WHERE id = ?", (person_id,)).fetchone()
+        return row is not None
+
+    def _write_children(self, conn, person_dict):
+        """Ersetzt Vorerkrankungen und CTG-Tests einer Person"""
+        person_id = person_dict["id"]
+        for table in ("medical_conditions", "CTG_tests"):
+            conn.execute(f"DELETE FROM {table} WHERE person_id = ?", (person_id,))
+        conn.executemany(
+            "INSERT INTO medical_conditions (person_id, position, condition) VALUES (?, ?, ?)",
+            [(person_id, i, c) for i, c in enumerate(person_dict.get("medical_conditions", []))])
+        conn.executemany(
+            "INSERT INTO CTG_tests (person_id, position, id, date, result_link) VALUES (?, ?, ?, ?, ?)",
+            [(person_id, i, t["id"], t["date"], t["result_link"])
+             for i, t in enumerate(person_dict.get("CTG_tests", []))])
+
+    def _person_values(self, person_dict):
+        """Gibt die Spaltenwerte der Tabelle persons für ein Personen-Dictionary zurück"""
+        return (
+            person_dict["id"], person_dict["firstname"], person_dict["lastname"],
+            person_dict["date_of_birth"], person_dict.get("picture_path"), person_dict.get("gender"),
+            person_dict.get("pregnancies", 0), person_dict.get("fetuses", 0),
+            person_dict.get("gestational_age_weeks", 0),
+        )
+
+    def _upsert(self, conn, person_dict):
+        """Fügt eine Person ein oder aktualisiert sie (rowid und damit Reihenfolge bleiben erhalten)"""
+        columns = ", ".join(self.PERSON_COLUMNS)
+        placeholders = ", ".join("?" for _ in self.PERSON_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in self.PERSON_COLUMNS[1:])
+        conn.execute(
+            f"INSERT INTO persons ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}",
+            self._person_values(person_dict))
+        self._write_children(conn, person_dict)
+
+    def save_person(self, person_dict):
+        """Aktualisiert eine bestehende Person in einer einzigen Transaktion"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM persons WHERE id = ?", (person_dict["id"],)).fetchone() is None:
+                raise KeyError(f"Person mit ID {person_dict['id']} nicht gefunden.")
+            self._upsert(conn, person_dict)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_person(self, person_dict):
+        """Legt eine neue Person in einer einzigen Transaktion an"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM persons WHERE id = ?", (person_dict["id"],)).fetchone() is not None:
+                raise ValueError(f"ID {person_dict['id']} existiert bereits.")
+            self._upsert(conn, person_dict)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def import_persons(self, persons):
+        """Übernimmt eine komplette Personenliste (z. B. aus der JSON-Datei) in einer Transaktion"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for person_dict in persons:
+                self._upsert(conn, person_dict)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def import_json_to_sqlite(json_path=PERSON_DB_PATH, sqlite_path="data/person_db.sqlite"):
+    """
+    Importiert die bestehende JSON-Datenbank einmalig in eine SQLite-Datenbank.
+    Bereits vorhandene Personen (gleiche ID) werden überschrieben.
+    Rückgabe: SQLitePersonStorage für die befüllte Datenbank.
+    """
+    with open(json_path) as file:
+        persons = json.load(file)
+    storage = SQLitePersonStorage(sqlite_path)
+    storage.import_persons(persons)
+    return storage
+
+
+def open_storage(path=None):
+    """Öffnet das passende Backend für den Pfad (Standard: Umgebungsvariable CTG_PERSON_DB oder JSON)"""
+    path = path or os.environ.get("CTG_PERSON_DB", PERSON_DB_PATH)
+    if path.endswith(SQLITE_SUFFIXES):
+        return SQLitePersonStorage(path)
+    return PersonRepository(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else PERSON_DB_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else "data/person_db.sqlite"
+    storage = import_json_to_sqlite(source, target)
+    print(f"{len(storage.names())} Personen nach {target} importiert.")
@@ -3,6 +3,13 @@ import numpy as np
 import plotly.io as pio
 import plotly.graph_objects as go
 from plotly.colors import qualitative
+from ctg_cache import recording_key
+from ctg_quality import load_clean_frame_with_seconds, load_quality_report
+from ctg_downsample import get_pyramid
+from ctg_summary import load_hr_summary
+from ctg_interpretation import interpret_recording, epoch_means
+from ctg_correlation import contraction_lags
+from ctg_twins import analyze_channels
 pio.renderers.default = "browser"  # Plotly in Browser anzeigen
 
 ## zuvor pdm plotly
@@ -10,6 +17,40 @@ pio.renderers.default = "browser"  # Plotly in Browser anzeigen
 import plotly.express as px
 
 
+def select_lb_column(columns, fetus=None):
+    """
+    Ermittelt die passende LB-Spalte aus einer Spaltenliste basierend auf dem Fötus.
+    Args:
+        columns: Spaltennamen der Aufzeichnung.
+        fetus (str or object): Optionaler Fötus-Name (z.B. "Fötus 2") oder Fetus-Objekt.
+    Raises:
+        ValueError: Wenn keine passende LB-Spalte vorhanden ist.
+    """
+    if fetus is None:
+        # Kein Fötus angegeben – versuche LB, LB1, LB2 der Reihe nach
+        for col in ['LB', 'LB1', 'LB2']:
+            if col in columns:
+                return col
+        raise ValueError("Keine LB-Spalte im DataFrame gefunden.")
+
+    # 🧠 Fötusname auswerten (z.B. "Fötus 2")
+    try:
+        if isinstance(fetus, str) and "Fötus" in fetus:
+            fetus_index = int(fetus.strip().split()[-1])  # → 1 oder 2
+        else:
+            fetus_index = int(fetus.name.strip().split()[-1])
+    except Exception:
+        fetus_index = 1
+
+    # 🧬 Entsprechende Spalte wählen
+    possible_cols = [f'LB{fetus_index}', 'LB']
+    for col in possible_cols:
+        if col in columns:
+            return col
+
+    raise ValueError(f"Keine passende LB-Spalte für Fötus {fetus_index} gefunden.")
+
+
 class CTG_Data:
     """
     Eine Klasse zur Analyse und Visualisierung von CTG-Daten (Cardiotokographie).
@@ -26,32 +67,55 @@ class CTG_Data:
         """
         self.filepath = filepath
         self.df = None
+        self.seconds = None  # Zeitindex in Sekunden (sortiert) für Zeitfenster-Abfragen
         self.fetus = fetus  
     def read_csv(self):
-        """Liest die CTG-Daten aus der CSV-Datei ein und konvertiert den Zeitindex in Timedelta """
-    
-        self.df = pd.read_csv(
-            self.filepath, 
-            index_col='time', 
-            parse_dates=False)
-        self.df.index = pd.to_timedelta(self.df.index, unit='s')  
+        """Liest die bereinigten CTG-Daten über den Spalten-Cache ein (Zeitindex als Timedelta).
+        Nur beim ersten Laden einer Aufzeichnung wird die CSV-Datei wirklich geparst und
+        bereinigt (Artefakte maskiert, kurze Lücken interpoliert, siehe ctg_quality)."""
+        self.df, self.seconds = load_clean_frame_with_seconds(self.filepath)
         return self.df
 
+    def window_bounds(self, start_s, end_s):
+        """Gibt die Zeilenpositionen (i, j) des Zeitfensters [start_s, end_s] per Binärsuche zurück"""
+        if self.df is None:
+            self.read_csv()
+        i = int(np.searchsorted(self.seconds, start_s, side='left'))
+        j = int(np.searchsorted(self.seconds, end_s, side='right'))
+        return i, j
+
+    def window(self, start_s, end_s):
+        """
+        Gibt die Samples im Zeitfenster [start_s, end_s] (Sekunden, inklusive) zurück.
+        Die Suche erfolgt in O(log n) über den sortierten Sekunden-Index; das
+        Ergebnis ist eine Sicht (iloc-Slice) auf die Daten, es wird nichts kopiert.
+        """
+        i, j = self.window_bounds(start_s, end_s)
+        return self.df.iloc[i:j]
+
+
+    def lod_series(self, column, start_s=None, end_s=None, max_points=2400):
+        """
+        Gibt (Zeit in s, Werte) einer Spalte im Bereich [start_s, end_s] mit höchstens
+        max_points Punkten zurück. Min/Max pro Bucket bleiben erhalten; die Detailstufen
+        werden pro Aufzeichnung einmal aufgebaut und gecacht (siehe ctg_downsample).
+        """
+        if self.df is None:
+            self.read_csv()
+        pyramid = get_pyramid(recording_key(self.filepath), column, self.seconds, self.df[column].to_numpy())
+        start_s = self.seconds[0] if start_s is None else start_s
+        end_s = self.seconds[-1] if end_s is None else end_s
+        return pyramid.query(start_s, end_s, max_points)
 
-    def plotly_figure(self, time_range=None, show_rangeslider=True):
-        """ Erstellt eine interaktive Plotly-Grafik mit Herzfrequenz (LB) und Wehentätigkeit (UC)"""
+    def plotly_figure(self, time_range=None, show_rangeslider=True, width_px=1200):
+        """ Erstellt eine interaktive Plotly-Grafik mit Herzfrequenz (LB) und Wehentätigkeit (UC).
+        Pro Kurve werden höchstens ca. 2 Punkte je Pixel (width_px) übertragen."""
         if self.df is None:
             raise ValueError("CSV wurde noch nicht eingelesen. Bitte zuerst read_csv() aufrufen.")
 
-    # Optional Zeitbereich beschränken (z. B. fürs PDF)
-        df_plot = self.df.copy()
-        if time_range:
-            start_sec, end_sec = time_range
-            df_plot = df_plot[(df_plot.index.total_seconds() >= start_sec) &
-                              (df_plot.index.total_seconds() <= end_sec)]
-
-    # X-Achse (Zeit in Sekunden)
-        x = df_plot.index.total_seconds()
+    # Optional Zeitbereich beschränken (z. B. fürs PDF) – per Binärsuche, ohne Kopie
+        start_sec, end_sec = time_range if time_range else (None, None)
+        max_points = 2 * width_px
 
         fig = go.Figure()
 
@@ -61,10 +125,12 @@ class CTG_Data:
         except ValueError as e:
             lb_col = None  # Falls kein LB gefunden wurde
 
-        if lb_col and lb_col in df_plot.columns:
+        x = np.empty(0)
+        if lb_col and lb_col in self.df.columns:
+            x, y = self.lod_series(lb_col, start_sec, end_sec, max_points)
             fig.add_trace(go.Scattergl(
                 x=x,
-                y=df_plot[lb_col],
+                y=y,
                 mode='lines',
                 name=lb_col,
                 line=dict(width=2, color="blue"),
@@ -72,10 +138,15 @@ class CTG_Data:
             ))
 
     # UC-Kurve ebenfalls zeichnen
-        if 'UC' in df_plot.columns:
+        uc_max = None
+        if 'UC' in self.df.columns:
+            x_uc, y_uc = self.lod_series('UC', start_sec, end_sec, max_points)
+            uc_max = np.nanmax(y_uc) if len(y_uc) else 0  # Min/Max bleiben beim Reduzieren erhalten
+            if len(x) == 0:
+                x = x_uc
             fig.add_trace(go.Scattergl(
-                x=x,
-                y=df_plot['UC'],
+                x=x_uc,
+                y=y_uc,
                 mode='lines',
                 name='UC',
                 line=dict(width=1, dash='dot'),
@@ -86,7 +157,8 @@ class CTG_Data:
 
     # X-Achsen-Ticks berechnen
         maxs = int(x.max()) if len(x) > 0 else 300
-        ticks = list(range(0, maxs + 1, 10))
+        tick_step = 10 if maxs <= 1200 else 60  # bei langen Aufzeichnungen nicht tausende Ticks senden
+        ticks = list(range(0, maxs + 1, tick_step))
 
         fig.update_layout(
             template='simple_white',
@@ -102,7 +174,7 @@ class CTG_Data:
                 showgrid=True,
                 gridcolor='lightgrey',
                 ticks='outside',
-                range=[0, min(300, ticks[-1])],
+                range=[start_sec, end_sec] if time_range else [0, min(300, ticks[-1])],
                 rangeslider=dict(visible=show_rangeslider),
                 type='linear'
             ),
@@ -118,8 +190,8 @@ class CTG_Data:
                 overlaying='y',
                 side='right',
                 showgrid=False,
-                range=[-5, df_plot['UC'].max() * 1.1 if 'UC' in df_plot.columns else 50],
-                dtick=(df_plot['UC'].max() / 5) if 'UC' in df_plot.columns else 10
+                range=[-5, uc_max * 1.1 if uc_max is not None else 50],
+                dtick=(uc_max / 5) if uc_max is not None else 10
             )
         )
 
@@ -132,46 +204,57 @@ class CTG_Data:
         # Wenn das DataFrame noch nicht geladen wurde, lade es jetzt:
         if self.df is None:
             self.read_csv()
-       
-        if self.fetus is None:
-        # Kein Fötus angegeben – versuche LB, LB1, LB2 der Reihe nach
-            for col in ['LB', 'LB1', 'LB2']:
-                if col in self.df.columns:
-                    return col
-            raise ValueError("Keine LB-Spalte im DataFrame gefunden.")
+        return select_lb_column(self.df.columns, self.fetus)
 
-    # 🧠 Fötusname auswerten (z.B. "Fötus 2")
-        try:
-            if isinstance(self.fetus, str) and "Fötus" in self.fetus:
-                fetus_index = int(self.fetus.strip().split()[-1])  # → 1 oder 2
-            else:
-                fetus_index = int(self.fetus.name.strip().split()[-1])
-        except Exception:
-            fetus_index = 1
+    def iter_chunks(self, chunk_seconds=600):
+        """Liest die Aufzeichnung blockweise in festen Zeitabschnitten (siehe ctg_stream.iter_ctg_chunks)"""
+        from ctg_stream import iter_ctg_chunks
+        return iter_ctg_chunks(self.filepath, chunk_seconds=chunk_seconds)
 
-    # 🧬 Entsprechende Spalte wählen
-        possible_cols = [f'LB{fetus_index}', 'LB']
-        for col in possible_cols:
-            if col in self.df.columns:
-                return col
 
-        raise ValueError(f"Keine passende LB-Spalte für Fötus {fetus_index} gefunden.")
+    def hr_summary(self):
+        """Gibt die vorberechneten HF-Kennzahlen (mean, min, max, std, Perzentile, Signalverlust)
+        der zum Fötus passenden LB-Spalte zurück (siehe ctg_summary)"""
+        lb_col = self.get_lb_column()
+        return load_hr_summary(self.filepath, self.df)[lb_col]
+
+    def quality_report(self):
+        """Gibt den Qualitätsbericht der Bereinigung zurück (Zähler und SQI je Spalte und Zeitfenster)"""
+        return load_quality_report(self.filepath)
+
+    def interpretation(self):
+        """Gibt Baseline, Variabilität sowie Akzelerationen/Dezelerationen der zum Fötus
+        passenden LB-Spalte als FHRInterpretation zurück (siehe ctg_interpretation)"""
+        return interpret_recording(self)[self.get_lb_column()]
+
+    def channel_analysis(self):
+        """Wertet alle LB-Kanäle (z. B. beide Zwillinge) gemeinsam aus, inkl. Erkennung von
+        Kanälen, die dasselbe Signal zu zeigen scheinen (siehe ctg_twins)"""
+        if self.df is None:
+            self.read_csv()
+        return analyze_channels(self)
 
+    def contraction_lags(self, df_peaks):
+        """Verzögerung und Stärke des FHR-Abfalls je erkannter Wehe (df_peaks aus
+        WehenAnalysis.detect_contractions) für die zum Fötus passende LB-Spalte (siehe ctg_correlation)"""
+        lb_col = self.get_lb_column()
+        fhr = self.df[lb_col].to_numpy()
+        _, _, idx = epoch_means(self.seconds, fhr)  # Baseline je Sample aus der gecachten Interpretation
+        return contraction_lags(self.seconds, self.df["UC"].to_numpy(), fhr,
+                                df_peaks["Wehenzeitpunkt (min)"].to_numpy() * 60,
+                                baseline=self.interpretation().baseline[idx])
 
     def average_HR_baby(self):
         """Berechnet die durchschnittliche Herzfrequenz des Babys basierend auf der LB-Spalte."""
-        lb_col = self.get_lb_column()
-        return self.df[lb_col].mean()
+        return self.hr_summary()["mean"]
 
     def max_HR_baby(self):
         """Berechnet die maximale Herzfrequenz des Babys basierend auf der LB-Spalte."""
-        lb_col = self.get_lb_column()
-        return self.df[lb_col].max()
+        return self.hr_summary()["max"]
 
     def min_HR_baby(self):
         """Berechnet die minimale Herzfrequenz des Babys basierend auf der LB-Spalte."""
-        lb_col = self.get_lb_column()
-        return self.df[lb_col].min()
+        return self.hr_summary()["min"]
     
     
 # Beispiel-Verwendung
@@ -0,0 +1,133 @@
+"""
+report_batch.py
+
+Stapelweise Erstellung von PDF-Berichten (z. B. zum Schichtende für eine ganze Station).
+Für jede Person, jeden CTG-Test und jeden Fötus wird ein Bericht erzeugt. Die Berichte
+werden auf einen Prozess-Pool verteilt; jeder Worker liefert das fertige PDF als Bytes
+zurück. Ausgabe als einzelne PDF-Dateien oder als ein ZIP-Bündel.
+
+Aufruf:
+    python report_batch.py --out berichte/
+    python report_batch.py --zip berichte.zip --workers 4
+"""
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use("Agg")  # Worker-Prozesse zeichnen ohne Fenster
+
+from Person import Person
+from read_CSV import CTG_Data
+from report_generator import generate_pdf
+
+
+def collect_jobs(persons):
+    """
+    Erstellt die Liste aller Berichte: je Person, CTG-Test und Fötus ein Auftrag.
+    Args:
+        persons: Liste von Personendaten (Dictionaries wie in person_db.json).
+    Rückgabe: Liste von Dictionaries {person, ctg_index, fetus_name}.
+    """
+    jobs = []
+    for person_data in persons:
+        fetus_names = [f"Fötus {i}" for i in range(1, person_data.get("fetuses", 0) + 1)] or [None]
+        for ctg_index in range(len(person_data.get("CTG_tests", []))):
+            for fetus_name in fetus_names:
+                jobs.append({"person": person_data, "ctg_index": ctg_index, "fetus_name": fetus_name})
+    return jobs
+
+
+def report_filename(job):
+    """Eindeutiger Dateiname eines Berichts (Name, Personen-ID, CTG-Index, Fötus)"""
+    person = job["person"]
+    parts = [person["lastname"], person["firstname"], str(person["id"]), f"CTG{job['ctg_index'] + 1}"]
+    if job["fetus_name"]:
+        parts.append(job["fetus_name"])
+    return re.sub(r"[^\w.-]+", "_", "_".join(parts)) + ".pdf"
+
+
+def render_report(job, options=None):
+    """
+    Erstellt einen Bericht (läuft im Worker-Prozess).
+    Ohne time_range in options wird die gesamte Aufzeichnung ausgewertet.
+    Rückgabe: (Dateiname, PDF-Bytes, Dauer in Sekunden)
+    """
+    start = time.perf_counter()
+    options = dict(options or {})
+    person = Person(job["person"])
+    if options.get("time_range") is None and person.CTG_tests:
+        ctg = CTG_Data(person.CTG_tests[job["ctg_index"]]["result_link"])
+        ctg.read_csv()
+        options["time_range"] = (0, int(ctg.seconds[-1]) if len(ctg.seconds) else 0)
+    pdf = generate_pdf(person, fetus_name=job["fetus_name"], ctg_index=job["ctg_index"], **options)
+    data = pdf.output(dest="S").encode("latin-1")
+    return report_filename(job), data, time.perf_counter() - start
+
+
+def generate_batch(persons, out_dir=None, zip_path=None, workers=None, options=None, progress=None):
+    """
+    Erstellt alle Berichte parallel und schreibt sie als PDF-Dateien oder ZIP-Bündel.
+    Args:
+        persons: Liste von Personendaten.
+        out_dir (str, optional): Zielordner für einzelne PDF-Dateien.
+        zip_path (str, optional): Zielpfad des ZIP-Bündels (statt einzelner Dateien).
+        workers (int, optional): Anzahl Worker-Prozesse (Standard: Anzahl CPUs).
+        options (dict, optional): Weitere Parameter für generate_pdf.
+        progress: Optionaler Callback progress(Dateiname, Dauer in s) je fertigem Bericht.
+    Rückgabe: Liste von Dictionaries {file, seconds, bytes}, sortiert nach Dateiname.
+    Raises:
+        ValueError: Wenn weder out_dir noch zip_path angegeben ist.
+    """
+    if not out_dir and not zip_path:
+        raise ValueError("out_dir oder zip_path muss angegeben werden.")
+    jobs = collect_jobs(persons)
+    results = []
+    bundle = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) if zip_path else None
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_report, job, options) for job in jobs]
+            for future in as_completed(futures):
+                filename, data, seconds = future.result()
+                if bundle is not None:
+                    bundle.writestr(filename, data)
+                else:
+                    with open(os.path.join(out_dir, filename), "wb") as f:
+                        f.write(data)
+                results.append({"file": filename, "seconds": seconds, "bytes": len(data)})
+                if progress is not None:
+                    progress(filename, seconds)
+    finally:
+        if bundle is not None:
+            bundle.close()
+    return sorted(results, key=lambda r: r["file"])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PDF-Berichte für alle Personen und CTG-Tests erstellen")
+    parser.add_argument("--out", help="Zielordner für einzelne PDF-Dateien")
+    parser.add_argument("--zip", help="Zielpfad eines ZIP-Bündels")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Worker-Prozesse")
+    parser.add_argument("--strips", action="store_true", help="Gesamte Aufzeichnung als CTG-Streifen anhängen")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = generate_batch(
+        Person.load_person_data(), out_dir=args.out, zip_path=args.zip, workers=args.workers,
+        options={"include_strips": args.strips},
+        progress=lambda name, seconds: print(f"{name}: {seconds:.2f} s"),
+    )
+    elapsed = time.perf_counter() - t0
+    total = sum(r["seconds"] for r in results)
+    if results:
+        print(f"{len(results)} Berichte in {elapsed:.2f} s "
+              f"({elapsed / len(results):.2f} s pro Bericht, Summe Einzelzeiten {total:.2f} s)")
+    else:
+        print("Keine Berichte erstellt (keine CTG-Tests vorhanden).")
@@ -12,9 +12,66 @@ import pandas as pd
 import os
 import tempfile
 import matplotlib.pyplot as plt
+import numpy as np
 import io
+from PIL import Image
+from ctg_figure_cache import get_or_render
+from ctg_downsample import minmax_downsample
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+
+STRIP_SPEED_CM_MIN = 1  # Papiervorschub des Streifen-Exports (1 cm/min wie Standard-CTG-Papier)
+
+
+def polyline_ops(xs, ys, k, page_h):
+    """
+    Erzeugt die PDF-Pfadoperatoren einer Polylinie (Koordinaten in mm), ohne ein Dokument zu benötigen.
+    NaN-Werte unterbrechen die Linie (z. B. bei Signalverlust).
+    Args:
+        k (float): Skalierung mm -> pt des Dokuments (FPDF.k).
+        page_h (float): Seitenhöhe in mm (FPDF.h).
+    Rückgabe: Operatoren als String (leer, wenn nichts zu zeichnen ist).
+    """
+    xs = np.asarray(xs, dtype=np.float64) * k
+    ys = (page_h - np.asarray(ys, dtype=np.float64)) * k
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    # Zusammenhängende gültige Abschnitte über die Flanken der Maske finden
+    edges = np.diff(np.concatenate([[0], valid.astype(np.int8), [0]]))
+    paths = []
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        if end - start < 2:
+            continue
+        # Ein Formatierungsaufruf je Abschnitt statt eines f-Strings je Punkt
+        points = np.column_stack([xs[start:end], ys[start:end]]).ravel().tolist()
+        paths.append(("%.2f %.2f m " + "%.2f %.2f l " * (end - start - 1)) % tuple(points) + "S")
+    return "\n".join(paths)
+
 
 class PDF(FPDF):
+    def image_from_bytes(self, data, x=None, y=None, w=0, h=0, type='PNG'):
+        """
+        Bettet ein Bild aus dem Speicher ein.
+        FPDF 1.7 liest Bilder nur aus Dateien, verarbeitet sie aber sofort beim Aufruf von
+        image(); die temporäre Datei wird deshalb direkt danach wieder gelöscht.
+        """
+        fd, path = tempfile.mkstemp(suffix='.' + type.lower())
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self.image(path, x=x, y=y, w=w, h=h, type=type)
+        finally:
+            os.remove(path)
+
+    def path_ops(self, ops, dy=0.0):
+        """
+        Hängt vorab erzeugte Grafikoperatoren (siehe ctg_paths) an die aktuelle Seite an.
+        Die Operatoren laufen in einem eigenen Grafikzustand (q/Q); Farben und Linienstärken
+        von FPDF bleiben dadurch gültig.
+        dy: Verschiebung nach unten in mm, falls die Operatoren für eine andere y-Position erzeugt wurden.
+        """
+        if ops:
+            self._out(f"q 1 0 0 1 0 {-dy * self.k:.2f} cm\n{ops}\nQ")
+
     def header(self):
         self.set_font("Arial", style="B", size=14)
         self.cell(0, 10, "CTG Bericht", ln=True, align='C')
@@ -27,34 +84,279 @@ class PDF(FPDF):
         self.cell(0, 10, f"Seite {self.page_no()}", align='C')
 
 
-def plot_ctg_with_matplotlib(df, lb_col, start_s, end_s, width=700, height=300):
+def plot_ctg_with_matplotlib(df, lb_col, start_s, end_s, width=700, height=300, seconds=None):
     """
     Zeichnet CTG-Verlauf aus DataFrame. Nutzt gezielt die Spalte lb_col für FHR und optional 'UC'.
+    Gezeichnet werden nur die Samples im Zeitfenster [start_s, end_s]; die Kosten hängen
+    damit von der Fensterlänge ab, nicht von der Länge der Aufzeichnung.
+    seconds: optional bereits vorhandene Zeitpunkte des Index in Sekunden (z. B. CTG_Data.seconds)
     """
-    # Zeit in Sekunden als eigene Spalte
-    plot_df = df.copy().reset_index()
-    plot_df['time'] = plot_df['time'].dt.total_seconds()
+    # Zeitfenster per Binärsuche auf dem sortierten Zeitindex ausschneiden (Sicht, keine Kopie)
+    if seconds is None:
+        seconds = df.index.total_seconds().to_numpy()
+    i = np.searchsorted(seconds, start_s, side='left')
+    j = np.searchsorted(seconds, end_s, side='right')
+    time_s = seconds[i:j]
 
     fig, ax = plt.subplots(figsize=(width/100, height/100))
     # FHR-Daten: nur die gewählte Spalte
-    ax.plot(plot_df['time'], plot_df[lb_col], label=lb_col)
+    ax.plot(time_s, df[lb_col].to_numpy()[i:j], label=lb_col)
     ax.set_xlim(start_s, end_s)
     ax.set_xlabel("Zeit (s)")
     ax.set_ylabel("Herzfrequenz (bpm)")
     ax.legend(loc='upper right')
     # UC (Wehen)
-    if 'UC' in plot_df.columns:
+    if 'UC' in df.columns:
+        uc = df['UC'].to_numpy()[i:j]
         ax2 = ax.twinx()
-        ax2.plot(plot_df['time'], plot_df['UC'], color='gray', alpha=0.5, label='UC')
+        ax2.plot(time_s, uc, color='gray', alpha=0.5, label='UC')
         ax2.set_ylabel("UC")
-        ax2.set_ylim(plot_df['UC'].min(), plot_df['UC'].max())
+        if len(uc) and not np.isnan(uc).all():
+            ax2.set_ylim(np.nanmin(uc), np.nanmax(uc))
+    rgba = io.BytesIO()
+    fig.savefig(rgba, format="png", bbox_inches='tight')
+    plt.close(fig)
+    # Ohne Alphakanal speichern: FPDF trennt Transparenz sonst Pixel für Pixel in Python ab
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches='tight')
+    Image.open(rgba).convert("RGB").save(buf, format="PNG")
     buf.seek(0)
-    plt.close(fig)
     return buf
 
 
+def render_ctg_png(ctg, lb_col, start_s, end_s, width=700, height=300):
+    """
+    Gibt das CTG-Diagramm als PNG-Bytes zurück. Bereits gerenderte Diagramme derselben
+    Aufzeichnung, Spalte, Zeitfenster und Größe kommen aus dem Figuren-Cache.
+    """
+    return get_or_render(
+        ctg.filepath, lb_col, start_s, end_s, width, height,
+        lambda: plot_ctg_with_matplotlib(ctg.df, lb_col, start_s, end_s, width, height,
+                                         seconds=ctg.seconds).getvalue(),
+    )
+
+
+def _panel_scale(x, y, w, h, start_s, end_s, v_min, v_max):
+    """Umrechnungsfunktionen (to_x, to_y) von Sekunden bzw. Werten in mm für ein Panel"""
+    def to_x(t):
+        return x + (t - start_s) / (end_s - start_s) * w
+
+    def to_y(v):
+        return y + h - (v - v_min) / (v_max - v_min) * h
+
+    return to_x, to_y
+
+
+GRID_MAJOR = ((235, 170, 170), 0.25)  # Farbe und Linienstärke (mm) der Hauptlinien
+GRID_MINOR = ((250, 215, 215), 0.1)
+GRID_BAND_COLOR = (235, 245, 235)
+GRID_FRAME = ((120, 120, 120), 0.2)
+
+
+def _stroke_op(style, k):
+    """Operatoren für Linienfarbe und -stärke (wie set_draw_color und set_line_width)"""
+    (r, g, b), width = style
+    return "%.3f %.3f %.3f RG %.2f w" % (r / 255, g / 255, b / 255, width * k)
+
+
+def grid_ops(x, y, w, h, start_s, end_s, v_min, v_max, minor, major, k, page_h, band=None):
+    """
+    Erzeugt die Grafikoperatoren eines CTG-Rasters (Zeitlinien, Wertlinien, Rahmen) ohne Beschriftung.
+    band: optionaler hinterlegter Wertebereich (von, bis), z. B. der FHR-Normbereich.
+    Rückgabe: Operatoren als String (Koordinaten in mm wie bei FPDF, k und page_h siehe polyline_ops).
+    """
+    to_x, to_y = _panel_scale(x, y, w, h, start_s, end_s, v_min, v_max)
+
+    def line(x1, y1, x2, y2):
+        return "%.2f %.2f m %.2f %.2f l S" % (x1 * k, (page_h - y1) * k, x2 * k, (page_h - y2) * k)
+
+    ops = []
+    if band is not None:
+        top, bottom = to_y(band[1]), to_y(band[0])
+        ops.append("%.3f %.3f %.3f rg" % tuple(c / 255 for c in GRID_BAND_COLOR))
+        ops.append("%.2f %.2f %.2f %.2f re f" % (x * k, (page_h - top) * k, w * k, -(bottom - top) * k))
+    # Waagrechte Linien (bpm bzw. UC)
+    for v in np.arange(v_min, v_max + minor / 2, minor):
+        ops.append(_stroke_op(GRID_MAJOR if v % major == 0 else GRID_MINOR, k))
+        ops.append(line(x, to_y(v), x + w, to_y(v)))
+    # Senkrechte Linien: jede Minute, kräftiger alle 10 Minuten (bei kurzen Fenstern alle 10 s)
+    step = 10 if end_s - start_s <= 300 else 60
+    for t in np.arange(np.ceil(start_s / step) * step, end_s + step / 2, step):
+        ops.append(_stroke_op(GRID_MAJOR if t % (60 if step == 10 else 600) == 0 else GRID_MINOR, k))
+        ops.append(line(to_x(t), y, to_x(t), y + h))
+    ops.append(_stroke_op(GRID_FRAME, k))
+    ops.append("%.2f %.2f %.2f %.2f re S" % (x * k, (page_h - y) * k, w * k, -h * k))
+    return "\n".join(ops)
+
+
+def _grid_labels(pdf, x, y, h, v_min, v_max, minor, major):
+    """Beschriftet die waagrechten Hauptlinien eines Rasters (Text braucht die Schriften des Dokuments)"""
+    _, to_y = _panel_scale(x, y, 1, h, 0, 1, v_min, v_max)
+    pdf.set_font("Arial", size=6)
+    pdf.set_text_color(110)
+    for v in np.arange(v_min, v_max + minor / 2, minor):
+        if v % major == 0:
+            pdf.text(x - 6, to_y(v) + 1, f"{v:g}")
+
+
+def decimate_window(seconds, fhr, uc, start_s, end_s, n_buckets, clip_fhr=(50, 210), clip_uc=(0, 100)):
+    """
+    Schneidet das Zeitfenster aus und reduziert FHR und UC per Min/Max-Downsampling.
+    Rückgabe: ((x_fhr, y_fhr), (x_uc, y_uc) oder None)
+    """
+    i = np.searchsorted(seconds, start_s, side='left')
+    j = np.searchsorted(seconds, end_s, side='right')
+    fhr_xy = minmax_downsample(seconds[i:j], np.clip(fhr[i:j], *clip_fhr), n_buckets)
+    uc_xy = minmax_downsample(seconds[i:j], np.clip(uc[i:j], *clip_uc), n_buckets) if uc is not None else None
+    return fhr_xy, uc_xy
+
+
+# Panels: (Wertebereich, Rasterabstände klein/groß, Kurvenfarbe und -stärke)
+FHR_PANEL = ((50, 210), (10, 30), ((20, 60, 160), 0.3))
+UC_PANEL = ((0, 100), (10, 50), ((90, 90, 90), 0.3))
+FHR_BAND = (110, 160)  # Normbereich, im FHR-Panel hinterlegt
+UC_GAP = 4  # Abstand zwischen FHR- und UC-Panel in mm
+
+
+def _panel_ops(xy, panel, x, y, w, h, start_s, end_s, k, page_h, band=None):
+    """Raster und Kurve eines Panels als Grafikoperatoren"""
+    (v_min, v_max), (minor, major), style = panel
+    to_x, to_y = _panel_scale(x, y, w, h, start_s, end_s, v_min, v_max)
+    return "\n".join([
+        grid_ops(x, y, w, h, start_s, end_s, v_min, v_max, minor, major, k, page_h, band=band),
+        _stroke_op(style, k),
+        polyline_ops(to_x(xy[0]), to_y(xy[1]), k, page_h),
+    ])
+
+
+def ctg_paths(seconds, fhr, uc, start_s, end_s, k, page_h, x=10, y=0.0, w=190, fhr_h=80, uc_h=40):
+    """
+    Reduziert ein Zeitfenster und erzeugt Raster und Kurven von FHR- und UC-Panel als
+    Grafikoperatoren für das Layout von draw_ctg_vector. Benötigt kein Dokument und kann daher
+    in Worker-Threads laufen; das Ergebnis wird mit PDF.path_ops an eine beliebige y-Position gesetzt.
+    Rückgabe: (FHR-Operatoren, UC-Operatoren oder None)
+    """
+    end_s = max(end_s, start_s + 1)
+    fhr_xy, uc_xy = decimate_window(seconds, fhr, uc, start_s, end_s, int(w * 2))
+    fhr_ops = _panel_ops(fhr_xy, FHR_PANEL, x, y, w, fhr_h, start_s, end_s, k, page_h, band=FHR_BAND)
+    uc_ops = None
+    if uc_xy is not None:
+        uc_ops = _panel_ops(uc_xy, UC_PANEL, x, y + fhr_h + UC_GAP, w, uc_h, start_s, end_s, k, page_h)
+    return fhr_ops, uc_ops
+
+
+def draw_ctg_vector(pdf, seconds, fhr, uc, start_s, end_s, x=10, y=None, w=190, fhr_h=80, uc_h=40,
+                    fhr_label="FHR", paths=None):
+    """
+    Zeichnet FHR- und UC-Verlauf direkt mit FPDF-Linien (Vektorgrafik) inklusive CTG-Raster.
+    Nur die Samples im Zeitfenster werden verwendet und per Min/Max-Downsampling auf
+    etwa vier Punkte pro Millimeter reduziert; Größe und Zeichenzeit hängen damit nicht
+    von der Länge der Aufzeichnung ab.
+    Args:
+        pdf (PDF): Ziel-Dokument.
+        seconds (np.ndarray): Aufsteigende Zeitpunkte in Sekunden.
+        fhr (np.ndarray): Fetale Herzfrequenz.
+        uc (np.ndarray, optional): Wehentätigkeit (None: kein UC-Panel).
+        start_s, end_s (float): Zeitfenster in Sekunden.
+        x, y, w (float): Position und Breite in mm (y=None: aktuelle Position).
+        fhr_h, uc_h (float): Höhe des FHR- bzw. UC-Panels in mm.
+        paths: optional bereits erzeugte Panels (siehe ctg_paths mit y=0); seconds, fhr und uc
+               werden dann nur noch für die Existenz des UC-Panels betrachtet.
+    Rückgabe: y-Position unterhalb der Grafik (mm).
+    """
+    y = pdf.get_y() if y is None else y
+    end_s = max(end_s, start_s + 1)
+    if paths is None:
+        paths, dy = ctg_paths(seconds, fhr, uc, start_s, end_s, pdf.k, pdf.h, x, y, w, fhr_h, uc_h), 0.0
+    else:
+        dy = y
+    fhr_ops, uc_ops = paths
+
+    # FHR-Panel: 50-210 bpm, Normbereich 110-160 bpm hinterlegt
+    pdf.path_ops(fhr_ops, dy)
+    _grid_labels(pdf, x, y, fhr_h, *FHR_PANEL[0], *FHR_PANEL[1])
+    pdf.set_font("Arial", size=7)
+    pdf.set_text_color(0)
+    pdf.text(x + 1, y + 3, f"{fhr_label} (bpm)")
+    bottom = y + fhr_h
+
+    # UC-Panel: 0-100
+    if uc is not None:
+        uc_y = bottom + UC_GAP
+        pdf.path_ops(uc_ops, dy)
+        _grid_labels(pdf, x, uc_y, uc_h, *UC_PANEL[0], *UC_PANEL[1])
+        pdf.set_font("Arial", size=7)
+        pdf.set_text_color(0)
+        pdf.text(x + 1, uc_y + 3, "UC")
+        bottom = uc_y + uc_h
+
+    # Zeitachse in Minuten
+    to_x, _ = _panel_scale(x, y, w, fhr_h, start_s, end_s, *FHR_PANEL[0])
+    pdf.set_font("Arial", size=6)
+    pdf.set_text_color(110)
+    label_step = 60 if end_s - start_s <= 1800 else 300
+    for t in np.arange(np.ceil(start_s / label_step) * label_step, end_s + 1, label_step):
+        pdf.text(to_x(t) - 2, bottom + 3, f"{t / 60:g} min")
+
+    pdf.set_draw_color(0)
+    pdf.set_text_color(0)
+    pdf.set_line_width(0.2)
+    pdf.set_y(bottom + 6)
+    return bottom + 6
+
+
+def strip_seconds(width_mm=190, speed_cm_min=STRIP_SPEED_CM_MIN):
+    """Zeitspanne (s) eines Streifens bei gegebener Breite und Papiervorschub (cm/min)"""
+    return width_mm / 10 / speed_cm_min * 60
+
+
+def iter_strip_paths(seconds, fhr, uc, page_seconds, k, page_h, workers=4, **layout):
+    """
+    Zerlegt die Aufzeichnung in Streifen fester Länge und erzeugt deren Raster und Kurven
+    (ctg_paths mit y=0) in einem Thread-Pool. Es werden höchstens 2 * workers Streifen im Voraus
+    berechnet; der Speicherbedarf bleibt damit unabhängig von der Länge der Aufzeichnung begrenzt.
+    Rückgabe (Generator): (start_s, end_s, paths) in zeitlicher Reihenfolge.
+    """
+    t0 = float(seconds[0]) if len(seconds) else 0.0
+    t_end = float(seconds[-1]) if len(seconds) else 0.0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start_s in np.arange(t0, max(t_end, t0 + 1), page_seconds):
+            pending.append((start_s, pool.submit(
+                ctg_paths, seconds, fhr, uc, start_s, start_s + page_seconds, k, page_h, **layout)))
+            if len(pending) >= 2 * workers:
+                start, future = pending.popleft()
+                yield start, start + page_seconds, future.result()
+        while pending:
+            start, future = pending.popleft()
+            yield start, start + page_seconds, future.result()
+
+
+def add_ctg_strips(pdf, seconds, fhr, uc, fhr_label="FHR", speed_cm_min=STRIP_SPEED_CM_MIN,
+                   strips_per_page=2, workers=4):
+    """
+    Hängt die gesamte Aufzeichnung als mehrseitigen CTG-Streifen an (wie Papier-CTG).
+    Jeder Streifen deckt bei speed_cm_min Papiervorschub die volle Breite ab. Reduktion, Raster
+    und Kurven jedes Streifens entstehen als fertige Grafikoperatoren in Worker-Threads; der
+    aufrufende Thread setzt nur noch die Beschriftung (Text braucht die Schriften des Dokuments)
+    und hängt die Operatoren in Reihenfolge an. Der erste Streifen beginnt an der aktuellen
+    Position (Aufrufer beginnt eine neue Seite).
+    Rückgabe: Anzahl gezeichneter Streifen.
+    """
+    layout = dict(w=190, fhr_h=60, uc_h=30)
+    page_seconds = strip_seconds(layout["w"], speed_cm_min)
+    count = 0
+    for start_s, end_s, paths in iter_strip_paths(seconds, fhr, uc, page_seconds, pdf.k, pdf.h, workers, **layout):
+        if count and count % strips_per_page == 0:
+            pdf.add_page()
+        pdf.set_font("Arial", size=9)
+        pdf.cell(0, 6, f"Streifen {count + 1}: {start_s / 60:.0f}-{end_s / 60:.0f} min "
+                       f"({speed_cm_min:g} cm/min)", ln=True)
+        draw_ctg_vector(pdf, seconds, fhr, uc, start_s, end_s, fhr_label=fhr_label, paths=paths, **layout)
+        pdf.ln(4)
+        count += 1
+    return count
+
+
 def generate_pdf(
     person,
     fetus_name=None,
@@ -67,8 +369,18 @@ def generate_pdf(
     include_wehen=True,
     wehen_height=5.0,
     wehen_distance=120,
-    ctg_index=0
+    ctg_index=0,
+    plot_mode="vector",
+    include_strips=False,
+    strip_speed_cm_min=STRIP_SPEED_CM_MIN
 ):
+    """
+    Erstellt den PDF-Bericht einer Person.
+    plot_mode: "vector" zeichnet das CTG direkt mit PDF-Linien (klein, schnell),
+               "raster" bettet ein matplotlib-PNG ein.
+    include_strips: hängt die gesamte Aufzeichnung als mehrseitigen CTG-Streifen an.
+    strip_speed_cm_min: Papiervorschub der Streifen in cm/min.
+    """
     pdf = PDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
@@ -116,11 +428,12 @@ def generate_pdf(
             ctg_data["result_link"],
             fetus=next((f for f in person.fetuses_list if f.name == fetus_name), None)
         )
-        df_ctg = ctg.read_csv()
+        ctg.read_csv()
 
-        avg = ctg.average_HR_baby()
-        max_hr = ctg.max_HR_baby()
-        min_hr = ctg.min_HR_baby()
+        hr_stats = ctg.hr_summary()
+        avg = hr_stats["mean"]
+        max_hr = hr_stats["max"]
+        min_hr = hr_stats["min"]
 
         section_heading("CTG-Auswertung")
         if fetus_name:
@@ -133,18 +446,26 @@ def generate_pdf(
             pdf.cell(0, 10, f"Minimale HF: {min_hr:.1f} bpm", ln=True)
             pdf.ln(3)
 
+        interp = ctg.interpretation()
+        pdf.cell(0, 10, f"Baseline: {interp.baseline_bpm:.0f} bpm", ln=True)
+        pdf.cell(0, 10, f"Variabilität: STV {interp.stv_ms:.1f} ms, LTV {interp.ltv_bpm:.1f} bpm", ln=True)
+        pdf.cell(0, 10, f"Akzelerationen: {len(interp.accelerations)}, Dezelerationen: {len(interp.decelerations)}",
+                 ln=True)
+        pdf.ln(3)
+
         if include_ctg_plot:
-            start_s, end_s = time_range or (0, 0)
+            # Ohne Zeitbereich wird die gesamte Aufzeichnung gezeichnet
+            start_s, end_s = time_range or (0, float(ctg.seconds[-1]) if len(ctg.seconds) else 0)
             # Bestimme die LB-Spalte für den ausgewählten Fötus
             lb_col = ctg.get_lb_column()
-            img_buf = plot_ctg_with_matplotlib(df_ctg, lb_col, start_s, end_s)
-            # Temporäre Datei für das PNG erstellen
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmpfile:
-                tmpfile.write(img_buf.getvalue())
-                tmpfile.flush()
-                pdf.add_page()
-                section_heading("CTG-Diagramm")
-                pdf.image(tmpfile.name, x=10, w=190)
+            pdf.add_page()
+            section_heading("CTG-Diagramm")
+            if plot_mode == "vector":
+                uc = ctg.df['UC'].to_numpy() if 'UC' in ctg.df.columns else None
+                draw_ctg_vector(pdf, ctg.seconds, ctg.df[lb_col].to_numpy(), uc, start_s, end_s,
+                                fhr_label=lb_col)
+            else:
+                pdf.image_from_bytes(render_ctg_png(ctg, lb_col, start_s, end_s), x=10, w=190)
 
         if include_wehen:
             section_heading("Wehenanalyse")
@@ -187,6 +508,16 @@ def generate_pdf(
                     pdf.cell(100, 8, str(row['Kategorie']), border=1)
                     pdf.cell(40, 8, str(row['Anzahl']), border=1)
                     pdf.ln()
+
+        if include_strips:
+            lb_col = ctg.get_lb_column()
+            pdf.add_page()
+            section_heading("CTG-Streifen (gesamte Aufzeichnung)")
+            pdf.cell(0, 8, f"Dauer: {ctg.seconds[-1] / 60:.1f} min, Papiervorschub {strip_speed_cm_min:g} cm/min",
+                     ln=True)
+            uc = ctg.df['UC'].to_numpy() if 'UC' in ctg.df.columns else None
+            add_ctg_strips(pdf, ctg.seconds, ctg.df[lb_col].to_numpy(), uc, fhr_label=lb_col,
+                           speed_cm_min=strip_speed_cm_min)
     elif include_ctg:
         section_heading("CTG-Auswertung")
         pdf.cell(0, 10, txt="Keine CTG-Daten verfügbar.", ln=True)
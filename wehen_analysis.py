@@ -1,7 +1,143 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 from scipy.signal import find_peaks, peak_widths
 
+from ctg_cache import recording_key
+
+
+# Kategorien: (interval_low, interval_high, dur_low, dur_high, label)
+WEHENART = [
+    (    0,   np.inf,     10,    30, "Braxton-Hicks-Wehen"),
+    (    0,   np.inf,      0,    10, "Senkwehen"),
+    (  600,  1200,    30,    45, "Vor-/Eröffnungswehen"),
+    (  180,   300,    45,    60, "Aktive Eröffnungswehen"),
+    (   60,   120,    60,    90, "Übergangswehen"),
+    (  120,   180,    60,    90, "Austreibungswehen"),
+]
+UNKLASSIFIZIERT = "Unklassifiziert"
+
+_WEHENART_BOUNDS = np.array([row[:4] for row in WEHENART], dtype=np.float64)
+_WEHENART_LABELS = [row[4] for row in WEHENART]
+
+
+def classify_wehenart(intervals, durations):
+    """
+    Ordnet Wehen vektorisiert einer Kategorie aus WEHENART zu.
+    Args:
+        intervals (np.ndarray): Abstand zur vorherigen Wehe (NaN bei der ersten Wehe).
+        durations (np.ndarray): Dauer der Wehen.
+    Rückgabe: np.ndarray mit der Wehenart je Wehe.
+    """
+    # Grenzen als Spaltenvektoren -> Vergleich ergibt Matrizen (Kategorien x Wehen)
+    low_i, high_i, low_d, high_d = (b[:, None] for b in _WEHENART_BOUNDS.T)
+    iv_ok = np.isnan(intervals) | ((intervals >= low_i) & (intervals < high_i))
+    du_ok = (durations >= low_d) & (durations < high_d)
+    # np.select nimmt je Wehe die erste zutreffende Kategorie
+    return np.select(list(iv_ok & du_ok), _WEHENART_LABELS, default=UNKLASSIFIZIERT)
+
+
+def select_by_peak_distance(peaks, priority, distance):
+    """
+    Wählt Peaks so aus, dass zwei Peaks mindestens 'distance' Samples auseinanderliegen.
+    Höhere Peaks (priority) haben Vorrang – identisch zum distance-Kriterium von scipy.find_peaks.
+    Args:
+        peaks (np.ndarray): Aufsteigend sortierte Sample-Indizes der Peaks.
+        priority (np.ndarray): Höhe der Peaks.
+        distance (float): Mindestabstand in Samples (>= 1).
+    Rückgabe: Boolesche Maske der beibehaltenen Peaks.
+    """
+    peaks = np.asarray(peaks)
+    if len(peaks) == 0:
+        return np.zeros(0, dtype=bool)
+    # Dünn besetztes Signal: nur die Kandidaten (auf doppelte Indizes gespreizt, damit keine zwei
+    # benachbart sind) tragen ihre Höhe, alles andere ist -inf. Jeder Kandidat ist darin ein
+    # lokales Maximum; find_peaks wendet also nur noch seinen kompilierten Abstandsfilter an.
+    spread = 2 * (peaks - peaks[0] + 1)
+    sparse = np.full(spread[-1] + 2, -np.inf)
+    sparse[spread] = priority
+    kept, _ = find_peaks(sparse, distance=2 * np.ceil(distance))
+    keep = np.zeros(len(peaks), dtype=bool)
+    keep[np.searchsorted(spread, kept)] = True
+    return keep
+
+
+def contractions_frame(peak_times, durations):
+    """
+    Baut das Ergebnis-DataFrame der Wehenerkennung.
+    Args:
+        peak_times (np.ndarray): Zeitpunkte der Peaks in Sekunden.
+        durations (np.ndarray): Dauer der Wehen in Sekunden.
+    """
+    intervals = np.diff(peak_times, prepend=np.nan)
+    df = pd.DataFrame({
+        'Wehenzeitpunkt (min)': peak_times/60,
+        'Abstand zur vorherigen Wehe (min)': intervals/60,
+        'Wehendauer (min)': durations/60,
+    })
+    df.reset_index(drop=True, inplace=True)  # Index entfernen
+    return df
+
+
+class PeakCandidates:
+    """
+    Obermenge aller lokalen Maxima eines UC-Signals mit Höhe und Breite.
+    Wird einmal pro Aufzeichnung berechnet; jede Einstellung von Mindesthöhe und
+    Mindestabstand ist danach nur noch ein Filter über diese Tabelle.
+    """
+    def __init__(self, y, times):
+        """Berechnet Peaks, Höhen und Halbwertsbreiten (in Samples)"""
+        self.times = times
+        self.peaks, _ = find_peaks(y)
+        self.heights = y[self.peaks]
+        # Die Halbwertsbreite hängt nur vom Peak selbst ab, nicht von den anderen Peaks
+        self.widths = peak_widths(y, self.peaks, rel_height=0.5)[0]
+        self.dt = np.median(np.diff(times)) if len(times) > 1 else np.nan
+
+    def select(self, height=None, distance=None):
+        """
+        Filtert die Kandidaten wie scipy.find_peaks(height=..., distance=...).
+        Rückgabe: Indizes (in die Kandidatentabelle) der ausgewählten Peaks.
+        """
+        if distance is not None and distance < 1:
+            raise ValueError('`distance` must be greater or equal to 1')
+        selected = np.arange(len(self.peaks))
+        if height is not None:
+            low, high = height if isinstance(height, (tuple, list)) else (height, None)
+            keep = np.ones(len(selected), dtype=bool)
+            if low is not None:
+                keep &= self.heights >= low
+            if high is not None:
+                keep &= self.heights <= high
+            selected = selected[keep]
+        if distance is not None:
+            selected = selected[select_by_peak_distance(self.peaks[selected], self.heights[selected], distance)]
+        return selected
+
+
+MAX_CANDIDATE_TABLES = 32
+_candidate_cache = OrderedDict()
+_candidate_lock = threading.Lock()
+
+
+def get_peak_candidates(key, y, times):
+    """Gibt die gecachte Kandidatentabelle zum Schlüssel zurück oder berechnet sie (key=None: ohne Cache)"""
+    if key is None:
+        return PeakCandidates(y, times)
+    with _candidate_lock:
+        candidates = _candidate_cache.get(key)
+        if candidates is not None:
+            _candidate_cache.move_to_end(key)
+            return candidates
+    candidates = PeakCandidates(y, times)
+    with _candidate_lock:
+        _candidate_cache[key] = candidates
+        while len(_candidate_cache) > MAX_CANDIDATE_TABLES:
+            _candidate_cache.popitem(last=False)
+    return candidates
+
 
 class WehenAnalysis:
     """Analyse von Wehendaten aus CTG-Datensätzen.
@@ -19,75 +155,159 @@ class WehenAnalysis:
         self.ctg = CTG_Data
         if 'UC' not in self.ctg.df.columns:
             raise ValueError("Die UC-Spalte fehlt im DataFrame.")
-        # Zeitreihen-Index in Sekunden
-        self.uc = self.ctg.df['UC'].copy()
-        self.uc.index = self.ctg.df.index.total_seconds()
+        # Zeitreihen-Index in Sekunden (ohne die UC-Werte zu kopieren)
+        seconds = getattr(self.ctg, 'seconds', None)
+        self.uc = pd.Series(
+            self.ctg.df['UC'].to_numpy(),
+            index=seconds if seconds is not None else self.ctg.df.index.total_seconds(),
+            name='UC',
+            copy=False,
+        )
+
+    def _cache_key(self):
+        """Schlüssel für die Kandidatentabelle (None, wenn die Daten keiner Datei zugeordnet sind)"""
+        filepath = getattr(self.ctg, 'filepath', None)
+        try:
+            return recording_key(filepath), 'UC'
+        except (OSError, TypeError):
+            return None
+
+    def peak_candidates(self):
+        """Gibt die (prozessweit gecachte) Kandidatentabelle aller UC-Peaks dieser Aufzeichnung zurück"""
+        return get_peak_candidates(self._cache_key(), self.uc.to_numpy(dtype=np.float64), self.uc.index.to_numpy())
 
     def detect_contractions(self, height=None, distance=None):
         """
         Findet Wehen-Peaks und bestimmt Intervalle sowie Dauer.
          Args:
             height (float, optional): Mindesthöhe der Peaks. Weiterleitung an scipy.find_peaks.
-            distance (float, optional): Mindestabstand zwischen Peaks in Samples. 
+            distance (float, optional): Mindestabstand zwischen Peaks in Sekunden; wird mit der
+                                        Abtastrate (Sekunden x Hz) in Samples umgerechnet.
         Rückgabe: DataFrame mit Spalten
           - time     : Zeitpunkt (s) des Peaks
           - interval : Abstand (s) zur vorherigen Wehe (NaN bei erster)
           - duration : Dauer der Wehe (s)
         """
-        y = self.uc.values
-        times = self.uc.index.values
-
-        # 1) Peaks finden
-        peaks, props = find_peaks(y, height=height, distance=distance)
+        # 1) Peaks aus der gecachten Kandidatentabelle filtern (statt find_peaks neu auszuführen)
+        candidates = self.peak_candidates()
+        if distance is not None:
+            distance = max(distance / candidates.dt, 1)
+        selected = candidates.select(height=height, distance=distance)
 
-        # 2) Dauer als Breite auf halber Höhe
-        results_half = peak_widths(y, peaks, rel_height=0.5)
-        # Breite in Samples -> Sekunden
-        dt = np.median(np.diff(times))
-        durations = results_half[0] * dt
+        # 2) Dauer als Breite auf halber Höhe, Breite in Samples -> Sekunden
+        durations = candidates.widths[selected] * candidates.dt
 
         # 3) Zeiten der Peaks
-        peak_times = times[peaks]
+        peak_times = candidates.times[candidates.peaks[selected]]
 
-        # 4) Intervalle berechnen
-        intervals = np.diff(peak_times, prepend=np.nan)
-
-        # 5) DataFrame zusammenbauen
-        df = pd.DataFrame({
-            'Wehenzeitpunkt (min)': peak_times/60,
-            'Abstand zur vorherigen Wehe (min)': intervals/60,
-            'Wehendauer (min)': durations/60,
-        })
-        df.reset_index(drop=True, inplace=True)  # Index entfernen
-        return df
+        # 4) + 5) Intervalle berechnen und DataFrame zusammenbauen
+        return contractions_frame(peak_times, durations)
 
     def classify_contractions(self, df_peaks=None):
         """
-        Klassifiziert jede Wehe in df_peaks nach Abstand und Dauer gemäß Tabelle.
+        Klassifiziert jede Wehe in df_peaks nach Abstand und Dauer gemäß Tabelle WEHENART.
+        Alle Wehen werden gleichzeitig per NumPy-Broadcasting (Kategorien x Wehen)
+        geprüft; bei mehreren passenden Kategorien gewinnt wie bisher die erste.
         Rückgabe: df_peaks mit zusätzlicher Spalte 'Wehenart'.
         """
         if df_peaks is None:
             df_peaks = self.detect_contractions()
 
-        # Kategorien: (interval_low, interval_high, dur_low, dur_high, label)
-        Wehenart = [
-            (    0,   np.inf,     10,    30, "Braxton-Hicks-Wehen"),
-            (    0,   np.inf,      0,    10, "Senkwehen"),
-            (  600,  1200,    30,    45, "Vor-/Eröffnungswehen"),
-            (  180,   300,    45,    60, "Aktive Eröffnungswehen"),
-            (   60,   120,    60,    90, "Übergangswehen"),
-            (  120,   180,    60,    90, "Austreibungswehen"),
-        ]
+        df = df_peaks.copy()
+        df['Wehenart'] = classify_wehenart(
+            df['Abstand zur vorherigen Wehe (min)'].to_numpy(dtype=np.float64),
+            df['Wehendauer (min)'].to_numpy(dtype=np.float64),
+        )
+        return df
+
+
+# Benchmark: vektorisierte Klassifikation und Abstandsfilter gegenüber den bisherigen Schleifen
+if __name__ == "__main__":
+    import time
 
+    def select_by_peak_distance_loop(peaks, priority, distance):
+        """Bisherige Implementierung Peak für Peak (nur zum Vergleich)"""
+        keep = np.ones(len(peaks), dtype=bool)
+        distance = np.ceil(distance)
+        for j in np.argsort(priority)[::-1]:
+            if not keep[j]:
+                continue
+            k = j - 1
+            while k >= 0 and peaks[j] - peaks[k] < distance:
+                keep[k] = False
+                k -= 1
+            k = j + 1
+            while k < len(peaks) and peaks[k] - peaks[j] < distance:
+                keep[k] = False
+                k += 1
+        return keep
+
+    # Abstandsfilter auf den Kandidaten eines 24-Stunden-UC-Signals (4 Hz, viele niedrige Peaks)
+    rng = np.random.default_rng(0)
+    seconds = np.arange(0, 24 * 3600, 0.25)
+    uc = np.round(np.clip(30 + 25 * np.sin(2 * np.pi * seconds / 180) + rng.normal(0, 4, len(seconds)), 0, 100))
+    candidates = PeakCandidates(uc, seconds)
+    for distance_s in (5, 30, 120):
+        distance = distance_s / candidates.dt
+        t0 = time.perf_counter()
+        expected = select_by_peak_distance_loop(candidates.peaks, candidates.heights, distance)
+        t_loop = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        keep = select_by_peak_distance(candidates.peaks, candidates.heights, distance)
+        t_vector = time.perf_counter() - t0
+        assert (keep == expected).all()
+        assert (candidates.peaks[keep] == find_peaks(uc, distance=distance)[0]).all()
+        print(f"{len(candidates.peaks):>6} Kandidaten, Abstand {distance_s:>3} s: Schleife {t_loop * 1000:7.1f} ms, "
+              f"vektorisiert {t_vector * 1000:6.2f} ms ({t_loop / t_vector:4.0f}x schneller)")
+
+    # Slider-Bewegung auf einer Beispielaufzeichnung: nur der Filter über die gecachte Kandidatentabelle
+    from read_CSV import CTG_Data
+
+    ctg = CTG_Data("data/CTG_data/CTG_data3.csv")
+    ctg.read_csv()
+    analysis = WehenAnalysis(ctg)
+    analysis.detect_contractions(height=5, distance=120)  # Kandidatentabelle aufbauen
+    settings = [(height, distance) for height in (5, 10, 20) for distance in (30, 60, 120, 240)]
+    t0 = time.perf_counter()
+    for height, distance in settings:
+        analysis.peak_candidates().select(height=height, distance=distance / analysis.peak_candidates().dt)
+    t_select = (time.perf_counter() - t0) / len(settings)
+    print(f"CTG_data3 ({len(analysis.peak_candidates().peaks)} Kandidaten): Filter je Slider-Einstellung "
+          f"{t_select * 1e6:.0f} µs")
+
+    def classify_rowwise(df_peaks):
+        """Bisherige Implementierung mit df.apply (nur zum Vergleich)"""
         def assign_category(row):
             iv = row['Abstand zur vorherigen Wehe (min)']
             du = row['Wehendauer (min)']
-            for low_i, high_i, low_d, high_d, label in Wehenart:
+            for low_i, high_i, low_d, high_d, label in WEHENART:
                 iv_ok = pd.isna(iv) or (iv >= low_i and iv < high_i)
                 if iv_ok and (du >= low_d and du < high_d):
                     return label
-            return "Unklassifiziert"
+            return UNKLASSIFIZIERT
+        return df_peaks.apply(assign_category, axis=1)
 
-        df = df_peaks.copy()
-        df['Wehenart'] = df.apply(assign_category, axis=1)
-        return df
+    rng = np.random.default_rng(0)
+    for n in (1_000, 10_000, 50_000):
+        intervals = rng.uniform(0, 1500, n)
+        intervals[0] = np.nan
+        df_peaks = pd.DataFrame({
+            'Wehenzeitpunkt (min)': np.arange(n, dtype=np.float64),
+            'Abstand zur vorherigen Wehe (min)': intervals,
+            'Wehendauer (min)': rng.uniform(0, 100, n),
+        })
+
+        t0 = time.perf_counter()
+        expected = classify_rowwise(df_peaks)
+        t_rowwise = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        labels = classify_wehenart(
+            df_peaks['Abstand zur vorherigen Wehe (min)'].to_numpy(),
+            df_peaks['Wehendauer (min)'].to_numpy(),
+        )
+        t_vector = time.perf_counter() - t0
+
+        assert (labels == expected.to_numpy()).all()
+        print(f"{n:>6} Wehen: zeilenweise {t_rowwise * 1000:8.1f} ms, "
+              f"vektorisiert {t_vector * 1000:6.2f} ms ({t_rowwise / t_vector:5.0f}x schneller)")